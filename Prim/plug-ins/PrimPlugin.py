@@ -26,13 +26,124 @@ def addPrimToShelf():
         sourceType='python'
     )
 
+"""
+Undoable command that builds a mesh from in-memory arrays with MFnMesh.create.
+- Takes the geometry prepared in MeshManager.pending_geometry, returns the new transform
+- Used by MeshManager.instanceMesh instead of importing an .obj file
+"""
+class primCreateMeshCommand(om.MPxCommand):
+    command_name = "primCreateMesh"
+
+    def __init__(self):
+        super().__init__()
+        self.geometry = None
+        self.transform = None
+
+    @staticmethod
+    def creator():
+        return primCreateMeshCommand()
+
+    def isUndoable(self):
+        return True
+
+    def doIt(self, args):
+        import MeshManager
+        self.geometry = MeshManager.pending_geometry
+        if self.geometry is None:
+            raise RuntimeError("primCreateMesh: no geometry was prepared by MeshManager")
+        self.redoIt()
+
+    def redoIt(self):
+        geometry = self.geometry
+        mesh_fn = om.MFnMesh()
+        if "u" in geometry:
+            self.transform = mesh_fn.create(geometry["points"], geometry["counts"], geometry["connects"], geometry["u"], geometry["v"])
+            mesh_fn.assignUVs(geometry["counts"], geometry["uv_ids"])
+        else:
+            self.transform = mesh_fn.create(geometry["points"], geometry["counts"], geometry["connects"])
+
+        if "normals" in geometry:
+            mesh_fn.setFaceVertexNormals(geometry["normals"], geometry["normal_faces"], geometry["connects"])
+
+        self.clearResult()
+        self.setResult(om.MFnDagNode(self.transform).fullPathName())
+
+    def undoIt(self):
+        modifier = om.MDagModifier()
+        modifier.deleteNode(self.transform)
+        modifier.doIt()
+
+"""
+Undoable command that places many instances of one shape, each under its own transform, in a new group.
+- Takes (shape path, N x 4 x 4 matrices, name) prepared in MeshManager.pending_scatter, returns the group
+- Nodes are created through one MDagModifier, no per-copy command runs
+"""
+class primScatterCommand(om.MPxCommand):
+    command_name = "primScatter"
+
+    def __init__(self):
+        super().__init__()
+        self.scatter = None
+        self.modifier = None
+        self.transforms = []
+
+    @staticmethod
+    def creator():
+        return primScatterCommand()
+
+    def isUndoable(self):
+        return True
+
+    def doIt(self, args):
+        import MeshManager
+        self.scatter = MeshManager.pending_scatter
+        if self.scatter is None:
+            raise RuntimeError("primScatter: no transforms were prepared by MeshManager")
+        self.redoIt()
+
+    def redoIt(self):
+        shape_path, matrices, name = self.scatter
+        selection = om.MSelectionList()
+        selection.add(shape_path)
+        shape = selection.getDependNode(0)
+
+        self.modifier = om.MDagModifier()
+        group = self.modifier.createNode("transform")
+        self.modifier.renameNode(group, name + "_scatter")
+        self.transforms = [self.modifier.createNode("transform", group) for matrix in matrices]
+        for index, transform in enumerate(self.transforms):
+            self.modifier.renameNode(transform, f"{name}_{index + 1:03d}")
+        self.modifier.doIt()
+
+        # Each transform gets an instance of the shape, not a copy
+        for transform, matrix in zip(self.transforms, matrices.reshape(-1, 16).tolist()):
+            om.MFnTransform(transform).setTransformation(om.MTransformationMatrix(om.MMatrix(matrix)))
+            om.MFnDagNode(transform).addChild(shape, om.MFnDagNode.kNextPos, True)
+
+        self.clearResult()
+        self.setResult(om.MFnDagNode(group).fullPathName())
+
+    def undoIt(self):
+        shape_path, matrices, name = self.scatter
+        selection = om.MSelectionList()
+        selection.add(shape_path)
+        shape = selection.getDependNode(0)
+        for transform in self.transforms:
+            om.MFnDagNode(transform).removeChild(shape)
+        self.modifier.undoIt()
+        self.transforms = []
+
 def initializePlugin(plugin):
     vendor = "Rafael Padilla Perez"
     version = "1.0.0"
-    om.MFnPlugin(plugin, vendor, version)
+    plugin_fn = om.MFnPlugin(plugin, vendor, version)
+    plugin_fn.registerCommand(primCreateMeshCommand.command_name, primCreateMeshCommand.creator)
+    plugin_fn.registerCommand(primScatterCommand.command_name, primScatterCommand.creator)
 
     # Add to shelf, and start up
     addPrimToShelf()
 
 def uninitializePlugin(plugin):
-    pass
+    plugin_fn = om.MFnPlugin(plugin)
+    plugin_fn.deregisterCommand(primCreateMeshCommand.command_name)
+    plugin_fn.deregisterCommand(primScatterCommand.command_name)
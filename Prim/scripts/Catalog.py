@@ -0,0 +1,276 @@
+import os
+import time
+
+from PrimFile import readIndex, isRemoteLibrary, libraryKey
+from Thumbnails import thumbnailIndex, THUMBNAILS_PATH
+from Proxies import splitVariantName
+
+try:
+    from PySide2 import QtCore
+except ImportError:
+    try:
+        from PySide6 import QtCore
+    except ImportError:
+        QtCore = None
+
+# -----------------------------------------------------------------------
+# In-memory catalog of one library: primitive name -> index entry, and
+# name -> thumbnail, in plain dicts. Proxy/LOD variants ("name#lod1", see
+# Proxies) have entries, but are not listed as primitives.
+# - A thumbnail embedded in the library wins over a loose PNG of the same
+#   name in the thumbnails folder
+# - Built once per library, lookups never touch the filesystem
+# - Our own writes are recorded in place, outside changes (another Maya,
+#   a background compaction, a file copy) are picked up from a
+#   QFileSystemWatcher, or by polling mtimes when Qt is not running
+# - Remote libraries (see RemoteLibrary) are keyed by URL and stamped with
+#   their server's ETag, they only change on revalidate()
+# -----------------------------------------------------------------------
+
+# Seconds between mtime checks when there is no file system watcher
+POLL_INTERVAL = 2.0
+
+# Open catalogs: library real path -> primitiveCatalog
+catalogs = {}
+
+# (size, mtime) of a file, None if it does not exist
+def fileStamp(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+# Stamp of a library: (size, mtime) of its file, or (size, ETag) of the index in use for a remote library
+def libraryStamp(path, refresh=False):
+    if isRemoteLibrary(path):
+        from RemoteLibrary import getRemoteLibrary
+        return getRemoteLibrary(path).stamp(refresh)
+    return fileStamp(path)
+
+"""
+Names, index entries and thumbnails of a library.
+- entries is re-read lazily, only after the library changed on disk or after our own writes moved offsets
+- listeners are called as listener(catalog, kind), kind being "library" or "thumbnails", for outside changes only
+- preloaded: optional {"library": (stamp, entries), "thumbnails": (stamp, thumbnail index)} read ahead off the
+  main thread (see LibraryLoader), the stamps being taken before reading
+"""
+class primitiveCatalog():
+    def __init__(self, library_path, thumbnails_path=THUMBNAILS_PATH, preloaded=None):
+        self.library_path = libraryKey(library_path)
+        self.thumbnails_path = thumbnails_path
+        self.listeners = []
+
+        self.library_entries = None
+        self.names = {} # name -> None, keeps library order
+        self.variant_names = {} # name -> set of variants
+        self.thumbnails = {} # name -> thumbnail index entry, embedded or loose (see Thumbnails)
+        self.embedded_thumbnails = {}
+        self.loose_thumbnails = {}
+        self.library_stamp = None
+        self.thumbnails_stamp = None
+        self.checked = 0.0
+
+        self.watcher = None
+        if QtCore is not None and QtCore.QCoreApplication.instance() is not None:
+            self.watcher = QtCore.QFileSystemWatcher()
+            self.watcher.fileChanged.connect(self.onFileChanged)
+            self.watcher.directoryChanged.connect(self.onDirectoryChanged)
+
+        preloaded = preloaded or {}
+        self.loadLibrary(*preloaded.get("library", ()))
+        self.loadThumbnails(*preloaded.get("thumbnails", ()))
+
+    def loadLibrary(self, stamp=None, entries=None):
+        if entries is None:
+            stamp, entries = libraryStamp(self.library_path), readIndex(self.library_path)
+        self.library_stamp = stamp
+        self.library_entries = entries
+        self.names = {}
+        self.variant_names = {}
+        self.recordNames(self.library_entries)
+        self.embedded_thumbnails = {name: (self.library_path, entry["thumbnail"]["offset"], entry["thumbnail"]["length"], entry["thumbnail"]["checksum"])
+                                    for name, entry in entries.items() if "thumbnail" in entry}
+        self.mergeThumbnails()
+        self.watch(self.library_path)
+
+    # Variants are only recorded as such when their primitive is in the library (see Proxies)
+    def recordNames(self, names):
+        names = list(names)
+        known = set(names)
+        for name in names:
+            base, variant = splitVariantName(name)
+            if variant is None or (base not in known and base not in self.names):
+                self.names[name] = None
+            else:
+                self.variant_names.setdefault(base, set()).add(variant)
+
+    def loadThumbnails(self, stamp=None, thumbnails=None):
+        if thumbnails is None:
+            stamp, thumbnails = fileStamp(self.thumbnails_path), thumbnailIndex(self.thumbnails_path)
+        self.thumbnails_stamp = stamp
+        self.loose_thumbnails = thumbnails
+        self.mergeThumbnails()
+        self.watch(self.thumbnails_path)
+
+    # Rebuilds thumbnails in place, the gallery model holds on to the dict
+    def mergeThumbnails(self):
+        self.thumbnails.clear()
+        self.thumbnails.update(self.loose_thumbnails)
+        self.thumbnails.update(self.embedded_thumbnails)
+
+    def updateThumbnail(self, name):
+        thumbnail = self.embedded_thumbnails.get(name) or self.loose_thumbnails.get(name)
+        if thumbnail is None:
+            self.thumbnails.pop(name, None)
+        else:
+            self.thumbnails[name] = thumbnail
+
+    # Watches a path again after it was replaced (os.replace drops the watch on most platforms)
+    def watch(self, path):
+        if self.watcher is not None and os.path.exists(path) and path not in self.watcher.files() + self.watcher.directories():
+            self.watcher.addPath(path)
+
+    def close(self):
+        if self.watcher is not None:
+            self.watcher.deleteLater()
+            self.watcher = None
+        self.listeners.clear()
+
+    # Without a watcher, reloads whatever changed on disk, at most once per POLL_INTERVAL
+    def poll(self):
+        if self.watcher is not None or time.monotonic() - self.checked < POLL_INTERVAL:
+            return
+        self.checked = time.monotonic()
+        if libraryStamp(self.library_path) != self.library_stamp:
+            self.onFileChanged(self.library_path)
+        if fileStamp(self.thumbnails_path) != self.thumbnails_stamp:
+            self.onDirectoryChanged(self.thumbnails_path)
+
+    def onFileChanged(self, path):
+        self.watch(self.library_path)
+        if libraryStamp(self.library_path) == self.library_stamp:
+            return # our own write
+        if not isRemoteLibrary(self.library_path) and not os.path.exists(self.library_path):
+            return # mid-replace, the new file triggers another event
+
+        self.loadLibrary()
+        self.notify("library")
+
+    def onDirectoryChanged(self, path):
+        if fileStamp(self.thumbnails_path) == self.thumbnails_stamp:
+            return
+        self.loadThumbnails()
+        self.notify("thumbnails")
+
+    # Checks the library right away, e.g. after we rewrote it or a read hit stale offsets. Returns True if it changed.
+    def revalidate(self):
+        if libraryStamp(self.library_path, refresh=True) == self.library_stamp:
+            return False
+        self.onFileChanged(self.library_path)
+        return True
+
+    def notify(self, kind):
+        for listener in list(self.listeners):
+            listener(self, kind)
+
+    # --- Lookups ---
+
+    def __contains__(self, name):
+        self.poll()
+        return name in self.names
+
+    def __len__(self):
+        return len(self.names)
+
+    def primitiveNames(self):
+        self.poll()
+        return list(self.names)
+
+    # Index entries (offset, length, checksum, format) of every primitive
+    def entries(self):
+        self.poll()
+        if self.library_entries is None:
+            self.loadLibrary()
+        return self.library_entries
+
+    def entry(self, name):
+        return self.entries().get(name)
+
+    # Proxy/LOD variants stored for a primitive, e.g. {"lod1", "proxy"}
+    def variants(self, name):
+        self.poll()
+        return self.variant_names.get(name, set())
+
+    def thumbnail(self, name):
+        self.poll()
+        return self.thumbnails.get(name)
+
+    # --- Our own changes ---
+
+    # Records primitives written to the library; their offsets are read back on next use
+    def recordAdded(self, names):
+        self.recordNames(names)
+        for name in names:
+            # A primitive saved again loses the thumbnail embedded with its old payload
+            if self.embedded_thumbnails.pop(name, None) is not None:
+                self.updateThumbnail(name)
+        self.library_entries = None
+        self.library_stamp = libraryStamp(self.library_path)
+
+    # Records deleted primitives; text libraries are rewritten on delete, so offsets are read back too
+    def recordRemoved(self, names):
+        for name in names:
+            base, variant = splitVariantName(name)
+            if name in self.names:
+                self.names.pop(name)
+                self.embedded_thumbnails.pop(name, None)
+                self.updateThumbnail(name)
+            elif variant is not None:
+                self.variant_names.get(base, set()).discard(variant)
+        self.library_entries = None
+        self.library_stamp = libraryStamp(self.library_path)
+
+    # Records a freshly rendered thumbnail file
+    def recordThumbnail(self, name, path):
+        if os.path.exists(path):
+            self.loose_thumbnails[name] = (path, os.stat(path).st_mtime_ns)
+            self.updateThumbnail(name)
+        self.thumbnails_stamp = fileStamp(self.thumbnails_path)
+
+    # Records thumbnails written into the library, their offsets are read back right away
+    def recordEmbedded(self, names):
+        if names:
+            self.loadLibrary()
+
+    # Deletes a primitive's thumbnail file, an embedded thumbnail goes with the primitive
+    def discardThumbnail(self, name):
+        thumbnail = self.loose_thumbnails.pop(name, None)
+        if thumbnail and os.path.exists(thumbnail[0]):
+            os.remove(thumbnail[0])
+        self.updateThumbnail(name)
+        self.thumbnails_stamp = fileStamp(self.thumbnails_path)
+
+    # Re-lists the thumbnails folder, for thumbnails overwritten in place
+    def refreshThumbnails(self):
+        self.loadThumbnails()
+
+# Catalog of a library, built on first use
+def getCatalog(library_path):
+    key = libraryKey(library_path)
+    if key not in catalogs:
+        catalogs[key] = primitiveCatalog(key)
+    return catalogs[key]
+
+# Replaces a library's catalog with one built from data read ahead, see primitiveCatalog
+def installCatalog(library_path, preloaded):
+    closeCatalog(library_path)
+    key = libraryKey(library_path)
+    catalogs[key] = primitiveCatalog(key, preloaded=preloaded)
+    return catalogs[key]
+
+# Drops a library's catalog, e.g. after it was rewritten wholesale
+def closeCatalog(library_path):
+    catalog = catalogs.pop(libraryKey(library_path), None)
+    if catalog is not None:
+        catalog.close()
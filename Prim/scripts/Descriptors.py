@@ -0,0 +1,221 @@
+import hashlib
+import io
+import os
+
+from PrimFile import readPrimitive, libraryKey, entryKey
+from MeshData import payloadToMeshData, triangulate
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# -----------------------------------------------------------------------
+# Shape descriptors for similarity search (requires NumPy).
+#
+# Each primitive is summarized by a small float vector:
+#   D2 histogram   distances between random surface point pairs, relative
+#                  to the largest one (Osada et al. "Shape Distributions")
+#   bbox extents   axis aligned bounding box size, largest first
+#   PCA extents    spread of the surface along its principal axes
+#
+# Vectors are stored per library in primitives/descriptors, keyed by each
+# entry's checksum, so searches never read geometry back. Search compares
+# the scale-free part of the vectors, a tall thin rock finds tall thin
+# rocks whatever their size.
+# -----------------------------------------------------------------------
+
+DESCRIPTORS_PATH = os.path.dirname(os.path.realpath(__file__)) + "/../primitives/descriptors"
+
+D2_BINS = 32
+SURFACE_SAMPLES = 2048
+D2_PAIRS = 8192
+DESCRIPTOR_SIZE = D2_BINS + 6
+
+# Search weight of the bbox and PCA proportions against the D2 histogram
+EXTENT_WEIGHT = 0.5
+
+# Open descriptor indexes: library real path -> descriptorIndex
+indexes = {}
+
+def _requireNumpy():
+    if numpy is None:
+        raise ImportError("NumPy is not available in this Python, shape search needs it")
+
+# Points spread uniformly over the mesh surface, or its vertices if it has no area
+def _surfaceSamples(positions, counts, connects, rng):
+    triangles = triangulate(counts, connects)
+    if len(triangles):
+        a, b, c = positions[triangles[:, 0]], positions[triangles[:, 1]], positions[triangles[:, 2]]
+        areas = numpy.linalg.norm(numpy.cross(b - a, c - a), axis=1)
+        total = areas.sum()
+        if total > 0:
+            picks = numpy.searchsorted(numpy.cumsum(areas), rng.random(SURFACE_SAMPLES) * total)
+            picks = numpy.minimum(picks, len(triangles) - 1)
+            r1 = numpy.sqrt(rng.random((SURFACE_SAMPLES, 1)))
+            r2 = rng.random((SURFACE_SAMPLES, 1))
+            return (1 - r1) * a[picks] + r1 * (1 - r2) * b[picks] + r1 * r2 * c[picks]
+    return positions[rng.integers(0, len(positions), SURFACE_SAMPLES)]
+
+"""
+Computes the descriptor vector of a meshData (float32, DESCRIPTOR_SIZE values).
+- Sampling uses a fixed seed, the same mesh always gets the same vector
+"""
+def computeDescriptor(mesh):
+    _requireNumpy()
+    positions = numpy.frombuffer(mesh.positions, dtype=numpy.float32).reshape(-1, 3).astype(numpy.float64)
+    descriptor = numpy.zeros(DESCRIPTOR_SIZE, dtype=numpy.float32)
+    if not len(positions):
+        return descriptor
+
+    rng = numpy.random.default_rng(0)
+    samples = _surfaceSamples(positions, mesh.counts, mesh.connects, rng)
+
+    pairs = rng.integers(0, len(samples), (D2_PAIRS, 2))
+    distances = numpy.linalg.norm(samples[pairs[:, 0]] - samples[pairs[:, 1]], axis=1)
+    if distances.max() > 0:
+        histogram, edges = numpy.histogram(distances / distances.max(), bins=D2_BINS, range=(0.0, 1.0))
+        descriptor[:D2_BINS] = histogram / histogram.sum()
+
+    descriptor[D2_BINS:D2_BINS + 3] = numpy.sort(positions.max(axis=0) - positions.min(axis=0))[::-1]
+    variances = numpy.linalg.eigvalsh(numpy.cov(samples, rowvar=False))
+    descriptor[D2_BINS + 3:] = numpy.sqrt(numpy.maximum(variances, 0))[::-1]
+    return descriptor
+
+# Scale-free search features: D2 histogram plus bbox and PCA proportions, one row per descriptor
+def searchFeatures(descriptors):
+    descriptors = numpy.atleast_2d(descriptors)
+    bbox = descriptors[:, D2_BINS:D2_BINS + 3]
+    pca = descriptors[:, D2_BINS + 3:]
+    bbox = bbox / numpy.maximum(bbox[:, :1], 1e-12)
+    pca = pca / numpy.maximum(pca[:, :1], 1e-12)
+    return numpy.hstack((descriptors[:, :D2_BINS], EXTENT_WEIGHT * bbox, EXTENT_WEIGHT * pca)).astype(numpy.float32)
+
+"""
+Descriptors of every primitive in a library, saved next to the other per-library data.
+- update() computes only what is missing or stale, from the library's index entries
+- nearest() is one vectorized distance pass over all rows
+"""
+class descriptorIndex():
+    def __init__(self, library_path, root=DESCRIPTORS_PATH):
+        _requireNumpy()
+        self.library_path = libraryKey(library_path)
+        name = os.path.splitext(os.path.basename(self.library_path))[0]
+        digest = hashlib.sha1(self.library_path.encode("utf-8")).hexdigest()[:10]
+        self.path = os.path.join(root, f"{name}-{digest}.npz")
+
+        self.names = []
+        self.keys = []
+        self.vectors = numpy.zeros((0, DESCRIPTOR_SIZE), dtype=numpy.float32)
+        self.rows = {}
+        self.features = None
+        self.load()
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with numpy.load(self.path) as data:
+                names, keys, vectors = list(data["names"]), list(data["keys"]), data["vectors"]
+        except (OSError, KeyError, ValueError):
+            return # unreadable, rebuilt by the next update()
+        if vectors.shape[1:] != (DESCRIPTOR_SIZE,):
+            return # older descriptor layout
+
+        self.names, self.keys, self.vectors = [str(n) for n in names], [str(k) for k in keys], vectors
+        self.rows = {name: row for row, name in enumerate(self.names)}
+        self.features = None
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        buffer = io.BytesIO()
+        numpy.savez(buffer, names=numpy.array(self.names, dtype=str), keys=numpy.array(self.keys, dtype=str), vectors=self.vectors)
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "wb") as file:
+            file.write(buffer.getvalue())
+        os.replace(temp_path, self.path)
+
+    def __contains__(self, name):
+        return name in self.rows
+
+    def __len__(self):
+        return len(self.names)
+
+    def add(self, name, entry, descriptor):
+        self.addMany([(name, entry, descriptor)])
+
+    # Adds or replaces (name, index entry, descriptor) rows in one copy
+    def addMany(self, items):
+        items = list(items)
+        if not items:
+            return
+        self.remove([name for name, entry, descriptor in items])
+        self.names.extend(name for name, entry, descriptor in items)
+        self.keys.extend(entryKey(entry) for name, entry, descriptor in items)
+        self.vectors = numpy.vstack([self.vectors] + [descriptor[numpy.newaxis] for name, entry, descriptor in items])
+        self.rows = {name: row for row, name in enumerate(self.names)}
+        self.features = None
+
+    def remove(self, names):
+        drop = {self.rows[name] for name in names if name in self.rows}
+        if not drop:
+            return
+        keep = [row for row in range(len(self.names)) if row not in drop]
+        self.names = [self.names[row] for row in keep]
+        self.keys = [self.keys[row] for row in keep]
+        self.vectors = self.vectors[keep]
+        self.rows = {name: row for row, name in enumerate(self.names)}
+        self.features = None
+
+    """
+    Brings the index in line with a library's entries. Returns True if anything changed.
+    - Descriptors of deleted primitives are dropped, new or re-saved ones are computed from their geometry
+    - progress: optional callback(done, total), returning False stops early (what was computed is kept)
+    """
+    def update(self, entries, progress=None):
+        stale = [name for name in self.names if name not in entries]
+        missing = [name for name, entry in entries.items() if name not in self.rows or self.keys[self.rows[name]] != entryKey(entry)]
+        self.remove(stale)
+
+        computed = []
+        for done, name in enumerate(missing):
+            if progress is not None and progress(done, len(missing)) is False:
+                break
+            entry = entries[name]
+            mesh = payloadToMeshData(readPrimitive(self.library_path, name, entries), entry["format"])
+            computed.append((name, entry, computeDescriptor(mesh)))
+        self.addMany(computed)
+
+        if stale or computed:
+            self.save()
+            return True
+        return False
+
+    # The k primitives closest to a descriptor, as (name, distance) closest first
+    def nearest(self, descriptor, k=12, exclude=()):
+        if not self.names:
+            return []
+        if self.features is None:
+            self.features = searchFeatures(self.vectors)
+
+        distances = ((self.features - searchFeatures(descriptor)) ** 2).sum(axis=1)
+        for name in exclude:
+            if name in self.rows:
+                distances[self.rows[name]] = numpy.inf
+
+        k = min(k, int(numpy.isfinite(distances).sum()))
+        if k <= 0:
+            return []
+        closest = numpy.argpartition(distances, k - 1)[:k]
+        closest = closest[numpy.argsort(distances[closest])]
+        return [(self.names[row], float(distances[row])) for row in closest]
+
+    def descriptor(self, name):
+        return self.vectors[self.rows[name]] if name in self.rows else None
+
+# Descriptor index of a library, loaded on first use
+def getDescriptorIndex(library_path):
+    key = libraryKey(library_path)
+    if key not in indexes:
+        indexes[key] = descriptorIndex(key)
+    return indexes[key]
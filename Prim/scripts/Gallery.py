@@ -0,0 +1,218 @@
+try:
+    from PySide2 import QtCore
+    from PySide2 import QtWidgets
+    from PySide2 import QtGui
+except ImportError:
+    from PySide6 import QtCore
+    from PySide6 import QtWidgets
+    from PySide6 import QtGui
+
+from Thumbnails import thumbnailLoader
+from Instrumentation import instrumented, countItems
+
+# -----------------------------------------------------------------------
+# Virtualized primitive gallery: a list model, and a delegate that paints
+# each row (name, thumbnail, Create and Delete buttons). Only visible rows
+# are painted, and only their thumbnails are ever loaded, so the gallery
+# costs the same with ten primitives or fifty thousand.
+# -----------------------------------------------------------------------
+
+"""
+List model of the primitives in a library.
+- Rows are primitive names, in library order
+- Thumbnails are requested when a row is first painted, and the row repaints once decoded
+"""
+class primitiveModel(QtCore.QAbstractListModel):
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.names = []
+        self.rows = {} # name -> row
+        self.thumbnail_index = {}
+        self.requested = set()
+        self.loader = thumbnailLoader.get()
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        return 0 if parent.isValid() else len(self.names)
+
+    def data(self, index, role=QtCore.Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+
+        name = self.names[index.row()]
+        if role == QtCore.Qt.ItemDataRole.DisplayRole or role == QtCore.Qt.ItemDataRole.ToolTipRole:
+            return name
+        if role == QtCore.Qt.ItemDataRole.DecorationRole:
+            return self.thumbnail(name)
+        return None
+
+    # Decoded thumbnail if available, else the placeholder while it loads
+    def thumbnail(self, name):
+        entry = self.thumbnail_index.get(name)
+        pixmap = self.loader.cached(entry)
+        if pixmap is not None:
+            return pixmap
+
+        if name not in self.requested:
+            self.requested.add(name)
+            self.loader.request(entry, lambda pixmap, name=name: self.thumbnailLoaded(name))
+        return self.loader.placeholderPixmap()
+
+    def thumbnailLoaded(self, name):
+        self.requested.discard(name)
+        self.updatePrimitive(name)
+
+    # Replaces every row, for opening a library
+    @instrumented()
+    def setPrimitives(self, names, thumbnail_index):
+        self.beginResetModel()
+        self.names = list(names)
+        self.rows = {name: row for row, name in enumerate(self.names)}
+        self.thumbnail_index = thumbnail_index
+        self.requested.clear()
+        self.endResetModel()
+        countItems(len(self.names))
+
+    # Appends rows, skipping names already shown
+    @instrumented()
+    def addPrimitives(self, names):
+        names = [name for name in dict.fromkeys(names) if name not in self.rows]
+        if not names:
+            return
+
+        first = len(self.names)
+        self.beginInsertRows(QtCore.QModelIndex(), first, first + len(names) - 1)
+        for name in names:
+            self.rows[name] = len(self.names)
+            self.names.append(name)
+        self.endInsertRows()
+        countItems(len(names))
+
+    def addPrimitive(self, name):
+        self.addPrimitives([name])
+
+    def removePrimitive(self, name):
+        row = self.rows.get(name)
+        if row is None:
+            return
+
+        self.beginRemoveRows(QtCore.QModelIndex(), row, row)
+        del self.names[row]
+        del self.rows[name]
+        for moved_row in range(row, len(self.names)):
+            self.rows[self.names[moved_row]] = moved_row
+        self.endRemoveRows()
+
+    def renamePrimitive(self, old_name, new_name):
+        row = self.rows.pop(old_name, None)
+        if row is None:
+            return
+
+        self.names[row] = new_name
+        self.rows[new_name] = row
+        self.updatePrimitive(new_name)
+
+    # Repaints one row, e.g. after its thumbnail changed
+    def updatePrimitive(self, name):
+        row = self.rows.get(name)
+        if row is not None:
+            index = self.index(row)
+            self.dataChanged.emit(index, index)
+
+    # New thumbnail listing: rows whose thumbnail changed repaint as they become visible
+    @instrumented()
+    def setThumbnailIndex(self, thumbnail_index):
+        self.thumbnail_index = thumbnail_index
+        self.requested.clear()
+        if self.names:
+            self.dataChanged.emit(self.index(0), self.index(len(self.names) - 1))
+
+    # A primitive's thumbnail was re-rendered, its index entry already points at the new file
+    def reloadThumbnail(self, name):
+        self.requested.discard(name)
+        self.updatePrimitive(name)
+
+"""
+Paints a gallery row like the old primitive widget: name, thumbnail, Create and Delete buttons.
+- Button clicks are handled in editorEvent and reported through signals
+"""
+class primitiveDelegate(QtWidgets.QStyledItemDelegate):
+    createClicked = QtCore.Signal(str)
+    deleteClicked = QtCore.Signal(str)
+
+    MARGIN = 6
+    NAME_HEIGHT = 18
+    THUMBNAIL_SIZE = 100
+    BUTTON_WIDTH = 70
+    BUTTON_HEIGHT = 24
+
+    def sizeHint(self, option, index):
+        height = self.MARGIN * 4 + self.NAME_HEIGHT + self.THUMBNAIL_SIZE + self.BUTTON_HEIGHT
+        return QtCore.QSize(self.BUTTON_WIDTH * 2 + self.MARGIN * 3, height)
+
+    def layoutRects(self, rect):
+        name_rect = QtCore.QRect(rect.left(), rect.top() + self.MARGIN, rect.width(), self.NAME_HEIGHT)
+        image_rect = QtCore.QRect(rect.center().x() - self.THUMBNAIL_SIZE // 2, name_rect.bottom() + self.MARGIN,
+                                  self.THUMBNAIL_SIZE, self.THUMBNAIL_SIZE)
+        button_top = image_rect.bottom() + self.MARGIN
+        create_rect = QtCore.QRect(rect.center().x() - self.BUTTON_WIDTH - self.MARGIN // 2, button_top,
+                                   self.BUTTON_WIDTH, self.BUTTON_HEIGHT)
+        delete_rect = QtCore.QRect(rect.center().x() + self.MARGIN // 2, button_top,
+                                   self.BUTTON_WIDTH, self.BUTTON_HEIGHT)
+        return name_rect, image_rect, create_rect, delete_rect
+
+    def paint(self, painter, option, index):
+        painter.save()
+        name_rect, image_rect, create_rect, delete_rect = self.layoutRects(option.rect)
+
+        if option.state & QtWidgets.QStyle.StateFlag.State_Selected:
+            painter.fillRect(option.rect, option.palette.highlight())
+
+        painter.setPen(option.palette.text().color())
+        painter.drawText(name_rect, QtCore.Qt.AlignmentFlag.AlignCenter, index.data(QtCore.Qt.ItemDataRole.DisplayRole))
+
+        pixmap = index.data(QtCore.Qt.ItemDataRole.DecorationRole)
+        if pixmap is not None and not pixmap.isNull():
+            scaled = pixmap.size().scaled(image_rect.size(), QtCore.Qt.AspectRatioMode.KeepAspectRatio)
+            target = QtCore.QRect(QtCore.QPoint(0, 0), scaled)
+            target.moveCenter(image_rect.center())
+            painter.drawPixmap(target, pixmap)
+
+        style = option.widget.style() if option.widget else QtWidgets.QApplication.style()
+        for text, rect in (("Create", create_rect), ("Delete", delete_rect)):
+            button = QtWidgets.QStyleOptionButton()
+            button.rect = rect
+            button.text = text
+            button.state = QtWidgets.QStyle.StateFlag.State_Enabled | QtWidgets.QStyle.StateFlag.State_Raised
+            style.drawControl(QtWidgets.QStyle.ControlElement.CE_PushButton, button, painter, option.widget)
+
+        painter.restore()
+
+    def editorEvent(self, event, model, option, index):
+        if event.type() != QtCore.QEvent.Type.MouseButtonRelease:
+            return False
+
+        position = event.position().toPoint() if hasattr(event, "position") else event.pos()
+        name_rect, image_rect, create_rect, delete_rect = self.layoutRects(option.rect)
+        name = index.data(QtCore.Qt.ItemDataRole.DisplayRole)
+        if create_rect.contains(position):
+            self.createClicked.emit(name)
+            return True
+        if delete_rect.contains(position):
+            self.deleteClicked.emit(name)
+            return True
+        return False
+
+# List view set up for the gallery: uniform rows, so Qt never measures every item
+def createGalleryView(model, delegate, parent=None):
+    view = QtWidgets.QListView(parent)
+    view.setModel(model)
+    view.setItemDelegate(delegate)
+    view.setUniformItemSizes(True)
+    view.setLayoutMode(QtWidgets.QListView.LayoutMode.Batched)
+    view.setBatchSize(256)
+    view.setVerticalScrollMode(QtWidgets.QAbstractItemView.ScrollMode.ScrollPerPixel)
+    view.setHorizontalScrollBarPolicy(QtCore.Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
+    view.setVerticalScrollBarPolicy(QtCore.Qt.ScrollBarPolicy.ScrollBarAlwaysOn)
+    view.setBackgroundRole(QtGui.QPalette.ColorRole.Dark)
+    view.setSelectionMode(QtWidgets.QAbstractItemView.SelectionMode.SingleSelection)
+    return view
@@ -0,0 +1,195 @@
+import collections
+import cProfile
+import functools
+import io
+import json
+import os
+import pstats
+import threading
+import time
+
+# -----------------------------------------------------------------------
+# Operation timings for MeshManager entry points and UI refreshes.
+# - Each call of an instrumented function (or `with operation(name):`
+#   block) records its wall time, the .prim/cache bytes it read and wrote,
+#   and the items it handled, into a ring buffer of the latest calls
+# - summary() turns the buffer into per-operation percentiles, shown in
+#   the "Prim > Performance" panel
+# - requestProfile() runs the next call of an operation under cProfile,
+#   exportProfile() and exportTrace() write what was captured to a file
+# - Disabled (the default), instrumented functions cost one flag check
+# -----------------------------------------------------------------------
+
+# Calls kept, the oldest are dropped first
+RING_SIZE = 4096
+
+enabled = False
+records = collections.deque(maxlen=RING_SIZE)
+profile_requests = set() # operation names to profile on their next call
+profiles = {} # operation name -> (cProfile.Profile, end time) of its last profiled call
+_local = threading.local()
+
+class operationRecord():
+    __slots__ = ("name", "start", "seconds", "bytes_read", "bytes_written", "items", "thread")
+
+    def __init__(self, name):
+        self.name = name
+        self.start = time.time()
+        self.seconds = 0.0
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.items = 0
+        self.thread = threading.get_ident()
+
+class _nullOperation():
+    def __enter__(self):
+        return None
+
+    def __exit__(self, *args):
+        return False
+
+NULL_OPERATION = _nullOperation()
+
+# Times one call; nested operations are recorded on their own and also count towards the outer ones' bytes
+class _operation():
+    def __init__(self, name):
+        self.record = operationRecord(name)
+        self.profiler = None
+
+    def __enter__(self):
+        stack = _stack()
+        stack.append(self.record)
+        if self.record.name in profile_requests and not getattr(_local, "profiling", False):
+            profile_requests.discard(self.record.name)
+            _local.profiling = True
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+        self.started = time.perf_counter()
+        return self.record
+
+    def __exit__(self, *args):
+        self.record.seconds = time.perf_counter() - self.started
+        if self.profiler is not None:
+            self.profiler.disable()
+            _local.profiling = False
+            profiles[self.record.name] = (self.profiler, time.time())
+        _stack().pop()
+        records.append(self.record)
+        return False
+
+def _stack():
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+    return stack
+
+def setEnabled(on):
+    global enabled
+    enabled = bool(on)
+
+def clear():
+    records.clear()
+    profiles.clear()
+
+# Times a block as one operation, e.g. `with operation("ui.showAllPrimitives"):`
+def operation(name):
+    if not enabled:
+        return NULL_OPERATION
+    return _operation(name)
+
+# Decorator recording every call of a function as an operation, named after the function (or method) unless given a name
+def instrumented(name=None):
+    def decorator(function):
+        label = name or function.__qualname__
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not enabled:
+                return function(*args, **kwargs)
+            with _operation(label):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+# Adds file I/O to every operation running on this thread
+def countBytes(read=0, written=0):
+    if not enabled:
+        return
+    for record in getattr(_local, "stack", ()):
+        record.bytes_read += read
+        record.bytes_written += written
+
+# Adds to the items (primitives, copies, rows ...) handled by the innermost operation
+def countItems(count):
+    if not enabled:
+        return
+    stack = getattr(_local, "stack", None)
+    if stack:
+        stack[-1].items += count
+
+# Nearest-rank percentile of sorted values
+def percentile(values, fraction):
+    return values[min(len(values) - 1, max(0, int(round(fraction * len(values) + 0.5)) - 1))]
+
+"""
+Per-operation statistics over the ring buffer, slowest total first.
+- Each item: (name, {"calls", "p50_ms", "p90_ms", "p99_ms", "max_ms", "total_s", "bytes_read", "bytes_written", "items"})
+- Bytes and items are totals over the calls still in the buffer
+"""
+def summary():
+    grouped = collections.defaultdict(list)
+    for record in list(records):
+        grouped[record.name].append(record)
+
+    stats = []
+    for name, calls in grouped.items():
+        times = sorted(record.seconds * 1000 for record in calls)
+        stats.append((name, {
+            "calls": len(calls),
+            "p50_ms": percentile(times, 0.5),
+            "p90_ms": percentile(times, 0.9),
+            "p99_ms": percentile(times, 0.99),
+            "max_ms": times[-1],
+            "total_s": sum(times) / 1000,
+            "bytes_read": sum(record.bytes_read for record in calls),
+            "bytes_written": sum(record.bytes_written for record in calls),
+            "items": sum(record.items for record in calls)
+        }))
+    stats.sort(key=lambda item: item[1]["total_s"], reverse=True)
+    return stats
+
+def requestProfile(name):
+    profile_requests.add(name)
+
+"""
+Writes the last profile captured for an operation. Returns False if there is none.
+- ".txt" paths get a readable report sorted by cumulative time, anything else the binary
+  pstats file (for pstats, snakeviz, ...)
+"""
+def exportProfile(name, path):
+    if name not in profiles:
+        return False
+    profiler, captured = profiles[name]
+    if path.endswith(".txt"):
+        stream = io.StringIO()
+        pstats.Stats(profiler, stream=stream).sort_stats("cumulative").print_stats(80)
+        with open(path, "w") as file:
+            file.write(stream.getvalue())
+    else:
+        profiler.dump_stats(path)
+    return True
+
+# Writes the ring buffer as a Chrome/Perfetto trace (chrome://tracing, ui.perfetto.dev)
+def exportTrace(path):
+    events = [{
+        "name": record.name,
+        "ph": "X",
+        "ts": record.start * 1e6,
+        "dur": record.seconds * 1e6,
+        "pid": os.getpid(),
+        "tid": record.thread,
+        "args": {"bytes_read": record.bytes_read, "bytes_written": record.bytes_written, "items": record.items}
+    } for record in list(records)]
+    with open(path, "w") as file:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, file)
+    return len(events)
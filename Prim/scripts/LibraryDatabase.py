@@ -0,0 +1,247 @@
+import hashlib
+import os
+import sqlite3
+import time
+
+from PrimFile import PrimFileError, entryKey, iterEntries, readIndex, readPrimitive
+from MeshData import payloadToMeshData
+from Proxies import isVariantName
+
+# -----------------------------------------------------------------------
+# SQLite catalog of every library under the configured roots.
+# - One row per primitive: library, name, payload location, vertex/face
+#   counts and bounding box, so searches never open a .prim file
+# - Re-indexing is incremental: unchanged files (size, mtime) are skipped,
+#   touched files with the same content hash only get a new mtime, and
+#   within a changed library only entries with a new checksum are re-read
+# -----------------------------------------------------------------------
+
+DATABASE_PATH = os.path.dirname(os.path.realpath(__file__)) + "/../primitives/catalog.sqlite"
+LIBRARIES_PATH = os.path.dirname(os.path.realpath(__file__)) + "/../primitives/libraries"
+
+SCHEMA_VERSION = 1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS libraries (
+    id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    hash TEXT NOT NULL,
+    indexed_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS primitives (
+    library_id INTEGER NOT NULL REFERENCES libraries(id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    entry_key TEXT NOT NULL,
+    offset INTEGER NOT NULL,
+    length INTEGER NOT NULL,
+    format TEXT NOT NULL,
+    vertices INTEGER NOT NULL,
+    faces INTEGER NOT NULL,
+    triangles INTEGER NOT NULL,
+    min_x REAL, min_y REAL, min_z REAL,
+    max_x REAL, max_y REAL, max_z REAL,
+    size REAL,
+    PRIMARY KEY (library_id, name)
+);
+CREATE INDEX IF NOT EXISTS primitives_name ON primitives (name);
+CREATE INDEX IF NOT EXISTS primitives_faces ON primitives (faces);
+"""
+
+# Bytes hashed per read when fingerprinting a library
+HASH_CHUNK = 1024 * 1024
+
+def _fileHash(path):
+    digest = hashlib.sha1()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(HASH_CHUNK), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+# Vertex/face/triangle counts and bounding box of a payload
+def meshStatistics(payload, format):
+    mesh = payloadToMeshData(payload, format)
+    positions = mesh.positions
+    stats = {
+        "vertices": mesh.vertexCount(),
+        "faces": mesh.faceCount(),
+        "triangles": sum(count - 2 for count in mesh.counts if count > 2)
+    }
+
+    if len(positions):
+        lower = [min(positions[axis::3]) for axis in range(3)]
+        upper = [max(positions[axis::3]) for axis in range(3)]
+        stats["size"] = max(high - low for low, high in zip(lower, upper))
+    else:
+        lower = upper = [None] * 3
+        stats["size"] = None
+    stats.update(zip(("min_x", "min_y", "min_z"), lower))
+    stats.update(zip(("max_x", "max_y", "max_z"), upper))
+    return stats
+
+"""
+Catalog of primitives across libraries, kept in one SQLite file.
+- roots: folders searched (recursively) for .prim files
+- reindex() brings the database in line with the disk, query() searches it
+"""
+class libraryDatabase():
+    def __init__(self, roots=(LIBRARIES_PATH,), path=DATABASE_PATH):
+        self.roots = [os.path.realpath(root) for root in roots]
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.realpath(path)), exist_ok=True)
+
+        self.connection = sqlite3.connect(path)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute("PRAGMA foreign_keys = ON")
+        self.connection.execute("PRAGMA journal_mode = WAL")
+
+        version = self.connection.execute("PRAGMA user_version").fetchone()[0]
+        if version != SCHEMA_VERSION:
+            self.connection.executescript("DROP TABLE IF EXISTS primitives; DROP TABLE IF EXISTS libraries;")
+            self.connection.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        self.connection.executescript(SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    # Every .prim file under the roots
+    def libraryPaths(self):
+        paths = []
+        for root in self.roots:
+            for folder, subfolders, files in os.walk(root):
+                paths.extend(os.path.realpath(os.path.join(folder, file)) for file in files if file.endswith(".prim"))
+        return sorted(set(paths))
+
+    """
+    Brings the database in line with the libraries on disk.
+    - progress: optional callback(done, total, path), returning False stops early
+    - Libraries that cannot be read (I/O errors, corrupt or undecodable files, compact payloads without NumPy) are
+      skipped and left as they were indexed, the next reindex tries them again
+    - Returns {"scanned", "updated", "removed", "failed", "primitives_read", "seconds"}
+    """
+    def reindex(self, progress=None):
+        start = time.perf_counter()
+        paths = self.libraryPaths()
+        report = {"scanned": len(paths), "updated": 0, "removed": 0, "failed": 0, "primitives_read": 0}
+
+        known = {row["path"]: row for row in self.connection.execute("SELECT * FROM libraries")}
+        for path in set(known) - set(paths):
+            self.connection.execute("DELETE FROM libraries WHERE id = ?", (known[path]["id"],))
+            report["removed"] += 1
+
+        for done, path in enumerate(paths):
+            if progress is not None and progress(done, len(paths), path) is False:
+                break
+            self.connection.execute("SAVEPOINT library")
+            try:
+                read = self.reindexLibrary(path, known.get(path))
+            except Exception as error:
+                # Nothing of a half-read library is kept, or its new hash would mark it up to date
+                self.connection.execute("ROLLBACK TO library")
+                self.connection.execute("RELEASE library")
+                reason = str(error) if isinstance(error, (OSError, PrimFileError)) else f"{type(error).__name__}: {error}"
+                print(f"Warning: Could not index {path}: {reason}")
+                report["failed"] += 1
+                continue
+            self.connection.execute("RELEASE library")
+            if read is not None:
+                report["updated"] += 1
+                report["primitives_read"] += read
+
+        self.connection.commit()
+        report["seconds"] = time.perf_counter() - start
+        return report
+
+    # Re-indexes one library if it changed. Returns the number of payloads read, None if it was up to date.
+    def reindexLibrary(self, path, known=None):
+        stat = os.stat(path)
+        if known is not None and known["size"] == stat.st_size and known["mtime_ns"] == stat.st_mtime_ns:
+            return None
+
+        file_hash = _fileHash(path)
+        if known is not None and known["hash"] == file_hash:
+            self.connection.execute("UPDATE libraries SET mtime_ns = ? WHERE id = ?", (stat.st_mtime_ns, known["id"]))
+            return None
+
+        if known is None:
+            cursor = self.connection.execute(
+                "INSERT INTO libraries (path, size, mtime_ns, hash, indexed_at) VALUES (?, ?, ?, ?, ?)",
+                (path, stat.st_size, stat.st_mtime_ns, file_hash, time.time()))
+            library_id = cursor.lastrowid
+            rows = {}
+        else:
+            library_id = known["id"]
+            self.connection.execute("UPDATE libraries SET size = ?, mtime_ns = ?, hash = ?, indexed_at = ? WHERE id = ?",
+                                    (stat.st_size, stat.st_mtime_ns, file_hash, time.time(), library_id))
+            rows = {row["name"]: row for row in self.connection.execute("SELECT * FROM primitives WHERE library_id = ?", (library_id,))}
+
+        # Proxy/LOD variants are not listed, searches return primitives
+        entries = readIndex(path) if stat.st_size > 0 else {}
+        entries = {name: entry for name, entry in entries.items() if not isVariantName(name, entries)}
+        removed = [(library_id, name) for name in rows if name not in entries]
+        self.connection.executemany("DELETE FROM primitives WHERE library_id = ? AND name = ?", removed)
+
+        # Unchanged entries keep their statistics, only their location is refreshed
+        moved = [(entry["offset"], entry["length"], library_id, name) for name, entry in entries.items()
+                 if name in rows and rows[name]["entry_key"] == entryKey(entry)]
+        self.connection.executemany("UPDATE primitives SET offset = ?, length = ? WHERE library_id = ? AND name = ?", moved)
+
+        changed = {name for name, entry in entries.items() if name not in rows or rows[name]["entry_key"] != entryKey(entry)}
+        if not changed:
+            return 0
+
+        # Indexed libraries are read entry by entry, text libraries have no checksums and are streamed whole
+        if all(entries[name].get("checksum") is not None for name in changed):
+            records = ((name, entries[name], readPrimitive(path, name, entries)) for name in changed)
+        else:
+            records = (record for record in iterEntries(path) if record[0] in changed)
+
+        read = 0
+        for name, entry, payload in records:
+            stats = meshStatistics(payload, entry["format"])
+            self.connection.execute(
+                "INSERT OR REPLACE INTO primitives (library_id, name, entry_key, offset, length, format, vertices, faces, triangles,"
+                " min_x, min_y, min_z, max_x, max_y, max_z, size) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (library_id, name, entryKey(entry), entry["offset"], entry["length"], entry["format"],
+                 stats["vertices"], stats["faces"], stats["triangles"],
+                 stats["min_x"], stats["min_y"], stats["min_z"], stats["max_x"], stats["max_y"], stats["max_z"], stats["size"]))
+            read += 1
+        return read
+
+    """
+    Searches every indexed library, returns rows as dicts ordered by name.
+    - name: substring to match (case-insensitive), None for any
+    - min_faces/max_faces: polygon budget, max_size: largest bounding box side
+    - library: restrict to one library path
+    """
+    def query(self, name=None, min_faces=None, max_faces=None, max_size=None, library=None, limit=1000):
+        conditions, values = [], []
+        if name:
+            conditions.append("p.name LIKE ? ESCAPE '\\'")
+            values.append("%" + name.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%")
+        if min_faces is not None:
+            conditions.append("p.faces >= ?")
+            values.append(min_faces)
+        if max_faces is not None:
+            conditions.append("p.faces <= ?")
+            values.append(max_faces)
+        if max_size is not None:
+            conditions.append("p.size <= ?")
+            values.append(max_size)
+        if library is not None:
+            conditions.append("l.path = ?")
+            values.append(os.path.realpath(library))
+
+        where = ("WHERE " + " AND ".join(conditions)) if conditions else ""
+        rows = self.connection.execute(
+            f"SELECT p.*, l.path AS library FROM primitives p JOIN libraries l ON l.id = p.library_id {where}"
+            " ORDER BY p.name, l.path LIMIT ?", values + [limit])
+        return [dict(row) for row in rows]
+
+    # Library count, primitive count and total vertices/faces
+    def statistics(self):
+        row = self.connection.execute(
+            "SELECT (SELECT COUNT(*) FROM libraries) AS libraries, COUNT(*) AS primitives,"
+            " COALESCE(SUM(vertices), 0) AS vertices, COALESCE(SUM(faces), 0) AS faces FROM primitives").fetchone()
+        return dict(row)
@@ -0,0 +1,189 @@
+try:
+    from PySide2 import QtCore
+except ImportError:
+    from PySide6 import QtCore
+
+import threading
+import time
+
+from PrimFile import PrimFileError, iterIndex, upgradePrimFile, libraryKey
+from Thumbnails import thumbnailIndex, THUMBNAILS_PATH
+from Catalog import fileStamp, libraryStamp
+from Proxies import isVariantName
+
+# -----------------------------------------------------------------------
+# Opens libraries off the UI thread.
+# - The file I/O (upgrading text libraries, reading or scanning the index,
+#   listing thumbnails) runs as tasks on a small thread pool, and so does
+#   fetching the index of a remote library
+# - Names reach the UI thread in batches as they are read, so the gallery
+#   fills while a big text library is still being scanned
+# - Nothing is swapped in until every task is done: a cancelled or failed
+#   open leaves the current library, its catalog and the library file as
+#   they were
+# -----------------------------------------------------------------------
+
+# Names are handed to the UI at most this often (seconds), or once this many are pending
+BATCH_INTERVAL = 0.1
+BATCH_SIZE = 5000
+
+class _LoadCancelled(Exception):
+    pass
+
+class libraryLoadSignals(QtCore.QObject):
+    progress = QtCore.Signal(object, object, str) # done, total, stage
+    names = QtCore.Signal(object) # list of names read so far
+    library = QtCore.Signal(object) # (stamp, entries)
+    thumbnails = QtCore.Signal(object) # (stamp, thumbnail index)
+    failed = QtCore.Signal(str)
+
+# Upgrades the library if asked to, then streams its index
+class libraryIndexTask(QtCore.QRunnable):
+    def __init__(self, path, upgrade, cancelled, signals):
+        super().__init__()
+        self.path = path
+        self.upgrade = upgrade
+        self.cancelled = cancelled
+        self.signals = signals
+
+    def run(self):
+        try:
+            if self.upgrade:
+                self.upgradeLibrary()
+            self.readIndex()
+        except _LoadCancelled:
+            pass
+        except (OSError, PrimFileError) as error:
+            self.signals.failed.emit(str(error))
+        except Exception as error:
+            # Anything else (a malformed remote index, undecodable text, a payload codec missing its module) still ends the load
+            self.signals.failed.emit(f"{type(error).__name__}: {error}")
+
+    # Progress callback shared by both stages, throttled to BATCH_INTERVAL
+    def report(self, done, total, stage, force=False):
+        if self.cancelled.is_set():
+            return False
+        now = time.monotonic()
+        if force or now - self.reported >= BATCH_INTERVAL:
+            self.reported = now
+            self.signals.progress.emit(done, total, stage)
+        return True
+
+    def upgradeLibrary(self):
+        self.reported = 0.0
+        upgradePrimFile(self.path, lambda done, total: self.report(done, total, "Upgrading"))
+        if self.cancelled.is_set():
+            raise _LoadCancelled()
+
+    def readIndex(self):
+        self.reported = 0.0
+        stamp = libraryStamp(self.path)
+        size = stamp[0] if stamp else 0
+        entries = {}
+        batch = []
+        for name, entry, done in iterIndex(self.path) if size > 0 else ():
+            if self.cancelled.is_set():
+                raise _LoadCancelled()
+
+            entries.pop(name, None)
+            entries[name] = entry
+            if not isVariantName(name, entries):
+                batch.append(name)
+            if len(batch) >= BATCH_SIZE or (batch and time.monotonic() - self.reported >= BATCH_INTERVAL):
+                self.signals.names.emit(batch)
+                batch = []
+                self.report(done, size, "Reading", force=True)
+
+        if batch:
+            self.signals.names.emit(batch)
+        self.report(size, size, "Reading", force=True)
+        self.signals.library.emit((stamp, entries))
+
+class thumbnailIndexTask(QtCore.QRunnable):
+    def __init__(self, path, signals):
+        super().__init__()
+        self.path = path
+        self.signals = signals
+
+    def run(self):
+        try:
+            self.signals.thumbnails.emit((fileStamp(self.path), thumbnailIndex(self.path)))
+        except Exception as error:
+            self.signals.failed.emit(f"Could not list thumbnails: {error}")
+
+"""
+Opens one library in the background.
+- Callbacks run on the UI thread: progress(done, total, stage), names(batch), thumbnails(thumbnail index),
+  finished(preloaded), failed(message)
+- preloaded is handed to Catalog.installCatalog, which builds the catalog without reading anything again
+- cancel() stops the tasks at the next entry; finished is then never called, and an interrupted upgrade is discarded
+"""
+class libraryLoad(QtCore.QObject):
+    pool = None
+
+    def __init__(self, path, upgrade=False, thumbnails_path=THUMBNAILS_PATH, parent=None):
+        super().__init__(parent)
+        self.path = libraryKey(path)
+        self.upgrade = upgrade
+        self.thumbnails_path = thumbnails_path
+        self.cancelled = threading.Event()
+        self.preloaded = {}
+        self.done = False
+
+        self.progress = None
+        self.names = None
+        self.thumbnails = None
+        self.finished = None
+        self.failed = None
+
+        # Signals are delivered on the UI thread, where this object lives
+        self.signals = libraryLoadSignals()
+        self.signals.progress.connect(self.onProgress)
+        self.signals.names.connect(self.onNames)
+        self.signals.library.connect(lambda result: self.onLoaded("library", result))
+        self.signals.thumbnails.connect(lambda result: self.onLoaded("thumbnails", result))
+        self.signals.failed.connect(self.onFailed)
+
+    @classmethod
+    def threadPool(cls):
+        if cls.pool is None:
+            cls.pool = QtCore.QThreadPool()
+            cls.pool.setMaxThreadCount(2)
+        return cls.pool
+
+    def start(self):
+        self.threadPool().start(libraryIndexTask(self.path, self.upgrade, self.cancelled, self.signals))
+        self.threadPool().start(thumbnailIndexTask(self.thumbnails_path, self.signals))
+
+    def cancel(self):
+        self.cancelled.set()
+        self.done = True
+
+    def isRunning(self):
+        return not self.done
+
+    def onProgress(self, done, total, stage):
+        if not self.done and self.progress is not None:
+            self.progress(done, total, stage)
+
+    def onNames(self, names):
+        if not self.done and self.names is not None:
+            self.names(names)
+
+    def onLoaded(self, kind, result):
+        if self.done:
+            return
+        self.preloaded[kind] = result
+        if kind == "thumbnails" and self.thumbnails is not None:
+            self.thumbnails(result[1])
+        if len(self.preloaded) == 2:
+            self.done = True
+            if self.finished is not None:
+                self.finished(self.preloaded)
+
+    def onFailed(self, message):
+        if self.done:
+            return
+        self.done = True
+        if self.failed is not None:
+            self.failed(message)
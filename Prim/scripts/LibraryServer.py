@@ -0,0 +1,334 @@
+import argparse
+import gzip
+import json
+import os
+import threading
+import urllib.parse
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from PrimFile import PrimFileError, readIndex, readPrimitive, readThumbnailAt
+
+# -----------------------------------------------------------------------
+# Prim library server: serves the .prim libraries under a folder over
+# HTTP, so artists browse a shared library without copying it whole (the
+# client side is RemoteLibrary). Plain CPython, no Maya needed:
+#
+#   python LibraryServer.py /studio/libraries --port 8765
+#
+#   GET /libraries                              JSON list of the libraries
+#   GET /libraries/<path>.prim                  the library file
+#   GET /libraries/<path>.prim/index            JSON index: file size, file ETag, entries
+#   GET /libraries/<path>.prim/payloads/<name>  one primitive's payload
+#   GET /libraries/<path>.prim/thumbnails/<name>  its embedded PNG thumbnail
+#
+# - ETags come from the library file's (size, mtime) for the file and its
+#   index, from the entry checksum for payloads and thumbnails.
+#   If-None-Match answers 304, If-Match answers 412 once the file changed
+# - Single byte ranges are served (Range, If-Range), e.g. one thumbnail
+#   out of the library file
+# - The index and OBJ text payloads are gzipped for clients that accept it
+# - Shared payloads (blob references) are resolved here, clients only see
+#   bytes; text libraries are indexed here too
+# - Read-only, HTTP/1.1 keep-alive with one thread per connection
+# -----------------------------------------------------------------------
+
+DEFAULT_PORT = 8765
+
+# Responses smaller than this are not worth gzipping
+GZIP_MIN_SIZE = 1024
+
+# Bytes sent per write when streaming a library file
+CHUNK_SIZE = 1024 * 1024
+
+class _RangeNotSatisfiable(Exception):
+    pass
+
+"""
+Serves every .prim library under root (see the routes above) until shutdown() is called.
+- Library indexes are read once per version of the file, and shared by every request
+- verbose: log each request to stderr
+"""
+class libraryServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, root, address=("", DEFAULT_PORT), verbose=False, handler=None):
+        self.root = os.path.realpath(root)
+        self.verbose = verbose
+        self.indexes = {} # library path -> (stamp, entries, index JSON, gzipped index JSON)
+        self.indexes_lock = threading.Lock()
+        super().__init__(address, handler or libraryRequestHandler)
+
+    # Base URL clients open libraries under
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{'localhost' if host in ('', '0.0.0.0') else host}:{port}"
+
+    # Library path for a path relative to root, None if it is not a library under root
+    def libraryPath(self, relative):
+        path = os.path.realpath(os.path.join(self.root, relative))
+        if not path.startswith(self.root + os.sep) or not path.endswith(".prim") or not os.path.isfile(path):
+            return None
+        return path
+
+    def libraries(self):
+        found = []
+        for folder, subfolders, files in os.walk(self.root):
+            subfolders.sort()
+            for file_name in sorted(files):
+                if file_name.endswith(".prim"):
+                    path = os.path.join(folder, file_name)
+                    found.append({"name": os.path.relpath(path, self.root).replace(os.sep, "/"), "size": os.path.getsize(path)})
+        return found
+
+    """
+    Index of a library, read again only after the file changed: (stamp, entries, JSON, gzipped JSON).
+    - Entries lose their "blob" references, payloads are resolved by the server
+    """
+    def libraryIndex(self, path):
+        stamp = _fileStamp(path)
+        with self.indexes_lock:
+            cached = self.indexes.get(path)
+        if cached is not None and cached[0] == stamp:
+            return cached
+
+        entries = readIndex(path)
+        if _fileStamp(path) != stamp:
+            # Rewritten while reading, the next request reads it again
+            return stamp, entries, None, None
+        served = {name: {key: value for key, value in entry.items() if key != "blob"} for name, entry in entries.items()}
+        body = json.dumps({"size": stamp[0], "etag": _libraryTag(stamp), "entries": served}, separators=(",", ":")).encode("utf-8")
+        cached = (stamp, entries, body, gzip.compress(body, 6))
+        with self.indexes_lock:
+            self.indexes[path] = cached
+        return cached
+
+class libraryRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "PrimLibraryServer/1"
+    # Headers and body are separate writes, with Nagle's algorithm a kept-alive connection waits on delayed ACKs
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        self.route(head=False)
+
+    def do_HEAD(self):
+        self.route(head=True)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    # /libraries[/<path>.prim[/index | /payloads/<name> | /thumbnails/<name>]]
+    def route(self, head):
+        segments = [urllib.parse.unquote(segment) for segment in urllib.parse.urlsplit(self.path).path.split("/") if segment]
+        if not segments or segments[0] != "libraries":
+            return self.sendError(404, "Not a library server path")
+        if len(segments) == 1:
+            body = json.dumps({"libraries": self.server.libraries()}).encode("utf-8")
+            return self.sendBytes(body, None, "application/json", head)
+
+        end = next((i for i, segment in enumerate(segments) if segment.endswith(".prim")), None)
+        path = self.server.libraryPath("/".join(segments[1:end + 1])) if end is not None else None
+        if path is None:
+            return self.sendError(404, "No such library")
+        rest = segments[end + 1:]
+
+        try:
+            if not rest:
+                return self.sendFile(path, head)
+
+            stamp, entries, body, gzipped = self.server.libraryIndex(path)
+            if rest == ["index"] and body is not None:
+                return self.sendBytes(body, _libraryTag(stamp), "application/json", head, gzipped=gzipped, ranges=False)
+            if rest == ["index"]:
+                return self.sendError(503, "The library is being rewritten, try again")
+            if len(rest) != 2 or rest[0] not in ("payloads", "thumbnails"):
+                return self.sendError(404, "Unknown library path")
+
+            name = rest[1]
+            entry = entries.get(name)
+            if entry is None:
+                return self.sendError(404, f"No primitive named \"{name}\"")
+            if rest[0] == "payloads":
+                # Conditional requests are answered from the index, without reading the payload
+                tag = _entryTag(entry) if entry.get("checksum") is not None else _libraryTag(stamp)
+                if self.preconditionFailed(tag) or self.notModified(tag):
+                    return self.sendBytes(b"", tag, "application/octet-stream", head)
+                payload = readPrimitive(path, name, entries)
+                gzipped = gzip.compress(payload, 6) if entry["format"] == "obj" and self.acceptsGzip() else None
+                return self.sendBytes(payload, tag, "application/octet-stream", head, gzipped=gzipped)
+
+            thumbnail = entry.get("thumbnail")
+            if thumbnail is None:
+                return self.sendError(404, f"Primitive \"{name}\" has no embedded thumbnail")
+            tag = _entryTag(thumbnail)
+            if self.preconditionFailed(tag) or self.notModified(tag):
+                return self.sendBytes(b"", tag, "image/png", head)
+            png = readThumbnailAt(path, thumbnail["offset"], thumbnail["length"], thumbnail["checksum"])
+            return self.sendBytes(png, tag, "image/png", head)
+        except (OSError, PrimFileError) as error:
+            # Most likely rewritten (saved to, compacted) since its index was read
+            return self.sendError(503, str(error))
+
+    def acceptsGzip(self):
+        return "gzip" in self.headers.get("Accept-Encoding", "")
+
+    def notModified(self, tag):
+        header = self.headers.get("If-None-Match")
+        return header is not None and (header.strip() == "*" or _weak(tag) in (_weak(value) for value in header.split(",")))
+
+    # If-Match is compared strongly: weak tags (gzipped responses) never match
+    def preconditionFailed(self, tag):
+        header = self.headers.get("If-Match")
+        return header is not None and header.strip() != "*" and tag not in (value.strip() for value in header.split(","))
+
+    # The requested byte range of size bytes as (start, end inclusive), None for the whole content
+    def requestedRange(self, size, tag):
+        header = self.headers.get("Range")
+        if header is None or not header.startswith("bytes=") or "," in header:
+            return None
+        if_range = self.headers.get("If-Range")
+        if if_range is not None and if_range.strip() != tag:
+            return None
+
+        first, separator, last = header[len("bytes="):].strip().partition("-")
+        try:
+            if not first:
+                length = int(last)
+                if length <= 0:
+                    raise _RangeNotSatisfiable()
+                return max(0, size - length), size - 1
+            start = int(first)
+            end = min(int(last), size - 1) if last else size - 1
+        except ValueError:
+            return None
+        if start >= size or end < start:
+            raise _RangeNotSatisfiable()
+        return start, end
+
+    """
+    Answers with body (or a range of it), after the conditional headers.
+    - gzipped: the body gzipped, sent instead to clients that accept it; ranges always apply to the plain body
+    """
+    def sendBytes(self, body, tag, content_type, head, gzipped=None, ranges=True):
+        if tag is not None and self.preconditionFailed(tag):
+            return self.sendError(412, "The library changed")
+        if tag is not None and self.notModified(tag):
+            return self.sendNotModified(tag)
+
+        status, content_range = 200, None
+        if ranges:
+            try:
+                requested = self.requestedRange(len(body), tag)
+            except _RangeNotSatisfiable:
+                return self.sendError(416, "Range not satisfiable", {"Content-Range": f"bytes */{len(body)}"})
+            if requested is not None:
+                start, end = requested
+                status, content_range, body, gzipped = 206, f"bytes {start}-{end}/{len(body)}", body[start:end + 1], None
+
+        encode = gzipped is not None and self.acceptsGzip() and len(body) >= GZIP_MIN_SIZE
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        if tag is not None:
+            # Gzipped bytes are another representation of the same content, their tag is weak
+            self.send_header("ETag", "W/" + tag if encode else tag)
+        if ranges:
+            self.send_header("Accept-Ranges", "bytes")
+        if gzipped is not None:
+            self.send_header("Vary", "Accept-Encoding")
+        if encode:
+            body = gzipped
+            self.send_header("Content-Encoding", "gzip")
+        if content_range is not None:
+            self.send_header("Content-Range", content_range)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if not head:
+            self.wfile.write(body)
+
+    # Streams a library file, or a range of it
+    def sendFile(self, path, head):
+        with open(path, "rb") as file:
+            stamp = _fileStamp(path)
+            size = stamp[0]
+            tag = _libraryTag(stamp)
+            if self.preconditionFailed(tag):
+                return self.sendError(412, "The library changed")
+            if self.notModified(tag):
+                return self.sendNotModified(tag)
+            try:
+                requested = self.requestedRange(size, tag)
+            except _RangeNotSatisfiable:
+                return self.sendError(416, "Range not satisfiable", {"Content-Range": f"bytes */{size}"})
+
+            start, end = requested if requested is not None else (0, size - 1)
+            self.send_response(206 if requested is not None else 200)
+            self.send_header("Content-Type", "application/octet-stream")
+            self.send_header("ETag", tag)
+            self.send_header("Accept-Ranges", "bytes")
+            if requested is not None:
+                self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+            self.send_header("Content-Length", str(end - start + 1))
+            self.end_headers()
+            if head:
+                return
+
+            file.seek(start)
+            remaining = end - start + 1
+            while remaining > 0:
+                chunk = file.read(min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                self.wfile.write(chunk)
+                remaining -= len(chunk)
+
+    def sendNotModified(self, tag):
+        self.send_response(304)
+        self.send_header("ETag", tag)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def sendError(self, status, message, headers=None):
+        body = (message + "\n").encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "text/plain; charset=utf-8")
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+def _fileStamp(path):
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime_ns
+
+def _libraryTag(stamp):
+    return '"%x-%x"' % stamp
+
+def _entryTag(entry):
+    return '"%08x-%x"' % (entry["checksum"], entry["length"])
+
+def _weak(tag):
+    tag = tag.strip()
+    return tag[2:] if tag.startswith("W/") else tag
+
+def main():
+    parser = argparse.ArgumentParser(description="Serves the Prim libraries (.prim) under a folder to Prim clients.")
+    parser.add_argument("root", help="folder holding the libraries, subfolders included")
+    parser.add_argument("--host", default="", help="address to listen on (default: every interface)")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"port to listen on (default {DEFAULT_PORT})")
+    parser.add_argument("--verbose", action="store_true", help="log every request")
+    args = parser.parse_args()
+
+    server = libraryServer(args.root, (args.host, args.port), args.verbose)
+    print(f"Serving {len(server.libraries())} libraries from {server.root} at {server.url()}/libraries")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
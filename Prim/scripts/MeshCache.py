@@ -0,0 +1,110 @@
+import collections
+import hashlib
+import os
+
+from PrimFile import readIndex, readPrimitive, libraryKey, entryKey
+from MeshData import payloadToObj
+from Instrumentation import countBytes
+
+# -----------------------------------------------------------------------
+# On-disk cache of .obj files extracted from .prim libraries on first use.
+# - Entries are keyed by library and mesh, so switching libraries keeps warm files
+# - Total size is bounded, least recently used files are evicted first
+# - File mtimes record use, so LRU order survives restarting Maya
+# -----------------------------------------------------------------------
+
+DEFAULT_CACHE_LIMIT = 2 * 1024 * 1024 * 1024
+
+class meshCache():
+    def __init__(self, root, limit=DEFAULT_CACHE_LIMIT):
+        self.root = root
+        self.limit = limit
+        self.entries = collections.OrderedDict() # cache path -> size, oldest first
+        self.size = 0
+        self.scan()
+
+    # Load existing cache files, oldest use first
+    def scan(self):
+        self.entries.clear()
+        self.size = 0
+        if not os.path.isdir(self.root):
+            return
+
+        found = []
+        for folder in os.listdir(self.root):
+            folder_path = os.path.join(self.root, folder)
+            if not os.path.isdir(folder_path):
+                continue
+            for item in os.listdir(folder_path):
+                if item.endswith(".obj"):
+                    stat = os.stat(os.path.join(folder_path, item))
+                    found.append((stat.st_mtime, os.path.join(folder_path, item), stat.st_size))
+
+        for mtime, path, size in sorted(found):
+            self.entries[path] = size
+            self.size += size
+
+    def setLimit(self, limit):
+        self.limit = limit
+        self.evict()
+
+    # Cache folder for a library: readable name plus a hash of its full path (or URL)
+    def libraryFolder(self, library_path):
+        library_path = libraryKey(library_path)
+        name = os.path.splitext(os.path.basename(library_path))[0]
+        digest = hashlib.sha1(library_path.encode("utf-8")).hexdigest()[:10]
+        return os.path.join(self.root, f"{name}-{digest}")
+
+    # The entry's checksum (or location for legacy files) is part of the file name, so re-saved meshes never hit stale files
+    def meshPath(self, library_path, name, entry):
+        return os.path.join(self.libraryFolder(library_path), f"{name}.{entryKey(entry)}.obj")
+
+    """
+    Returns the path of an extracted .obj for a mesh in a library.
+    - Extracts the mesh from the library on a cache miss
+    - Marks the file as most recently used
+    """
+    def getMesh(self, library_path, name, entries=None):
+        if entries is None:
+            entries = readIndex(library_path)
+        path = self.meshPath(library_path, name, entries[name])
+
+        if path in self.entries and os.path.exists(path):
+            self.entries.move_to_end(path)
+            os.utime(path)
+            return path
+
+        payload = payloadToObj(readPrimitive(library_path, name, entries), entries[name]["format"])
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = path + ".tmp"
+        with open(temp_path, "wb") as file:
+            file.write(payload)
+        countBytes(written=len(payload))
+        os.replace(temp_path, path)
+
+        self.size -= self.entries.pop(path, 0)
+        self.entries[path] = len(payload)
+        self.size += len(payload)
+        self.evict(keep=path)
+        return path
+
+    # Drop every cached file of a mesh in a library
+    def discardMesh(self, library_path, name):
+        folder = self.libraryFolder(library_path)
+        for path in [p for p in self.entries if os.path.dirname(p) == folder and os.path.basename(p).rsplit(".", 2)[0] == name]:
+            self._remove(path)
+
+    # Evict least recently used files until the cache fits its limit
+    def evict(self, keep=None):
+        for path in list(self.entries):
+            if self.size <= self.limit:
+                break
+            if path != keep:
+                self._remove(path)
+
+    def _remove(self, path):
+        self.size -= self.entries.pop(path, 0)
+        try:
+            os.remove(path)
+        except OSError:
+            pass
@@ -0,0 +1,479 @@
+from array import array
+import struct
+import zlib
+
+from PrimFile import PrimFileError, iterEntries, writePrimFile, writeBlob, registerBlobLibrary, exportPrimFile, libraryLock
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# -----------------------------------------------------------------------
+# Mesh geometry as typed arrays, and the binary "geometry" .prim payload.
+#
+# Payload layout (little-endian):
+#   header    "PGEO", version, section count
+#   sections  tag, type code, item count, byte offset (from payload start)
+#   data      packed float32/int32 arrays, 8-byte aligned
+#
+# Sections map directly onto MFnMesh.create() arguments: positions (xyz),
+# polygon counts and polygon connects, plus optional normals and UVs with
+# their per face-vertex ids.
+#
+# "compact" payloads are the same arrays, quantized for distribution:
+#   header    "PQGE", version, bit depths, flags, element counts
+#   bounds    float32 min and size of each attribute's per-mesh bounding box
+#   data      zlib stream of varints: positions, UVs and normals as grid
+#             cells delta-encoded along the vertex order, polygon counts,
+#             then each id array relative to its high-water mark
+#
+# Faces are sorted along a Morton curve and vertices renumbered in order of
+# first use, so ids stay small and nearby corners share cache lines. Each
+# payload is compressed on its own: any primitive still decodes from its
+# record alone. Decoding needs NumPy.
+# -----------------------------------------------------------------------
+
+GEOMETRY_MAGIC = b"PGEO"
+GEOMETRY_VERSION = 1
+
+# magic, version, section count
+GEOMETRY_HEADER = struct.Struct("<4sHH")
+
+# tag, type code, item count, byte offset
+GEOMETRY_SECTION = struct.Struct("<4ss3xQQ")
+
+# attribute, tag, type code
+GEOMETRY_SECTIONS = (
+    ("positions", b"POS ", "f"),
+    ("counts", b"CNT ", "i"),
+    ("connects", b"IDX ", "i"),
+    ("normals", b"NRM ", "f"),
+    ("normal_ids", b"NID ", "i"),
+    ("uvs", b"UVS ", "f"),
+    ("uv_ids", b"UID ", "i")
+)
+
+COMPACT_MAGIC = b"PQGE"
+COMPACT_VERSION = 1
+
+# magic, version, position/uv/normal bits, flags, vertex/face/corner/uv/normal counts
+COMPACT_HEADER = struct.Struct("<4sHBBBB5I")
+COMPACT_UVS = 1
+COMPACT_NORMALS = 2
+
+# Default grid resolutions: 16 bits keeps positions within 1/131070 of the mesh's size on each axis
+DEFAULT_POSITION_BITS = 16
+DEFAULT_UV_BITS = 14
+DEFAULT_NORMAL_BITS = 10
+
+"""
+Geometry of one mesh as flat typed arrays (array.array or memoryview).
+- positions: x, y, z per vertex
+- counts: vertex count per face
+- connects: vertex index per face-vertex
+- normals/normal_ids, uvs/uv_ids: optional, ids are per face-vertex
+"""
+class meshData():
+    def __init__(self, positions, counts, connects, normals=None, normal_ids=None, uvs=None, uv_ids=None):
+        self.positions = positions
+        self.counts = counts
+        self.connects = connects
+        self.normals = normals
+        self.normal_ids = normal_ids
+        self.uvs = uvs
+        self.uv_ids = uv_ids
+
+    def vertexCount(self):
+        return len(self.positions) // 3
+
+    def faceCount(self):
+        return len(self.counts)
+
+# Packs mesh arrays into a "geometry" payload
+def packMeshData(mesh):
+    sections = []
+    for attribute, tag, code in GEOMETRY_SECTIONS:
+        values = getattr(mesh, attribute)
+        if values is None:
+            continue
+        data = memoryview(values).cast("B").tobytes() if isinstance(values, memoryview) else array(code, values).tobytes()
+        sections.append((tag, code, len(data) // 4, data))
+
+    offset = GEOMETRY_HEADER.size + GEOMETRY_SECTION.size * len(sections)
+    table = [GEOMETRY_HEADER.pack(GEOMETRY_MAGIC, GEOMETRY_VERSION, len(sections))]
+    blobs = []
+    for tag, code, count, data in sections:
+        padding = -offset % 8
+        offset += padding
+        table.append(GEOMETRY_SECTION.pack(tag, code.encode("ascii"), count, offset))
+        blobs.append(b"\0" * padding + data)
+        offset += len(data)
+
+    return b"".join(table + blobs)
+
+# Unpacks a "geometry" payload into memoryviews over the same buffer, without copying
+def unpackMeshData(payload):
+    view = memoryview(payload).cast("B")
+    magic, version, section_count = GEOMETRY_HEADER.unpack_from(view, 0)
+    if magic != GEOMETRY_MAGIC:
+        raise PrimFileError("Payload is not packed geometry")
+    if version > GEOMETRY_VERSION:
+        raise PrimFileError(f"Unsupported geometry payload version {version}, please update Prim")
+
+    arrays = {}
+    tags = {tag: attribute for attribute, tag, code in GEOMETRY_SECTIONS}
+    for i in range(section_count):
+        tag, code, count, offset = GEOMETRY_SECTION.unpack_from(view, GEOMETRY_HEADER.size + i * GEOMETRY_SECTION.size)
+        if tag in tags:
+            arrays[tags[tag]] = view[offset:offset + count * 4].cast(code.decode("ascii"))
+
+    return meshData(**arrays)
+
+"""
+Parses OBJ text into mesh arrays.
+- Only the first vertex/uv/normal of each face corner is kept, groups and materials are ignored
+- UVs and normals are dropped unless every face corner references them
+"""
+def objToMeshData(payload):
+    positions, normals, uvs = array("f"), array("f"), array("f")
+    counts, connects, normal_ids, uv_ids = array("i"), array("i"), array("i"), array("i")
+
+    for line in bytes(payload).splitlines():
+        parts = line.split()
+        if not parts:
+            continue
+
+        tag = parts[0]
+        if tag == b"v":
+            positions.extend(float(value) for value in parts[1:4])
+        elif tag == b"vt":
+            uvs.extend(float(value) for value in parts[1:3])
+        elif tag == b"vn":
+            normals.extend(float(value) for value in parts[1:4])
+        elif tag == b"f":
+            counts.append(len(parts) - 1)
+            for corner in parts[1:]:
+                ids = corner.split(b"/")
+                connects.append(_objIndex(ids[0], len(positions) // 3))
+                if len(ids) > 1 and ids[1]:
+                    uv_ids.append(_objIndex(ids[1], len(uvs) // 2))
+                if len(ids) > 2 and ids[2]:
+                    normal_ids.append(_objIndex(ids[2], len(normals) // 3))
+
+    mesh = meshData(positions, counts, connects)
+    if uvs and len(uv_ids) == len(connects):
+        mesh.uvs, mesh.uv_ids = uvs, uv_ids
+    if normals and len(normal_ids) == len(connects):
+        mesh.normals, mesh.normal_ids = normals, normal_ids
+    return mesh
+
+# Writes mesh arrays as OBJ text
+def meshDataToObj(mesh):
+    lines = []
+    positions = mesh.positions
+    for i in range(0, len(positions), 3):
+        lines.append("v %.9g %.9g %.9g" % (positions[i], positions[i + 1], positions[i + 2]))
+    if mesh.uvs is not None:
+        for i in range(0, len(mesh.uvs), 2):
+            lines.append("vt %.9g %.9g" % (mesh.uvs[i], mesh.uvs[i + 1]))
+    if mesh.normals is not None:
+        for i in range(0, len(mesh.normals), 3):
+            lines.append("vn %.9g %.9g %.9g" % (mesh.normals[i], mesh.normals[i + 1], mesh.normals[i + 2]))
+
+    corner = 0
+    for count in mesh.counts:
+        face = []
+        for i in range(corner, corner + count):
+            vertex = str(mesh.connects[i] + 1)
+            if mesh.uv_ids is not None and mesh.normal_ids is not None:
+                face.append(f"{vertex}/{mesh.uv_ids[i] + 1}/{mesh.normal_ids[i] + 1}")
+            elif mesh.uv_ids is not None:
+                face.append(f"{vertex}/{mesh.uv_ids[i] + 1}")
+            elif mesh.normal_ids is not None:
+                face.append(f"{vertex}//{mesh.normal_ids[i] + 1}")
+            else:
+                face.append(vertex)
+        lines.append("f " + " ".join(face))
+        corner += count
+
+    return ("\n".join(lines) + "\n").encode("utf-8")
+
+"""
+Encodes mesh arrays as a "compact" payload, returns (payload, max_error). Requires NumPy.
+- Positions, UVs and normals snap to a grid of 2^bits cells over their per-mesh bounding box
+- max_error: largest distance between a vertex and its decoded position, in scene units
+- Face and vertex order change, the geometry does not (beyond quantization)
+"""
+def compactMeshData(mesh, position_bits=DEFAULT_POSITION_BITS, uv_bits=DEFAULT_UV_BITS, normal_bits=DEFAULT_NORMAL_BITS):
+    if numpy is None:
+        raise ImportError("NumPy is not available in this Python")
+    for bits in (position_bits, uv_bits, normal_bits):
+        if not 1 <= bits <= 24:
+            raise ValueError(f"Quantization bit depths go from 1 to 24, got {bits}")
+
+    arrays = meshDataToNumpy(mesh)
+    positions = arrays["positions"]
+    counts = arrays["counts"]
+    connects = arrays["connects"].astype(numpy.int64)
+
+    # Faces along a Morton curve through their first corner, then vertices in order of first use
+    starts = numpy.cumsum(counts) - counts
+    face_order = numpy.argsort(_mortonCodes(positions[connects[starts]] if len(counts) else positions[:0]), kind="stable")
+    corner_order = _cornerOrder(counts, starts, face_order)
+    connects, vertex_order = _renumber(connects[corner_order], len(positions))
+
+    streams = [_encodeGrid(positions[vertex_order], position_bits)]
+    decoded = _decodeGrid(*streams[0], position_bits).astype(numpy.float32)
+    max_error = float(numpy.sqrt(((decoded - positions[vertex_order]).astype(numpy.float64) ** 2).sum(axis=1)).max()) if len(positions) else 0.0
+
+    flags, uv_count, normal_count = 0, 0, 0
+    id_streams = [connects]
+    if mesh.uvs is not None:
+        uv_ids, uv_order = _renumber(arrays["uv_ids"].astype(numpy.int64)[corner_order], len(arrays["uvs"]) // 2)
+        streams.append(_encodeGrid(arrays["uvs"].reshape(-1, 2)[uv_order], uv_bits))
+        id_streams.append(uv_ids)
+        flags |= COMPACT_UVS
+        uv_count = len(uv_order)
+    if mesh.normals is not None:
+        normal_ids, normal_order = _renumber(arrays["normal_ids"].astype(numpy.int64)[corner_order], len(arrays["normals"]) // 3)
+        streams.append(_encodeGrid(arrays["normals"].reshape(-1, 3)[normal_order], normal_bits))
+        id_streams.append(normal_ids)
+        flags |= COMPACT_NORMALS
+        normal_count = len(normal_order)
+
+    header = COMPACT_HEADER.pack(COMPACT_MAGIC, COMPACT_VERSION, position_bits, uv_bits, normal_bits, flags,
+                                 len(positions), len(counts), len(connects), uv_count, normal_count)
+    bounds = b"".join(numpy.concatenate((low, size)).astype(numpy.float32).tobytes() for deltas, low, size in streams)
+    values = [deltas for deltas, low, size in streams] + [counts[face_order].astype(numpy.int64)] + [_highWaterCodes(ids) for ids in id_streams]
+    data = _packVarints(numpy.concatenate([value.reshape(-1) for value in values]))
+    return header + bounds + zlib.compress(data, 9), max_error
+
+# Decodes a "compact" payload into mesh arrays (requires NumPy)
+def expandMeshData(payload):
+    if numpy is None:
+        raise ImportError("NumPy is not available in this Python")
+
+    view = memoryview(payload).cast("B")
+    magic, version, position_bits, uv_bits, normal_bits, flags, vertex_count, face_count, corner_count, uv_count, normal_count = \
+        COMPACT_HEADER.unpack_from(view, 0)
+    if magic != COMPACT_MAGIC:
+        raise PrimFileError("Payload is not compact geometry")
+    if version > COMPACT_VERSION:
+        raise PrimFileError(f"Unsupported compact payload version {version}, please update Prim")
+
+    # (dimensions, element count, bits) of each quantized attribute, in payload order
+    grids = [(3, vertex_count, position_bits)]
+    if flags & COMPACT_UVS:
+        grids.append((2, uv_count, uv_bits))
+    if flags & COMPACT_NORMALS:
+        grids.append((3, normal_count, normal_bits))
+
+    offset = COMPACT_HEADER.size
+    bounds = []
+    for dimensions, count, bits in grids:
+        bounds.append(numpy.frombuffer(view[offset:offset + dimensions * 8], dtype=numpy.float32).reshape(2, dimensions))
+        offset += dimensions * 8
+    try:
+        values = _unpackVarints(numpy.frombuffer(zlib.decompress(view[offset:]), dtype=numpy.uint8))
+    except zlib.error as error:
+        raise PrimFileError(f"Corrupt compact payload: {error}")
+    if len(values) != sum(dimensions * count for dimensions, count, bits in grids) + face_count + corner_count * len(grids):
+        raise PrimFileError("Corrupt compact payload: element counts do not match its data")
+
+    decoded = []
+    position = 0
+    for (dimensions, count, bits), (low, size) in zip(grids, bounds):
+        deltas = values[position:position + dimensions * count].reshape(dimensions, count)
+        decoded.append(_decodeGrid(deltas, low, size, bits).astype(numpy.float32).reshape(-1))
+        position += dimensions * count
+    counts = values[position:position + face_count].astype(numpy.int32)
+    position += face_count
+    ids = []
+    for grid in grids:
+        ids.append(_highWaterIds(values[position:position + corner_count]).astype(numpy.int32))
+        position += corner_count
+
+    mesh = meshData(memoryview(decoded[0]), memoryview(counts), memoryview(ids[0]))
+    attributes = [attribute for flag, attribute in ((COMPACT_UVS, "uvs"), (COMPACT_NORMALS, "normals")) if flags & flag]
+    for attribute, attribute_values, attribute_ids in zip(attributes, decoded[1:], ids[1:]):
+        setattr(mesh, attribute, memoryview(attribute_values))
+        setattr(mesh, attribute[:-1] + "_ids", memoryview(attribute_ids))
+    return mesh
+
+# Decodes any payload into mesh arrays, zero-copy for "geometry" payloads
+def payloadToMeshData(payload, format):
+    if format == "geometry":
+        return unpackMeshData(payload)
+    if format == "compact":
+        return expandMeshData(payload)
+    return objToMeshData(payload)
+
+# Any payload as OBJ text, for Maya's file importer
+def payloadToObj(payload, format):
+    if format != "obj":
+        return meshDataToObj(payloadToMeshData(payload, format))
+    return bytes(payload)
+
+# Reads one primitive from a primFileMap as mesh arrays
+def readMeshData(library_map, name):
+    return payloadToMeshData(library_map.payload(name), library_map.entries[name]["format"])
+
+# Splits polygons into triangle fans: (T, 3) NumPy array of vertex ids (requires NumPy)
+def triangulate(counts, connects):
+    if numpy is None:
+        raise ImportError("NumPy is not available in this Python")
+
+    counts = numpy.asarray(counts, dtype=numpy.int64)
+    connects = numpy.asarray(connects, dtype=numpy.int64)
+    starts = numpy.cumsum(counts) - counts
+    fans = numpy.maximum(counts - 2, 0)
+
+    face = numpy.repeat(numpy.arange(len(counts)), fans)
+    corner = numpy.arange(fans.sum()) - numpy.repeat(numpy.cumsum(fans) - fans, fans)
+    first = starts[face]
+    return numpy.stack((connects[first], connects[first + corner + 1], connects[first + corner + 2]), axis=1)
+
+# Mesh arrays as NumPy arrays sharing the same memory (requires NumPy)
+def meshDataToNumpy(mesh):
+    if numpy is None:
+        raise ImportError("NumPy is not available in this Python")
+
+    arrays = {}
+    for attribute, tag, code in GEOMETRY_SECTIONS:
+        values = getattr(mesh, attribute)
+        if values is not None:
+            arrays[attribute] = numpy.frombuffer(values, dtype=numpy.float32 if code == "f" else numpy.int32)
+    if "positions" in arrays:
+        arrays["positions"] = arrays["positions"].reshape(-1, 3)
+    return arrays
+
+# Rewrites every payload of a library as "obj" text or packed "geometry", converted shared payloads become inline
+def convertPrimFile(path, format):
+    def records():
+        for name, entry, payload in iterEntries(path):
+            if entry["format"] != format:
+                payload = packMeshData(payloadToMeshData(payload, entry["format"])) if format == "geometry" else payloadToObj(payload, entry["format"])
+                entry = {key: value for key, value in entry.items() if key not in ("blob", "max_error")}
+            yield name, dict(entry, format=format, length=len(payload)), payload
+
+    with libraryLock(path):
+        writePrimFile(path, records())
+
+# Canonical bytes of a mesh: the same geometry always packs the same, whatever format it was saved in
+def normalizedPayload(payload, format):
+    return packMeshData(payloadToMeshData(payload, format))
+
+# Moves every payload of a library into the shared blob store as normalized geometry, duplicates are stored once
+def sharePrimFile(path):
+    def records():
+        for name, entry, payload in iterEntries(path):
+            if "blob" not in entry:
+                payload = normalizedPayload(payload, entry["format"])
+                entry = dict(entry, blob=writeBlob(payload), length=len(payload), checksum=zlib.crc32(payload), format="geometry")
+            yield name, entry, payload
+
+    with libraryLock(path):
+        registerBlobLibrary(path)
+        writePrimFile(path, records())
+
+"""
+Writes a "compact" copy of a library for distribution, returns a report of what the quantization cost.
+- Every payload is re-encoded with compactMeshData(), its max_error is kept in its index entry
+- thumbnails: optional {name: png path}, embedded as by exportPrimFile()
+- Report: primitive count, "source_bytes" and "compact_bytes" of the payloads, the library's "max_error"
+"""
+def exportCompactPrimFile(path, dest_path, position_bits=DEFAULT_POSITION_BITS, uv_bits=DEFAULT_UV_BITS, thumbnails=None):
+    report = {"count": 0, "source_bytes": 0, "compact_bytes": 0, "max_error": 0.0}
+
+    def encode(name, entry, payload):
+        compact, max_error = compactMeshData(payloadToMeshData(payload, entry["format"]), position_bits, uv_bits)
+        report["count"] += 1
+        report["source_bytes"] += len(payload)
+        report["compact_bytes"] += len(compact)
+        report["max_error"] = max(report["max_error"], max_error)
+        return dict(entry, format="compact", length=len(compact), max_error=max_error), compact
+
+    exportPrimFile(path, dest_path, thumbnails, encode)
+    return report
+
+# Interleaves the bits of 10-bit grid coordinates, points close in space get close codes
+def _mortonCodes(points):
+    if not len(points):
+        return numpy.zeros(0, dtype=numpy.uint64)
+    low, high = points.min(axis=0), points.max(axis=0)
+    cells = ((points - low) / numpy.maximum(high - low, 1e-30) * 1023).astype(numpy.uint64)
+    codes = numpy.zeros(len(points), dtype=numpy.uint64)
+    for bit in range(10):
+        for axis in range(3):
+            codes |= ((cells[:, axis] >> numpy.uint64(bit)) & numpy.uint64(1)) << numpy.uint64(bit * 3 + axis)
+    return codes
+
+# Face-vertex indices listing the faces' corners in face_order
+def _cornerOrder(counts, starts, face_order):
+    ordered_counts = counts[face_order]
+    first = numpy.repeat(starts[face_order] - (numpy.cumsum(ordered_counts) - ordered_counts), ordered_counts)
+    return first + numpy.arange(ordered_counts.sum())
+
+# Renumbers ids in order of first use, unused elements last: returns the new ids, and the old element of each new id
+def _renumber(ids, count):
+    first_use = numpy.full(count, len(ids), dtype=numpy.int64)
+    numpy.minimum.at(first_use, ids, numpy.arange(len(ids)))
+    order = numpy.argsort(first_use, kind="stable")
+    remap = numpy.empty(count, dtype=numpy.int64)
+    remap[order] = numpy.arange(count)
+    return remap[ids], order
+
+# Quantizes (N, D) values to their bounding box grid: returns (zigzag deltas per dimension, box min, box size)
+def _encodeGrid(values, bits):
+    values = values.astype(numpy.float64)
+    low = values.min(axis=0) if len(values) else numpy.zeros(values.shape[1])
+    size = values.max(axis=0) - low if len(values) else numpy.zeros(values.shape[1])
+    # Sizes are stored as float32, quantize against the same box the decoder will see
+    low, size = low.astype(numpy.float32).astype(numpy.float64), size.astype(numpy.float32).astype(numpy.float64)
+    scale = (1 << bits) - 1
+    cells = numpy.rint((values - low) / numpy.where(size > 0, size, 1.0) * scale).clip(0, scale).astype(numpy.int64).T
+    deltas = numpy.diff(cells, axis=1, prepend=0)
+    return (deltas << 1) ^ (deltas >> 63), low, size
+
+# Inverse of _encodeGrid: (N, D) float64 values
+def _decodeGrid(deltas, low, size, bits):
+    deltas = deltas.astype(numpy.int64)
+    cells = numpy.cumsum((deltas >> 1) ^ -(deltas & 1), axis=1)
+    return (cells.T / ((1 << bits) - 1)) * numpy.asarray(size, dtype=numpy.float64) + numpy.asarray(low, dtype=numpy.float64)
+
+# Ids numbered in order of first use as distances below the next new id: 0 for a new element, small for recent ones
+def _highWaterCodes(ids):
+    next_new = numpy.concatenate(([0], numpy.maximum.accumulate(ids)[:-1] + 1)) if len(ids) else ids
+    return next_new - ids
+
+def _highWaterIds(codes):
+    next_new = numpy.cumsum(codes == 0) - (codes == 0)
+    return next_new - codes
+
+# LEB128 varints of non-negative integers
+def _packVarints(values):
+    values = values.astype(numpy.uint64)
+    lengths = numpy.ones(len(values), dtype=numpy.int64)
+    for shift in range(7, 64, 7):
+        lengths += values >= (numpy.uint64(1) << numpy.uint64(shift))
+    ends = numpy.cumsum(lengths)
+    data = numpy.zeros(int(ends[-1]) if len(values) else 0, dtype=numpy.uint8)
+    for byte in range(int(lengths.max()) if len(values) else 0):
+        present = lengths > byte
+        chunk = (values[present] >> numpy.uint64(7 * byte)) & numpy.uint64(0x7f)
+        more = (lengths[present] > byte + 1).astype(numpy.uint64) << numpy.uint64(7)
+        data[ends[present] - lengths[present] + byte] = chunk | more
+    return data.tobytes()
+
+def _unpackVarints(data):
+    ends = numpy.flatnonzero(data < 0x80)
+    if not len(ends):
+        return numpy.zeros(0, dtype=numpy.int64)
+    starts = numpy.concatenate(([0], ends[:-1] + 1))
+    shifts = (numpy.arange(ends[-1] + 1) - numpy.repeat(starts, ends - starts + 1)) * 7
+    return numpy.add.reduceat((data[:ends[-1] + 1] & 0x7f).astype(numpy.int64) << shifts, starts)
+
+def _objIndex(token, count):
+    index = int(token)
+    return index - 1 if index > 0 else count + index
@@ -1,9 +1,58 @@
 import maya.api.OpenMaya as om
 import maya.cmds as cmds
 import maya.mel as mel
+import maya.utils
+from array import array
+import collections
+import queue
+import threading
+import time
 import sys
 import os
 
+from PrimFile import PrimFileError, readPrimitive, iterEntries, appendPrimitive, appendPrimitives, removePrimitive, isLegacyPrimFile, isRemoteLibrary, libraryStats, compactPrimFile, sharedStorageReport, collectBlobs, blobLibraries, forgetBlobLibraries, writeThumbnails
+from MeshCache import meshCache, DEFAULT_CACHE_LIMIT
+from MeshData import meshData, packMeshData, meshDataToObj, payloadToObj, payloadToMeshData, exportCompactPrimFile, DEFAULT_POSITION_BITS
+from Catalog import getCatalog
+from Descriptors import getDescriptorIndex, computeDescriptor
+from LibraryDatabase import libraryDatabase, LIBRARIES_PATH
+from Scatter import placementMatrices, surfaceMatrices
+from Instrumentation import instrumented, countItems, setEnabled as setInstrumentationEnabled
+from Proxies import buildVariants, variantName, VARIANT_SEPARATOR, BOX_PROXY, DEFAULT_LOD_CELLS, DEFAULT_LOD_MIN_FACES
+
+# Extracted .obj files, created on first use
+mesh_cache = None
+
+# SQLite catalog of every library, opened on first use
+library_database = None
+
+# Parsed geometry ready for MFnMesh.create, most recently used last: key -> (geometry, size in bytes)
+geometry_cache = collections.OrderedDict()
+geometry_cache_size = 0
+GEOMETRY_CACHE_LIMIT = 256 * 1024 * 1024
+
+# Geometry handed to the primCreateMesh command, and instances to the primScatter command (see PrimPlugin.py)
+pending_geometry = None
+pending_scatter = None
+
+# Batch saves write to the library whenever this much payload data is pending
+BATCH_FLUSH_BYTES = 256 * 1024 * 1024
+
+# Background library compaction, one at a time
+compaction_thread = None
+DEFAULT_COMPACT_THRESHOLD = 0.25
+
+# Proxy/LOD generation, one background worker fed by a queue
+proxy_queue = queue.Queue()
+proxy_thread = None
+
+# Hidden source meshes of the current scene for instance placement: (library, name, variant) -> source transform
+instance_sources = {}
+INSTANCE_SOURCE_GROUP = "primInstanceSources"
+scene_jobs = []
+
+DEFAULT_THUMBNAIL_SIZE = 100
+
 # We are using Maya Python API 2.0
 def maya_useNewAPI():
     pass
@@ -21,10 +70,12 @@ def show_error_dialog(prompt):
 """
 Renders a preview of the mesh being saved using the viewport camera
 - Saves as .png file in /../primitives/thumbnails
+- Indexed libraries also get a copy embedded, so the preview travels with the library
 """
+@instrumented()
 def renderMeshPreview(name):
-    width = 100
-    height = 100
+    width = getThumbnailSize()
+    height = width
     curFrame = int(cmds.currentTime(query=True))
 
     dir_path = os.path.dirname(os.path.realpath(__file__)) + "/../primitives/thumbnails"
@@ -33,36 +84,438 @@ def renderMeshPreview(name):
     # TODO: Add button to choose if user wants wireframe, which will toggle this de-select
     # cmds.select(clear=True)
     cmds.playblast(fr=curFrame, v=False, fmt="image", c="png", orn=False, cf=fullPath, wh=[width,height], p=100)
+    catalog = currentCatalog()
+    catalog.recordThumbnail(name, fullPath)
+    embedThumbnails(catalog, {name: fullPath})
+
+"""
+Copies thumbnail files into an indexed library, in one write. Returns the names embedded.
+- paths: {primitive name: png path}
+- Text libraries cannot hold thumbnails, they keep using the loose files
+"""
+@instrumented()
+def embedThumbnails(catalog, paths):
+    library = catalog.library_path
+    if not paths or os.path.getsize(library) == 0 or isLegacyPrimFile(library):
+        return []
+
+    thumbnails = {}
+    for name, path in paths.items():
+        try:
+            with open(path, "rb") as file:
+                thumbnails[name] = file.read()
+        except OSError as error:
+            print(f"Warning: Could not embed the thumbnail of \"{name}\": {error}")
+    names = writeThumbnails(library, thumbnails)
+    countItems(len(names))
+    catalog.recordEmbedded(names)
+    return names
+
+# Embeds every loose thumbnail a library's primitives have, e.g. before sharing the library
+@instrumented()
+def embedLibraryThumbnails(catalog):
+    paths = {name: thumbnail[0] for name, thumbnail in catalog.loose_thumbnails.items()
+             if name in catalog and name not in catalog.embedded_thumbnails}
+    names = embedThumbnails(catalog, paths)
+    missing = sum(1 for name in catalog.primitiveNames() if name not in catalog.thumbnails)
+    print(f"Embedded {len(names)} thumbnails in {os.path.basename(catalog.library_path)}, {missing} primitives have none")
+    return names
+
+"""
+Writes a quantized "compact" copy of a library for sharing between sites, see MeshData.compactMeshData().
+- Loose thumbnails are embedded on the way, like a plain export
+- Returns the export report: primitive count, payload bytes before and after, and the largest vertex deviation
+"""
+@instrumented()
+def exportCompactLibrary(catalog, dest_path, position_bits=None):
+    position_bits = position_bits or getCompactBits()
+    thumbnails = {name: thumbnail[0] for name, thumbnail in catalog.loose_thumbnails.items()}
+    report = exportCompactPrimFile(catalog.library_path, dest_path, position_bits, thumbnails=thumbnails)
+    countItems(report["count"])
+
+    ratio = report["source_bytes"] / report["compact_bytes"] if report["compact_bytes"] else 0.0
+    print(f"Exported {report['count']} primitives at {position_bits} bits to: {dest_path}, "
+          f"payloads {ratio:.1f}x smaller, largest vertex deviation {report['max_error']:.6g} units")
+    return report
+
+# Thumbnail resolution in pixels (square), from the "primThumbnailSize" option
+def getThumbnailSize():
+    if cmds.optionVar(exists="primThumbnailSize"):
+        return int(cmds.optionVar(query="primThumbnailSize"))
+    return DEFAULT_THUMBNAIL_SIZE
+
+def setThumbnailSize(size):
+    cmds.optionVar(intValue=("primThumbnailSize", int(size)))
+
+# Returns the on-disk mesh cache, sized from the "primMeshCacheLimit" option (bytes)
+def getMeshCache():
+    global mesh_cache
+    if mesh_cache is None:
+        limit = DEFAULT_CACHE_LIMIT
+        if cmds.optionVar(exists="primMeshCacheLimit"):
+            limit = int(cmds.optionVar(query="primMeshCacheLimit"))
+        cache_path = os.path.dirname(os.path.realpath(__file__)) + "/../primitives/cache"
+        mesh_cache = meshCache(cache_path, limit)
+    return mesh_cache
+
+def setMeshCacheLimit(limit):
+    cmds.optionVar(intValue=("primMeshCacheLimit", int(limit)))
+    getMeshCache().setLimit(int(limit))
+
+# Size limit (bytes) of what remote libraries are cached with (see RemoteLibrary), from the "primRemoteCacheLimit" option
+def getRemoteCacheLimit():
+    from RemoteLibrary import DEFAULT_REMOTE_CACHE_LIMIT
+    if cmds.optionVar(exists="primRemoteCacheLimit"):
+        return int(cmds.optionVar(query="primRemoteCacheLimit"))
+    return DEFAULT_REMOTE_CACHE_LIMIT
+
+def setRemoteCacheLimit(limit):
+    from RemoteLibrary import setRemoteCacheLimit as setLimit
+    cmds.optionVar(intValue=("primRemoteCacheLimit", int(limit)))
+    setLimit(int(limit))
+
+# Folders indexed by the library database: primitives/libraries plus the "primLibraryRoots" option (os.pathsep separated)
+def getLibraryRoots():
+    roots = [LIBRARIES_PATH]
+    if cmds.optionVar(exists="primLibraryRoots"):
+        roots.extend(root for root in cmds.optionVar(query="primLibraryRoots").split(os.pathsep) if root)
+    return roots
+
+def setLibraryRoots(roots):
+    cmds.optionVar(stringValue=("primLibraryRoots", os.pathsep.join(roots)))
+    if library_database is not None:
+        library_database.roots = [os.path.realpath(root) for root in getLibraryRoots()]
+
+def getLibraryDatabase():
+    global library_database
+    if library_database is None:
+        library_database = libraryDatabase(getLibraryRoots())
+    return library_database
+
+# Payload format for new primitives, from the "primPayloadFormat" option: "obj" text or packed "geometry"
+def getPayloadFormat():
+    if cmds.optionVar(exists="primPayloadFormat"):
+        return cmds.optionVar(query="primPayloadFormat")
+    return "obj"
+
+def setPayloadFormat(format):
+    cmds.optionVar(stringValue=("primPayloadFormat", format))
+
+# Position grid resolution of compact exports, from the "primCompactBits" option
+def getCompactBits():
+    if cmds.optionVar(exists="primCompactBits"):
+        return int(cmds.optionVar(query="primCompactBits"))
+    return DEFAULT_POSITION_BITS
+
+def setCompactBits(bits):
+    cmds.optionVar(intValue=("primCompactBits", int(bits)))
+
+# Whether new saves go to the shared blob store, from the "primSharedGeometry" option (off by default: libraries stay self-contained)
+def getSharedGeometry():
+    if cmds.optionVar(exists="primSharedGeometry"):
+        return bool(cmds.optionVar(query="primSharedGeometry"))
+    return False
+
+def setSharedGeometry(enabled):
+    cmds.optionVar(intValue=("primSharedGeometry", int(enabled)))
+
+"""
+Payload format and blob sharing for new saves to a library: returns (format, shared).
+- Shared payloads are always normalized "geometry", so identical meshes hash the same
+- Text libraries can only hold inline OBJ payloads
+"""
+def getSaveMode(primfile):
+    if os.path.getsize(primfile) > 0 and isLegacyPrimFile(primfile):
+        return "obj", False
+    if getSharedGeometry():
+        return "geometry", True
+    return getPayloadFormat(), False
+
+# LOD detail and cost, from the "primProxyLodCells" (clustering grid cells per level, "64,16") and "primProxyMinFaces" options
+def getProxySettings():
+    lod_cells, min_faces = DEFAULT_LOD_CELLS, DEFAULT_LOD_MIN_FACES
+    if cmds.optionVar(exists="primProxyLodCells"):
+        lod_cells = tuple(int(cells) for cells in cmds.optionVar(query="primProxyLodCells").split(",") if cells.strip())
+    if cmds.optionVar(exists="primProxyMinFaces"):
+        min_faces = int(cmds.optionVar(query="primProxyMinFaces"))
+    return lod_cells, min_faces
+
+def setProxySettings(lod_cells, min_faces):
+    cmds.optionVar(stringValue=("primProxyLodCells", ",".join(str(int(cells)) for cells in lod_cells)))
+    cmds.optionVar(intValue=("primProxyMinFaces", int(min_faces)))
+
+# Whether the gallery places proxies instead of full meshes, from the "primPlaceAsProxy" option (off by default)
+def getPlaceAsProxy():
+    if cmds.optionVar(exists="primPlaceAsProxy"):
+        return bool(cmds.optionVar(query="primPlaceAsProxy"))
+    return False
+
+def setPlaceAsProxy(enabled):
+    cmds.optionVar(intValue=("primPlaceAsProxy", int(enabled)))
+
+# Whether the gallery places instances of one hidden source per primitive, from the "primPlaceAsInstance" option (off by default)
+def getPlaceAsInstance():
+    if cmds.optionVar(exists="primPlaceAsInstance"):
+        return bool(cmds.optionVar(query="primPlaceAsInstance"))
+    return False
+
+def setPlaceAsInstance(enabled):
+    cmds.optionVar(intValue=("primPlaceAsInstance", int(enabled)))
+
+# Records operation timings (see Instrumentation), from the "primInstrumentation" option
+def getInstrumentation():
+    if cmds.optionVar(exists="primInstrumentation"):
+        return bool(cmds.optionVar(query="primInstrumentation"))
+    return False
+
+def setInstrumentation(enabled):
+    cmds.optionVar(intValue=("primInstrumentation", int(enabled)))
+    setInstrumentationEnabled(enabled)
+
+# Catalog (names, index entries, thumbnails) of the current library
+def currentCatalog():
+    from Prim import get_current_prim_file_path
+    return getCatalog(get_current_prim_file_path())
+
+# Lists primitive names in the current library without extracting any mesh
+@instrumented()
+def listPrimitives():
+    return currentCatalog().primitiveNames()
+
+# Returns the .obj path of a primitive, extracting it from the current library on first use
+@instrumented()
+def extractMesh(mesh_name):
+    catalog = currentCatalog()
+    if mesh_name not in catalog:
+        return None
+    try:
+        return getMeshCache().getMesh(catalog.library_path, mesh_name, catalog.entries())
+    except PrimFileError:
+        # The library was rewritten behind our back, retry with fresh offsets
+        if not catalog.revalidate() or mesh_name not in catalog:
+            raise
+        return getMeshCache().getMesh(catalog.library_path, mesh_name, catalog.entries())
+
+# Converts mesh arrays into the OpenMaya arrays MFnMesh.create takes
+def buildMayaGeometry(mesh):
+    positions = mesh.positions.tolist()
+    geometry = {
+        "points": om.MFloatPointArray(list(zip(positions[0::3], positions[1::3], positions[2::3]))),
+        "counts": om.MIntArray(mesh.counts.tolist()),
+        "connects": om.MIntArray(mesh.connects.tolist())
+    }
+
+    if mesh.uvs is not None:
+        uvs = mesh.uvs.tolist()
+        geometry["u"] = om.MFloatArray(uvs[0::2])
+        geometry["v"] = om.MFloatArray(uvs[1::2])
+        geometry["uv_ids"] = om.MIntArray(mesh.uv_ids.tolist())
+
+    if mesh.normals is not None:
+        normals = mesh.normals.tolist()
+        normals = [normals[i * 3:i * 3 + 3] for i in mesh.normal_ids.tolist()]
+        faces = [face for face, count in enumerate(mesh.counts.tolist()) for corner in range(count)]
+        geometry["normals"] = om.MVectorArray([om.MVector(*normal) for normal in normals])
+        geometry["normal_faces"] = om.MIntArray(faces)
+
+    return geometry
 
-def instanceMesh(mesh_name):
-    # Navigate to meshes folder in module 
-    dir_path = os.path.dirname(os.path.realpath(__file__)) + "/../primitives/meshes"
-    
-    # Check for files in /meshes
-    files = cmds.getFileList(folder = dir_path)
-    if not files: 
-        print("Error: Meshes folder is empty") 
+"""
+Returns the OpenMaya geometry of a primitive or variant ("name#lod1") in a library, None if it does not exist.
+- catalog: the library's catalog, the current library by default
+- Parsed geometry is kept in memory, keyed by library, name and checksum, so repeated creates skip parsing
+"""
+@instrumented()
+def getGeometry(mesh_name, catalog=None):
+    global geometry_cache_size
+    if catalog is None:
+        catalog = currentCatalog()
+    if catalog.entry(mesh_name) is None:
+        return None
+
+    entry = catalog.entry(mesh_name)
+    key = (catalog.library_path, mesh_name, entry["checksum"], entry["offset"])
+    if key in geometry_cache:
+        geometry_cache.move_to_end(key)
+        return geometry_cache[key][0]
+
+    try:
+        payload = readPrimitive(catalog.library_path, mesh_name, catalog.entries())
+    except PrimFileError:
+        # The library was rewritten behind our back, retry with fresh offsets
+        if not catalog.revalidate() or catalog.entry(mesh_name) is None:
+            raise
+        return getGeometry(mesh_name, catalog)
+
+    mesh = payloadToMeshData(payload, entry["format"])
+    geometry = buildMayaGeometry(mesh)
+
+    size = (len(mesh.positions) + len(mesh.counts) + len(mesh.connects)) * 4
+    geometry_cache[key] = (geometry, size)
+    geometry_cache_size += size
+    while geometry_cache_size > GEOMETRY_CACHE_LIMIT and len(geometry_cache) > 1:
+        evicted, (evicted_geometry, evicted_size) = geometry_cache.popitem(last=False)
+        geometry_cache_size -= evicted_size
+
+    return geometry
+
+"""
+Builds a primitive straight from its geometry, as one undo chunk. Returns the new transform.
+- tags: optional (library path, primitive name, variant) recorded on the transform, see tagPrimitive
+"""
+@instrumented()
+def createMeshFromGeometry(mesh_name, geometry, tags=None):
+    global pending_geometry
+    cmds.undoInfo(openChunk=True, chunkName="Prim create " + mesh_name)
+    try:
+        pending_geometry = geometry
+        transform = cmds.primCreateMesh()
+        cmds.sets(transform, edit=True, forceElement="initialShadingGroup")
+        transform = cmds.rename(transform, mesh_name + "_001")
+        if tags is not None:
+            tagPrimitive(transform, *tags)
+    finally:
+        pending_geometry = None
+        cmds.undoInfo(closeChunk=True)
+    return transform
+
+# Records where a placed primitive comes from, so it can be swapped between proxy and full resolution later
+def tagPrimitive(transform, library_path, mesh_name, variant=None):
+    for attribute, value in (("primLibrary", library_path), ("primName", mesh_name), ("primVariant", variant or "")):
+        if not cmds.attributeQuery(attribute, node=transform, exists=True):
+            cmds.addAttr(transform, longName=attribute, dataType="string")
+        cmds.setAttr(transform + "." + attribute, value, type="string")
+
+# Lightest stand-in stored for a primitive: its coarsest LOD, else its box proxy. None before proxies are built.
+def proxyVariant(catalog, mesh_name):
+    variants = catalog.variants(mesh_name)
+    lods = sorted((variant for variant in variants if variant.startswith("lod") and variant[3:].isdigit()), key=lambda variant: int(variant[3:]))
+    if lods:
+        return lods[-1]
+    return BOX_PROXY if BOX_PROXY in variants else None
+
+# Forgets the instance sources, their nodes went away with the previous scene
+def clearInstanceSources():
+    instance_sources.clear()
+
+def watchSceneChanges():
+    if scene_jobs:
         return
+    for event in ("NewSceneOpened", "SceneOpened"):
+        scene_jobs.append(cmds.scriptJob(event=[event, clearInstanceSources]))
+
+# Hidden group holding the scene's instance sources
+def instanceSourceGroup():
+    if not cmds.objExists(INSTANCE_SOURCE_GROUP):
+        group = cmds.group(empty=True, world=True, name=INSTANCE_SOURCE_GROUP)
+        cmds.setAttr(group + ".visibility", False)
+        cmds.setAttr(group + ".hiddenInOutliner", True)
+    return INSTANCE_SOURCE_GROUP
+
+# Builds the hidden source of a primitive, in memory or from its .obj. Returns its long name, None if the primitive does not exist.
+@instrumented()
+def buildInstanceSource(catalog, mesh_name, variant=None):
+    group = instanceSourceGroup()
+    if hasattr(cmds, "primCreateMesh"):
+        try:
+            geometry = getGeometry(variantName(mesh_name, variant) if variant else mesh_name, catalog)
+            if geometry is None:
+                return None
+            source = createMeshFromGeometry(mesh_name + "_source", geometry)
+            return cmds.ls(cmds.parent(source, group), long=True)[0]
+        except (PrimFileError, ValueError, RuntimeError) as error:
+            print(f"Warning: Could not build \"{mesh_name}\" in memory ({error}), importing its .obj instead ...")
+
+    mesh_path = extractMesh(mesh_name)
+    if not mesh_path:
+        return None
+    imported = cmds.ls(cmds.file(mesh_path, i=True, rnn=True), type="transform", long=True)
+    return cmds.ls(cmds.group(imported, name=mesh_name + "_source", parent=group), long=True)[0]
+
+# Hidden source of a primitive in the current scene, built on first use. None if the primitive does not exist.
+def instanceSource(catalog, mesh_name, variant=None):
+    watchSceneChanges()
+    key = (catalog.library_path, mesh_name, variant)
+    source = instance_sources.get(key)
+    if source is None or not cmds.objExists(source):
+        source = buildInstanceSource(catalog, mesh_name, variant)
+        if source is not None:
+            instance_sources[key] = source
+    return source
 
-    # Check for .obj files in /meshes
-    obj_files = [f for f in files if f.endswith('.obj')]
-    if not obj_files: 
-        print("Error: No .obj files found in meshes folder") 
+"""
+Places a primitive as an instance of a hidden source, built once per scene.
+- Copies share the source's shape: repeated placements neither read nor parse geometry, and add no mesh data to the scene
+- Sources are forgotten on new/open scene, and rebuilt if deleted or undone
+- Returns the new transform, None if the primitive does not exist
+"""
+def placeInstance(catalog, mesh_name, variant=None):
+    cmds.undoInfo(openChunk=True, chunkName="Prim instance " + mesh_name)
+    try:
+        source = instanceSource(catalog, mesh_name, variant)
+        if source is None:
+            return None
+        transform = cmds.instance(source, name=mesh_name + "_001")[0]
+        transform = cmds.parent(transform, world=True)[0]
+        tagPrimitive(transform, catalog.library_path, mesh_name, variant)
+    finally:
+        cmds.undoInfo(closeChunk=True)
+    return transform
+
+# Variant to place for a primitive: its proxy when asked for (or per the "Place as proxy" option) and built, else None
+def placementVariant(catalog, mesh_name, proxy=None):
+    if proxy is None:
+        proxy = getPlaceAsProxy()
+    if not proxy or mesh_name not in catalog:
+        return None
+
+    variant = proxyVariant(catalog, mesh_name)
+    if variant is None:
+        print(f"No proxy built for \"{mesh_name}\" yet, placing the full mesh ...")
+        scheduleProxies(catalog.library_path, [mesh_name])
+    return variant
+
+"""
+Places a primitive of the current library in the scene.
+- proxy: place its proxy instead of the full mesh, None to follow the "Place as proxy" option
+- instance: place an instance of a per-scene source (see placeInstance), None to follow the "Place as instance" option
+- Primitives without proxies yet are placed at full resolution, and get their proxies built in the background
+"""
+@instrumented()
+def instanceMesh(mesh_name, proxy=None, instance=None):
+    catalog = currentCatalog()
+    if instance is None:
+        instance = getPlaceAsInstance()
+    variant = placementVariant(catalog, mesh_name, proxy)
+
+    if instance:
+        if placeInstance(catalog, mesh_name, variant) is None:
+            print("Error: Could not find mesh for primitive \"" + mesh_name + "\"")
+            return
+        print("Succesfully instanced primitive: " + "\"" + mesh_name + "\"" + (f" ({variant})" if variant else ""))
         return
 
-    mesh_path = None
-    for item in obj_files:
-        full_name = os.path.join(dir_path, item)
-        file_name, ext = os.path.splitext(os.path.basename(full_name))
-        if file_name == mesh_name:
-            mesh_path = full_name
-            break
+    # Build the mesh in memory when the Prim plug-in command is available
+    if hasattr(cmds, "primCreateMesh"):
+        try:
+            geometry = getGeometry(variantName(mesh_name, variant) if variant else mesh_name, catalog)
+            if geometry is None:
+                print("Error: Could not find mesh for primitive \"" + mesh_name + "\"")
+                return
+            createMeshFromGeometry(mesh_name, geometry, (catalog.library_path, mesh_name, variant))
+            print("Succesfully created primitive: " + "\"" + mesh_name + "\"" + (f" ({variant})" if variant else ""))
+            return
+        except (PrimFileError, ValueError, RuntimeError) as error:
+            print(f"Warning: Could not build \"{mesh_name}\" in memory ({error}), importing its .obj instead ...")
+
+    # Fallback: import the extracted .obj file
+    mesh_path = extractMesh(mesh_name)
 
     # Check if mesh with that specific name was found.
     if not mesh_path:
         print("Error: Could not find mesh for primitive \"" + mesh_name + "\"")
         return
- 
+
     # Import the primitive to the scene. 
     mesh = cmds.file(mesh_path, i = True, rnn=True)
     transforms = cmds.ls(mesh, type='transform')
@@ -70,148 +523,493 @@ def instanceMesh(mesh_name):
     # Rename the newly created mesh. 
     for i, object in enumerate(transforms):
         name = '%s_%s' % (mesh_name, str(i+1).zfill(3))
-        cmds.rename(object, name)
+        name = cmds.rename(object, name)
+        tagPrimitive(name, catalog.library_path, mesh_name)
 
     print("Succesfully created primitive: " + "\"" + mesh_name + "\"")
 
-# Saves selected mesh in the scene to the .prim file, and updates library.
+"""
+Places many copies of a primitive of the current library in one call, as one undo chunk.
+- transforms: N x 4 x 4 matrices (Maya's row-vector layout) or N x 9 TRS rows, as NumPy arrays (see Scatter)
+- Copies instance the primitive's hidden per-scene source (see placeInstance), each one costs a transform, no geometry
+- Transforms are created in bulk by the primScatter plug-in command, under one group
+- proxy: scatter the primitive's proxy, None to follow the "Place as proxy" option
+- Returns the group holding the copies, None if the primitive does not exist
+"""
+@instrumented()
+def scatter(mesh_name, transforms, proxy=None):
+    global pending_scatter
+    if not hasattr(cmds, "primScatter"):
+        raise RuntimeError("Scattering needs the Prim plug-in (PrimPlugin.py) to be loaded")
+
+    matrices = placementMatrices(transforms)
+    catalog = currentCatalog()
+    variant = placementVariant(catalog, mesh_name, proxy)
+
+    start = time.perf_counter()
+    cmds.undoInfo(openChunk=True, chunkName="Prim scatter " + mesh_name)
+    try:
+        source = instanceSource(catalog, mesh_name, variant)
+        if source is None:
+            print("Error: Could not find mesh for primitive \"" + mesh_name + "\"")
+            return None
+        shape = cmds.listRelatives(source, allDescendents=True, type="mesh", noIntermediate=True, fullPath=True)[0]
+        pending_scatter = (shape, matrices, mesh_name)
+        group = cmds.primScatter()
+    finally:
+        pending_scatter = None
+        cmds.undoInfo(closeChunk=True)
+
+    print(f"Scattered {len(matrices)} copies of \"{mesh_name}\" in {time.perf_counter() - start:.2f}s")
+    countItems(len(matrices))
+    return group
+
+"""
+Scatters copies of a primitive over the surface of scene meshes, see scatter().
+- target: node holding the meshes to scatter on, sampled uniformly by area in world space
+- scale_range: (min, max) uniform scale per copy, align: stand copies along the surface normal, else upright
+- seed: fixes the layout, None for a new one every call
+"""
+@instrumented()
+def scatterOnSurface(mesh_name, target, count, scale_range=(1.0, 1.0), align=True, seed=None, proxy=None):
+    shapes = cmds.ls(target, dag=True, type="mesh", noIntermediate=True, long=True)
+    if not shapes:
+        raise ValueError(f"\"{target}\" has no polygon mesh to scatter on")
+    return scatter(mesh_name, surfaceMatrices(readSceneMeshes(shapes), count, scale_range, align, seed), proxy)
+
+"""
+Reads scene meshes into one set of mesh arrays, in world space.
+- UVs are kept when every mesh has a full UV assignment
+"""
+@instrumented()
+def readSceneMeshes(shapes):
+    positions, counts, connects = array("f"), array("i"), array("i")
+    uvs, uv_ids = array("f"), array("i")
+    has_uvs = True
+
+    for shape in shapes:
+        selection = om.MSelectionList()
+        selection.add(shape)
+        mesh_fn = om.MFnMesh(selection.getDagPath(0))
+
+        vertex_offset = len(positions) // 3
+        for point in mesh_fn.getFloatPoints(om.MSpace.kWorld):
+            positions.extend((point.x, point.y, point.z))
+
+        face_counts, face_connects = mesh_fn.getVertices()
+        counts.extend(face_counts)
+        connects.extend(index + vertex_offset for index in face_connects)
+
+        # UVs of the current UV set, assigned per face-vertex like the vertices
+        u_values, v_values = mesh_fn.getUVs()
+        uv_counts, assigned_uvs = mesh_fn.getAssignedUVs()
+        if has_uvs and len(u_values) and list(uv_counts) == list(face_counts):
+            uv_offset = len(uvs) // 2
+            for u, v in zip(u_values, v_values):
+                uvs.extend((u, v))
+            uv_ids.extend(index + uv_offset for index in assigned_uvs)
+        else:
+            has_uvs = False
+
+    mesh = meshData(positions, counts, connects)
+    if has_uvs and uvs:
+        mesh.uvs, mesh.uv_ids = uvs, uv_ids
+    return mesh
+
+"""
+Saves selected mesh in the scene to the .prim file, and updates library.
+- The mesh is read once through OpenMaya and appended with its index record in one write
+- Returns True if the primitive was saved
+"""
+@instrumented()
 def savePrimitiveData(mesh_name):
     if not mesh_name:
         show_error_dialog("Please provide a primitive name")
         return
+    if VARIANT_SEPARATOR in mesh_name:
+        show_error_dialog(f"Primitive names cannot contain \"{VARIANT_SEPARATOR}\", it marks proxies")
+        return
 
-    # Check for files in /meshes
-    dir_path = os.path.dirname(os.path.realpath(__file__)) + "/../primitives/meshes"
-    files = cmds.getFileList(folder = dir_path)
-
-    if files: 
-        obj_files = [f for f in files if f.endswith('.obj')]
-        if obj_files: 
-            for item in obj_files:
-                full_name = os.path.join(dir_path, item)
-                file_name, ext = os.path.splitext(os.path.basename(full_name))
-                if file_name == mesh_name:
-                    show_error_dialog(f"Mesh with name {mesh_name} already exists. Please try a new name.\n\n(Note: Saving a primitive with the same name will update its preview)")
-                    return
-
-    dir_path = os.path.dirname(os.path.realpath(__file__)) + "/../primitives/meshes"
-    full_dir_path = dir_path + "/" + mesh_name + ".obj"
-    cmds.file(full_dir_path,
-              force=True,
-              options="groups=0;ptgroups=0;materials=0;smoothing=0;normals=0;exportTextures=0",
-              type="OBJexport", 
-              pr=True, 
-              es=True)
-    print(f"Saved: {mesh_name}.obj")
-
-    # Add header for this primitive (mesh name, beginMesh)
-    from Prim import get_current_prim_file_path
-    current_prim = get_current_prim_file_path()
-    prim_file = open(current_prim, "a")
-    newprimitive_str = f"\n{mesh_name}\nbeginMesh\n"
-    prim_file.write(newprimitive_str)
-
-    # Add .obj data
-    obj_file = open(full_dir_path, "r")
-    next(obj_file)
-    next(obj_file)
-    objdata_str = obj_file.read()
-    prim_file.write(objdata_str)
-    endprimitive_str = "endMesh"
-    prim_file.write(endprimitive_str)
-
-    # Close files
-    prim_file.close()
-    obj_file.close()
+    # Check the library for a primitive with this exact name
+    catalog = currentCatalog()
+    current_prim = catalog.library_path
+    if mesh_name in catalog:
+        show_error_dialog(f"Mesh with name {mesh_name} already exists. Please try a new name.\n\n(Note: Saving a primitive with the same name will update its preview)")
+        return
+
+    shapes = cmds.ls(sl=True, dag=True, type="mesh", noIntermediate=True, long=True)
+    if not shapes:
+        show_error_dialog("Error: Please select a polygon mesh")
+        return
+    mesh = readSceneMeshes(shapes)
+
+    format, shared = getSaveMode(current_prim)
+    payload = packMeshData(mesh) if format == "geometry" else meshDataToObj(mesh)
+    appendPrimitive(current_prim, mesh_name, payload, format, shared)
+    catalog.recordAdded([mesh_name])
+    recordDescriptors(catalog, [(mesh_name, shapeDescriptor(mesh))])
+    scheduleProxies(current_prim, [mesh_name], {mesh_name: mesh})
 
     print(f"Updated .prim file: {current_prim}")
+    return True
 
-# Deletes mesh from .prim file, its .obj mesh, and its preview.
-def deletePrimitiveData(mesh_name):
+"""
+Saves many scene meshes as separate primitives, with buffered appends and one index update per flush.
+- transforms: nodes to save, each one with the meshes below it
+- pattern: None to name primitives after the transforms, or a str.format pattern using {name} and {index}
+- progress: optional callback(done, total, name), returning False cancels the rest of the batch
+- Failures are reported per item and never stop the batch
+- Returns {"saved": names, "failed": [(node, reason)], "cancelled", "seconds", "meshes_per_second"}
+"""
+@instrumented()
+def savePrimitivesBatch(transforms, pattern=None, progress=None):
+    catalog = currentCatalog()
+    current_prim = catalog.library_path
+
+    format, shared = getSaveMode(current_prim)
+
+    report = {"saved": [], "failed": [], "cancelled": False}
+    pending = []
+    descriptors = []
+    pending_size = 0
+    start = time.perf_counter()
+
+    def flush():
+        appendPrimitives(current_prim, pending, shared)
+        catalog.recordAdded([name for name, payload, format in pending])
+        report["saved"].extend(name for name, payload, format in pending)
+        pending.clear()
+
+    for index, transform in enumerate(transforms):
+        short_name = transform.split("|")[-1].split(":")[-1]
+        name = pattern.format(name=short_name, index=index + 1) if pattern else short_name
+        if progress is not None and progress(index, len(transforms), name) is False:
+            report["cancelled"] = True
+            break
 
-    # Navigate to meshes folder in module 
-    dir_path = os.path.dirname(os.path.realpath(__file__)) + "/../primitives/meshes"
-    
-    # Check for files in /meshes
-    files = cmds.getFileList(folder = dir_path)
-    if not files: 
-        print("Error: Meshes folder is empty") 
+        if name in catalog or any(name == pending_name for pending_name, payload, format in pending):
+            report["failed"].append((transform, f"a primitive named \"{name}\" already exists"))
+            continue
+        if VARIANT_SEPARATOR in name:
+            report["failed"].append((transform, f"primitive names cannot contain \"{VARIANT_SEPARATOR}\""))
+            continue
+
+        shapes = cmds.ls(transform, dag=True, type="mesh", noIntermediate=True, long=True)
+        if not shapes:
+            report["failed"].append((transform, "no polygon mesh"))
+            continue
+
+        try:
+            mesh = readSceneMeshes(shapes)
+            payload = packMeshData(mesh) if format == "geometry" else meshDataToObj(mesh)
+            descriptors.append((name, shapeDescriptor(mesh)))
+        except (RuntimeError, ValueError) as error:
+            report["failed"].append((transform, str(error)))
+            continue
+
+        pending.append((name, payload, format))
+        pending_size += len(payload)
+        if pending_size >= BATCH_FLUSH_BYTES:
+            flush()
+            pending_size = 0
+
+    if pending:
+        flush()
+    recordDescriptors(catalog, [(name, descriptor) for name, descriptor in descriptors if name in catalog])
+    scheduleProxies(current_prim, report["saved"])
+
+    report["seconds"] = time.perf_counter() - start
+    report["meshes_per_second"] = len(report["saved"]) / report["seconds"] if report["seconds"] > 0 else 0.0
+    print(f"Batch saved {len(report['saved'])} primitives in {report['seconds']:.2f}s "
+          f"({report['meshes_per_second']:.1f} meshes/s), {len(report['failed'])} failed")
+    countItems(len(report["saved"]))
+    return report
+
+# Shape descriptor of a mesh for similarity search, None without NumPy
+def shapeDescriptor(mesh):
+    try:
+        return computeDescriptor(mesh)
+    except ImportError:
+        return None
+
+# Records descriptors of freshly saved primitives: (name, descriptor) pairs
+@instrumented()
+def recordDescriptors(catalog, descriptors):
+    descriptors = [(name, descriptor) for name, descriptor in descriptors if descriptor is not None]
+    if not descriptors:
         return
+    index = getDescriptorIndex(catalog.library_path)
+    entries = catalog.entries()
+    index.addMany((name, entries[name], descriptor) for name, descriptor in descriptors)
+    index.save()
 
-    # Check for .obj files in /meshes
-    obj_files = [f for f in files if f.endswith('.obj')]
-    if not obj_files: 
-        print("Error: No .obj files found in meshes folder") 
-        return
+"""
+Finds the primitives of the current library that look most like the selected scene meshes, or like another primitive.
+- Descriptors missing from the library's index (opened libraries, outside saves) are computed first
+- progress: optional callback(done, total) while computing them, returning False stops early
+- Returns [(name, distance)] closest first, raises ImportError without NumPy
+"""
+@instrumented()
+def findSimilarPrimitives(mesh_name=None, count=12, progress=None):
+    catalog = currentCatalog()
+    index = getDescriptorIndex(catalog.library_path)
+    primitives = set(catalog.primitiveNames())
+    index.update({name: entry for name, entry in catalog.entries().items() if name in primitives}, progress)
+
+    if mesh_name is None:
+        shapes = cmds.ls(sl=True, dag=True, type="mesh", noIntermediate=True, long=True)
+        if not shapes:
+            show_error_dialog("Error: Please select a polygon mesh")
+            return []
+        descriptor = computeDescriptor(readSceneMeshes(shapes))
+        exclude = ()
+    else:
+        descriptor = index.descriptor(mesh_name)
+        if descriptor is None:
+            print("Error: Could not find mesh for primitive \"" + mesh_name + "\"")
+            return []
+        exclude = (mesh_name,)
+
+    start = time.perf_counter()
+    results = index.nearest(descriptor, count, exclude)
+    print(f"Found {len(results)} similar primitives among {len(index)} in {(time.perf_counter() - start) * 1000:.1f} ms")
+    countItems(len(index))
+    return results
+
+# Deletes mesh from .prim file, its cached .obj mesh, and its preview. Returns True if it was deleted.
+@instrumented()
+def deletePrimitiveData(mesh_name):
+    catalog = currentCatalog()
+    primfile = catalog.library_path
+
+    # Delete primitive data from the .prim file (exact name match)
+    try:
+        removed = removePrimitive(primfile, mesh_name)
+    except (OSError, PrimFileError) as error:
+        print(f"Error: Could not delete primitive \"{mesh_name}\": {error}")
+        return False
+    if not removed:
+        print("Error: Could not find mesh for primitive \"" + mesh_name + "\" to delete ...")
+        return False
 
-    mesh_path = None
-    for item in obj_files:
-        full_name = os.path.join(dir_path, item)
-        file_name, ext = os.path.splitext(os.path.basename(full_name))
-        if file_name == mesh_name:
-            mesh_path = full_name
-            break
+    # Its proxies go with it
+    variants = [variantName(mesh_name, variant) for variant in catalog.variants(mesh_name)]
+    for name in variants:
+        removePrimitive(primfile, name)
+    catalog.recordRemoved([mesh_name] + variants)
 
-    # Check if mesh with that specific name was found.
-    if not mesh_path:
-        print("Error: Could not find mesh for primitive \"" + mesh_name + "\" to delete ...")
-        return
+    # Delete the mesh's extracted .obj files and its preview
+    getMeshCache().discardMesh(primfile, mesh_name)
+    catalog.discardThumbnail(mesh_name)
 
-    # Delete the mesh's .obj file
-    os.remove(mesh_path)
+    print("Succesfully deleted primitive: " + "\"" + mesh_name + "\"")
+    scheduleCompaction(primfile)
+    return True
 
-    # Delete primitive data from the .prim file 
+# Every library the database knows about or the blob store lists, plus the current one
+def knownLibraries():
     from Prim import get_current_prim_file_path
-    primfile = get_current_prim_file_path()
-    with open(primfile, 'r') as file:
-        lines = file.readlines()
-    
-    with open(primfile, 'w') as file:
-        skip = False
-        for line in lines:
-            if mesh_name in line:
-                skip = True
-            if not skip:
-                file.write(line)
-            if skip and "endMesh" in line:
-                skip = False
- 
-    print("Succesfully deleted primitive: " + "\"" + mesh_name + "\"")
+    paths = set(getLibraryDatabase().libraryPaths()) | set(blobLibraries())
+    if get_current_prim_file_path():
+        paths.add(os.path.realpath(get_current_prim_file_path()))
+    return sorted(path for path in paths if os.path.exists(path))
+
+# Storage used and saved by the shared blob store, per library (see PrimFile.sharedStorageReport)
+@instrumented()
+def sharedGeometryReport():
+    return sharedStorageReport(knownLibraries())
 
-# Generates .obj files from .prim file
+"""
+Deletes shared payloads that no known library references. Returns the bytes freed.
+- Raises PrimFile.BlobLibrariesUnavailable, deleting nothing, while a library listed by the blob store cannot be read
+- forget: listed libraries to stop waiting for (deleted for good), what only they used is deleted
+"""
+@instrumented()
+def cleanSharedGeometry(forget=()):
+    if forget:
+        forgetBlobLibraries(forget)
+    freed = collectBlobs(knownLibraries())
+    print(f"Removed {freed} bytes of unreferenced shared geometry")
+    return freed
+
+# Compacts a library and reports the space reclaimed. Returns False if it changed while compacting.
+@instrumented()
+def compactLibrary(primfile):
+    size = os.path.getsize(primfile)
+    if not compactPrimFile(primfile):
+        return False
+    # Offsets moved, the catalog re-reads them on the main thread
+    maya.utils.executeDeferred(lambda: getCatalog(primfile).revalidate())
+    print(f"Compacted {os.path.basename(primfile)}: reclaimed {size - os.path.getsize(primfile)} bytes")
+    return True
+
+"""
+Compacts a library on a background thread once its dead space passes a threshold.
+- The threshold is the fraction of the file held by deleted primitives, from the "primCompactThreshold" option
+- Returns True if a compaction was started
+"""
+def scheduleCompaction(primfile):
+    global compaction_thread
+    threshold = DEFAULT_COMPACT_THRESHOLD
+    if cmds.optionVar(exists="primCompactThreshold"):
+        threshold = float(cmds.optionVar(query="primCompactThreshold"))
+
+    stats = libraryStats(primfile)
+    if stats["dead"] <= threshold * stats["size"]:
+        return False
+    if compaction_thread is not None and compaction_thread.is_alive():
+        return False
+
+    def compact():
+        try:
+            compactLibrary(primfile)
+        except (OSError, PrimFileError) as error:
+            maya.utils.executeDeferred(print, f"Warning: Could not compact {primfile}: {error}")
+
+    compaction_thread = threading.Thread(target=compact, name="PrimCompaction", daemon=True)
+    compaction_thread.start()
+    return True
+
+"""
+Builds proxy/LOD variants of primitives on a background thread (see Proxies), they are stored next to the full meshes.
+- meshes: optional name -> meshData already in memory (fresh saves), other primitives are read back from the library
+- Decimation runs on the worker, the library is only written on the main thread
+- Text libraries are skipped, they can only hold OBJ payloads, and so are remote libraries, they are read-only
+- Returns False if the library cannot hold proxies
+"""
+def scheduleProxies(primfile, names, meshes=None):
+    global proxy_thread
+    if isRemoteLibrary(primfile) or (os.path.getsize(primfile) > 0 and isLegacyPrimFile(primfile)):
+        return False
+
+    lod_cells, min_faces = getProxySettings()
+    format, shared = getSaveMode(primfile)
+    entries = getCatalog(primfile).entries()
+    for name in names:
+        if name in entries:
+            proxy_queue.put((primfile, name, entries[name], (meshes or {}).get(name), lod_cells, min_faces, shared))
+
+    if proxy_thread is None or not proxy_thread.is_alive():
+        proxy_thread = threading.Thread(target=proxyWorker, name="PrimProxies", daemon=True)
+        proxy_thread.start()
+    return True
+
+def proxyWorker():
+    while True:
+        primfile, name, entry, mesh, lod_cells, min_faces, shared = proxy_queue.get()
+        try:
+            start = time.perf_counter()
+            if mesh is None:
+                mesh = payloadToMeshData(readPrimitive(primfile, name, {name: entry}), entry["format"])
+            variants = [(variantName(name, variant), packMeshData(variant_mesh), "geometry")
+                        for variant, variant_mesh in buildVariants(mesh, lod_cells, min_faces)]
+            maya.utils.executeDeferred(storeProxies, primfile, name, variants, shared, time.perf_counter() - start)
+        except (OSError, PrimFileError, ValueError) as error:
+            maya.utils.executeDeferred(print, f"Warning: Could not build proxies for \"{name}\": {error}")
+
+# Writes the variants built by proxyWorker, replacing older ones (main thread)
+@instrumented()
+def storeProxies(primfile, name, variants, shared, seconds):
+    catalog = getCatalog(primfile)
+    if name not in catalog:
+        return # deleted meanwhile
+
+    built = {variant_name for variant_name, payload, format in variants}
+    outdated = [variantName(name, variant) for variant in catalog.variants(name) if variantName(name, variant) not in built]
+    appendPrimitives(primfile, variants, shared)
+    for variant_name in outdated:
+        removePrimitive(primfile, variant_name)
+    catalog.recordRemoved(outdated)
+    catalog.recordAdded(built)
+
+    sizes = ", ".join(f"{variant_name.split(VARIANT_SEPARATOR)[-1]} {len(payload) // 1024} KB" for variant_name, payload, format in variants)
+    print(f"Built proxies for \"{name}\" in {seconds:.2f}s: {sizes}")
+
+# Builds proxies for every primitive of the current library that has none yet. Returns how many were queued.
+@instrumented()
+def generateLibraryProxies():
+    catalog = currentCatalog()
+    names = [name for name in catalog.primitiveNames() if not catalog.variants(name)]
+    if not scheduleProxies(catalog.library_path, names):
+        show_error_dialog("This library uses the old text .prim format, upgrade it to build proxies")
+        return 0
+    countItems(len(names))
+    return len(names)
+
+"""
+Swaps placed primitives between their proxy and full resolution, in one undo chunk.
+- transforms: scene transforms placed by Prim (tagged by tagPrimitive), other nodes are skipped
+- The transform keeps its placement, children and shading, only its shape is replaced
+- Returns the number of primitives swapped
+"""
+@instrumented()
+def swapPrimitives(transforms, to_proxy):
+    global pending_geometry
+    swapped = 0
+    cmds.undoInfo(openChunk=True, chunkName="Prim swap " + ("to proxy" if to_proxy else "to full resolution"))
+    try:
+        for transform in transforms:
+            if not cmds.attributeQuery("primName", node=transform, exists=True):
+                continue
+            library_path = cmds.getAttr(transform + ".primLibrary")
+            mesh_name = cmds.getAttr(transform + ".primName")
+            if not isRemoteLibrary(library_path) and not os.path.exists(library_path):
+                print(f"Warning: Library of \"{transform}\" not found: {library_path}")
+                continue
+
+            catalog = getCatalog(library_path)
+            variant = proxyVariant(catalog, mesh_name) if to_proxy else None
+            if to_proxy and variant is None:
+                print(f"No proxy built for \"{mesh_name}\" yet, building it ...")
+                scheduleProxies(library_path, [mesh_name])
+                continue
+            if variant == (cmds.getAttr(transform + ".primVariant") or None):
+                continue
+
+            geometry = getGeometry(variantName(mesh_name, variant) if variant else mesh_name, catalog)
+            if geometry is None:
+                print("Error: Could not find mesh for primitive \"" + mesh_name + "\"")
+                continue
+
+            old_shapes = cmds.listRelatives(transform, shapes=True, noIntermediate=True, fullPath=True) or []
+            shading = (cmds.listConnections(old_shapes, type="shadingEngine") or ["initialShadingGroup"]) if old_shapes else ["initialShadingGroup"]
+            pending_geometry = geometry
+            created = cmds.primCreateMesh()
+            shape = cmds.listRelatives(created, shapes=True, fullPath=True)[0]
+            shape = cmds.parent(shape, transform, shape=True, relative=True)[0]
+            cmds.delete(created)
+            # Instanced shapes are shared with other copies, only this copy lets go of them
+            shared_shapes = [old for old in old_shapes if len(cmds.listRelatives(old, allParents=True) or []) > 1]
+            for old in shared_shapes:
+                cmds.parent(old, shape=True, removeObject=True)
+            owned_shapes = [old for old in old_shapes if old not in shared_shapes]
+            if owned_shapes:
+                short_name = owned_shapes[0].split("|")[-1]
+                cmds.delete(owned_shapes)
+                shape = cmds.rename(shape, short_name)
+            cmds.sets(shape, edit=True, forceElement=shading[0])
+            cmds.setAttr(transform + ".primVariant", variant or "", type="string")
+            swapped += 1
+    finally:
+        pending_geometry = None
+        cmds.undoInfo(closeChunk=True)
+
+    print(f"Swapped {swapped} primitives to " + ("proxies" if to_proxy else "full resolution"))
+    countItems(swapped)
+    return swapped
+
+# Generates .obj files from .prim file, streaming one primitive at a time
+@instrumented()
 def generateMeshesFromPrimFile():
     from Prim import get_current_prim_file_path
     primfile = get_current_prim_file_path()
 
-    obj_meshes = {}
-
-    # Read prim file, create dictionary of mesh name to mesh obj data 
-    with open(primfile, 'r') as file:
-        lines = file.readlines()
-        previous_line = None
-        obj_data = []
-        skip = True 
-        name = ""
-
-        for line in lines:
-            current_line = line.strip()
-            if "beginMesh" in line:
-                name = previous_line
-                skip = False
-            if skip == False:
-                obj_data.append(current_line)
-            if "endMesh" in line:
-                skip = True 
-                print("Generated: " + name + ".obj")
-                obj_meshes[name] = obj_data
-                obj_data = []
-            
-            previous_line = current_line
-
-    # Create the .obj files from the dictionary
     meshes_path = os.path.dirname(os.path.realpath(__file__)) + "/../primitives/meshes/"
-    print(obj_meshes)
-    for name, data in obj_meshes.items():
+    primitives = set(getCatalog(primfile).primitiveNames())
+    for name, entry, payload in iterEntries(primfile):
+        if name not in primitives:
+            continue
+        with open(os.path.join(meshes_path, name + ".obj"), 'wb') as file:
+            file.write(payloadToObj(payload, entry["format"]))
         print("New mesh from .prim file: \"" + name + "\" created")
-        with open(os.path.join(meshes_path, name + ".obj"), 'w') as file:
-            file.write('\n'.join(data) + '\n')
+        countItems(1)
@@ -11,19 +11,26 @@ except ImportError:
     from PySide6 import QtGui
     pyside_version = "pyside_6"
 
-from MeshManager import instanceMesh, savePrimitiveData, deletePrimitiveData, generateMeshesFromPrimFile, renderMeshPreview
+from Catalog import getCatalog, installCatalog, catalogs
+from LibraryLoader import libraryLoad
+from Gallery import primitiveModel, primitiveDelegate, createGalleryView
+from PrimFile import PrimFileError, createPrimFile, isLegacyPrimFile, isRemoteLibrary, libraryKey, exportPrimFile
+from Session import saveSession, loadSession
+from Instrumentation import instrumented, summary as operationSummary, requestProfile, exportProfile, exportTrace, clear as clearOperations, profile_requests, profiles
 from maya.app.general.mayaMixin import MayaQWidgetDockableMixin
 import maya.OpenMayaUI as omui
 import maya.cmds as cmds # TODO: CMDS should go on separate file
 import maya.mel as mel
-import subprocess
-import shutil
+import maya.utils
 import sys
 import os
 
 # Global variable for the file being dynamically edited by prim
 current_prim_file_path = None
 
+# Primitives listed by a similarity search
+SIMILAR_RESULTS = 24
+
 def get_current_prim_file_path():
     global current_prim_file_path
     return current_prim_file_path
@@ -42,12 +49,6 @@ def show_decision_dialog(prompt):
     else:
         return False
 
-def clear_layout(layout):
-  while layout.count():
-    child = layout.takeAt(0)
-    if child.widget():
-      child.widget().setParent(None)
-
 def mayaWindow():
     main_window_ptr = omui.MQtUtil.mainWindow()
     return wrapInstance(int(main_window_ptr), QtWidgets.QWidget)
@@ -60,118 +61,282 @@ def show_error_dialog(prompt):
         dismissString='Ok'
     )
 
+# Libraries opened from a library server (see RemoteLibrary) cannot be changed, tells the user so
+def read_only_library(path):
+    if not path or not isRemoteLibrary(path):
+        return False
+    show_error_dialog("This library is opened from a library server and is read-only.\n\nExport it to a local library to change it.")
+    return True
+
 """
-Widget that shows a primitive in the UI. Contains:
-- primitive name
-- primitive thumbnail
-- create button
-- delete button
+Searches primitives across every library through the SQLite library database.
+- Matches by name, polygon budget and size, without opening any library
+- Double-clicking a result opens its library in the Prim window
 """
-class primitiveWidget(QtWidgets.QWidget):
-    # Constructor: PrimitiveWidget("path")
-    def __init__(self, name):
-        super().__init__()
-
-        self.name = name
+class librarySearchDialog(QtWidgets.QDialog):
+    COLUMNS = ("name", "library", "vertices", "faces", "size")
 
-        # Get thumbnail, set to default if not found 
-        self.thumbnail_path = self.getThumbnail()
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Prim library search")
+        self.setMinimumSize(560, 400)
 
-        # Creation functions
         self.createWidgets()
         self.createLayouts()
         self.createConnections()
 
-        self.setSizePolicy(QtWidgets.QSizePolicy.Policy.Preferred, QtWidgets.QSizePolicy.Policy.Fixed)
+    def createWidgets(self):
+        self.name_field = QtWidgets.QLineEdit()
+        self.name_field.setPlaceholderText("Name contains ...")
+
+        # 0 means no limit
+        self.min_faces_field = QtWidgets.QSpinBox()
+        self.max_faces_field = QtWidgets.QSpinBox()
+        self.max_size_field = QtWidgets.QDoubleSpinBox()
+        for field in (self.min_faces_field, self.max_faces_field):
+            field.setRange(0, 2 ** 31 - 1)
+            field.setSpecialValueText("any")
+        self.max_size_field.setRange(0, 1e9)
+        self.max_size_field.setSpecialValueText("any")
+
+        self.search_button = QtWidgets.QPushButton("Search")
+        self.reindex_button = QtWidgets.QPushButton("Reindex")
+        self.status_label = QtWidgets.QLabel()
+        self.status_label.setStyleSheet("color:darkgrey")
+
+        self.results_table = QtWidgets.QTableWidget(0, len(self.COLUMNS))
+        self.results_table.setHorizontalHeaderLabels([column.capitalize() for column in self.COLUMNS])
+        self.results_table.setEditTriggers(QtWidgets.QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.results_table.setSelectionBehavior(QtWidgets.QAbstractItemView.SelectionBehavior.SelectRows)
+        self.results_table.horizontalHeader().setStretchLastSection(True)
+        self.results_table.verticalHeader().setVisible(False)
 
-    def getThumbnail(self):
-        dir_path = os.path.dirname(os.path.realpath(__file__)) + "/../primitives/thumbnails"
-        files = cmds.getFileList(folder = dir_path)
+    def createLayouts(self):
+        filter_layout = QtWidgets.QFormLayout()
+        filter_layout.addRow("Name", self.name_field)
+        filter_layout.addRow("Min faces", self.min_faces_field)
+        filter_layout.addRow("Max faces", self.max_faces_field)
+        filter_layout.addRow("Max size", self.max_size_field)
 
-        if not files: 
-            print("Error: Thumbnails folder is empty") 
-            return
+        button_layout = QtWidgets.QHBoxLayout()
+        button_layout.addWidget(self.status_label)
+        button_layout.addStretch()
+        button_layout.addWidget(self.reindex_button)
+        button_layout.addWidget(self.search_button)
 
-        png_files = [f for f in files if f.endswith('.png')]
-        if not png_files: 
-            print("Error: No .png files found in thumbnails folder") 
-            return
+        main_layout = QtWidgets.QVBoxLayout(self)
+        main_layout.addLayout(filter_layout)
+        main_layout.addLayout(button_layout)
+        main_layout.addWidget(self.results_table)
 
-        image_path = None
-        for item in png_files:
-            full_name = os.path.join(dir_path, item)
-            file_name, ext = os.path.splitext(os.path.basename(full_name))
-            if file_name == self.name:
-                print(f"Found thumbnail for primitive: {self.name}")
-                image_path = full_name
-                break
+    def createConnections(self):
+        self.search_button.clicked.connect(self.search)
+        self.name_field.returnPressed.connect(self.search)
+        self.reindex_button.clicked.connect(self.reindex)
+        self.results_table.cellDoubleClicked.connect(self.openResult)
+
+    # Picks up libraries changed since the last search, only changed entries are read
+    def reindex(self):
+        from MeshManager import getLibraryDatabase
+        progress_dialog = QtWidgets.QProgressDialog("Indexing libraries ...", "Cancel", 0, 0, self)
+        progress_dialog.setWindowModality(QtCore.Qt.WindowModality.WindowModal)
+        progress_dialog.setMinimumDuration(500)
+
+        def progress(done, total, path):
+            progress_dialog.setMaximum(total)
+            progress_dialog.setValue(done)
+            progress_dialog.setLabelText(f"Indexing {os.path.basename(path)} ({done + 1}/{total})")
+            QtWidgets.QApplication.processEvents()
+            return not progress_dialog.wasCanceled()
+
+        database = getLibraryDatabase()
+        report = database.reindex(progress)
+        progress_dialog.close()
+        print(f"Library database: {report['updated']} of {report['scanned']} libraries re-indexed "
+              f"({report['primitives_read']} primitives read) in {report['seconds']:.2f}s")
+        if report["failed"]:
+            show_error_dialog(f"{report['failed']} libraries could not be indexed, see the Script Editor")
+
+        stats = database.statistics()
+        self.status_label.setText(f"{stats['primitives']} primitives in {stats['libraries']} libraries")
+        self.search()
+
+    def search(self):
+        from MeshManager import getLibraryDatabase
+        rows = getLibraryDatabase().query(
+            name=self.name_field.text() or None,
+            min_faces=self.min_faces_field.value() or None,
+            max_faces=self.max_faces_field.value() or None,
+            max_size=self.max_size_field.value() or None)
+
+        self.results_table.setRowCount(len(rows))
+        for row, result in enumerate(rows):
+            values = (result["name"], os.path.basename(result["library"]), result["vertices"], result["faces"],
+                      "" if result["size"] is None else f"{result['size']:.3g}")
+            for column, value in enumerate(values):
+                item = QtWidgets.QTableWidgetItem(str(value))
+                item.setData(QtCore.Qt.ItemDataRole.UserRole, result["library"])
+                self.results_table.setItem(row, column, item)
+
+    def openResult(self, row, column):
+        library = self.results_table.item(row, 0).data(QtCore.Qt.ItemDataRole.UserRole)
+        self.parent().openLibrary(library, select=self.results_table.item(row, 0).text())
+
+# Byte counts as B, KB, MB ...
+def formatBytes(count):
+    for unit in ("B", "KB", "MB", "GB"):
+        if count < 1024 or unit == "GB":
+            return f"{count:.0f} {unit}" if unit == "B" else f"{count:.1f} {unit}"
+        count /= 1024
 
-        if not image_path:
-            print(f"Error: Could not find thumbnail for primitive \"{self.name}\", setting to default ...")
-            image_path = os.path.dirname(os.path.realpath(__file__)) + "/../primitives/thumbnails/default.png"
+"""
+Timings of MeshManager operations and UI refreshes (see Instrumentation), as percentiles over the latest calls.
+- Refreshes every second while shown
+- A selected operation can be profiled on its next call, and its profile exported (.prof, or .txt for a report)
+- Every recorded call can be exported as a Chrome/Perfetto trace
+"""
+class performanceDialog(QtWidgets.QDialog):
+    COLUMNS = ("Operation", "Calls", "p50 ms", "p90 ms", "p99 ms", "Max ms", "Total s", "Read", "Written", "Items")
+    REFRESH_INTERVAL = 1000
 
-        return image_path
-     
-    def createWidgets(self):
-        # Labels
-        self.name_label = QtWidgets.QLabel(self.name)
-        self.image_label = QtWidgets.QLabel()
-        self.image_label.setPixmap(QtGui.QPixmap(self.thumbnail_path))
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Prim performance")
+        self.setMinimumSize(760, 360)
 
-        self.name_label.setAlignment(QtCore.Qt.AlignmentFlag.AlignCenter)
-        self.image_label.setAlignment(QtCore.Qt.AlignmentFlag.AlignCenter)
+        self.createWidgets()
+        self.createLayouts()
+        self.createConnections()
+        self.refresh()
 
-        # Buttons
-        self.create_button = QtWidgets.QPushButton("Create")
-        self.delete_button = QtWidgets.QPushButton("Delete")
+    def createWidgets(self):
+        from MeshManager import getInstrumentation
+        self.record_box = QtWidgets.QCheckBox("Record timings")
+        self.record_box.setChecked(getInstrumentation())
+        self.status_label = QtWidgets.QLabel()
+        self.status_label.setStyleSheet("color:darkgrey")
+
+        self.profile_button = QtWidgets.QPushButton("Profile next call")
+        self.export_profile_button = QtWidgets.QPushButton("Export profile ...")
+        self.export_trace_button = QtWidgets.QPushButton("Export trace ...")
+        self.clear_button = QtWidgets.QPushButton("Clear")
+
+        self.table = QtWidgets.QTableWidget(0, len(self.COLUMNS))
+        self.table.setHorizontalHeaderLabels(self.COLUMNS)
+        self.table.setEditTriggers(QtWidgets.QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.table.setSelectionBehavior(QtWidgets.QAbstractItemView.SelectionBehavior.SelectRows)
+        self.table.setSelectionMode(QtWidgets.QAbstractItemView.SelectionMode.SingleSelection)
+        self.table.horizontalHeader().setStretchLastSection(True)
+        self.table.verticalHeader().setVisible(False)
+
+        self.timer = QtCore.QTimer(self)
+        self.timer.setInterval(self.REFRESH_INTERVAL)
 
     def createLayouts(self):
-        main_layout = QtWidgets.QVBoxLayout(self)
-        button_layout = QtWidgets.QHBoxLayout()
-
-        main_layout.addWidget(self.name_label)
-        main_layout.addWidget(self.image_label)
+        top_layout = QtWidgets.QHBoxLayout()
+        top_layout.addWidget(self.record_box)
+        top_layout.addWidget(self.status_label)
+        top_layout.addStretch()
+        top_layout.addWidget(self.clear_button)
 
+        button_layout = QtWidgets.QHBoxLayout()
+        button_layout.addWidget(self.profile_button)
+        button_layout.addWidget(self.export_profile_button)
         button_layout.addStretch()
-        button_layout.addWidget(self.create_button)
-        button_layout.addWidget(self.delete_button)
-        button_layout.addStretch()
+        button_layout.addWidget(self.export_trace_button)
 
+        main_layout = QtWidgets.QVBoxLayout(self)
+        main_layout.addLayout(top_layout)
+        main_layout.addWidget(self.table)
         main_layout.addLayout(button_layout)
 
     def createConnections(self):
-        self.create_button.clicked.connect(self.createPrimitive)
-        self.delete_button.clicked.connect(self.deletePrimitive)
-
-    def createPrimitive(self):
-        instanceMesh(self.name)
-
-    def deletePrimitive(self):
-        confirm = show_decision_dialog("Are you sure you wish to delete this primitive?\n\nThis action is irreversible!")
-        if confirm == False: return
+        from MeshManager import setInstrumentation
+        self.record_box.toggled.connect(setInstrumentation)
+        self.profile_button.clicked.connect(self.profileSelected)
+        self.export_profile_button.clicked.connect(self.exportSelectedProfile)
+        self.export_trace_button.clicked.connect(self.exportTimings)
+        self.clear_button.clicked.connect(self.clear)
+        self.timer.timeout.connect(self.refresh)
+
+    def showEvent(self, event):
+        self.timer.start()
+        self.refresh()
+        super().showEvent(event)
+
+    def hideEvent(self, event):
+        self.timer.stop()
+        super().hideEvent(event)
+
+    # Operation name of the selected row, without its profiling note
+    def selectedName(self):
+        items = self.table.selectedItems()
+        if not items:
+            return None
+        return self.table.item(items[0].row(), 0).data(QtCore.Qt.ItemDataRole.UserRole)
+
+    def refresh(self):
+        from MeshManager import getInstrumentation
+        selected = self.selectedName()
+        stats = operationSummary()
+        self.table.setRowCount(len(stats))
+        for row, (name, values) in enumerate(stats):
+            label = name + (" (profiling next call)" if name in profile_requests else " (profiled)" if name in profiles else "")
+            cells = (label, values["calls"], f"{values['p50_ms']:.2f}", f"{values['p90_ms']:.2f}", f"{values['p99_ms']:.2f}",
+                     f"{values['max_ms']:.2f}", f"{values['total_s']:.3f}", formatBytes(values["bytes_read"]),
+                     formatBytes(values["bytes_written"]), values["items"])
+            for column, value in enumerate(cells):
+                self.table.setItem(row, column, QtWidgets.QTableWidgetItem(str(value)))
+            self.table.item(row, 0).setData(QtCore.Qt.ItemDataRole.UserRole, name)
+            if name == selected:
+                self.table.selectRow(row)
+
+        calls = sum(values["calls"] for name, values in stats)
+        self.status_label.setText(f"{calls} calls recorded" if getInstrumentation() else "Recording is off")
+
+    def profileSelected(self):
+        from MeshManager import getInstrumentation
+        name = self.selectedName()
+        if name is None:
+            show_error_dialog("Select an operation to profile first")
+            return
+        if not getInstrumentation():
+            self.record_box.setChecked(True)
+        requestProfile(name)
+        print(f"The next call of {name} will be profiled")
+        self.refresh()
+
+    def exportSelectedProfile(self):
+        name = self.selectedName()
+        if name is None or name not in profiles:
+            show_error_dialog("Select a profiled operation first (\"Profile next call\", then run it)")
+            return
 
-        deletePrimitiveData(self.name)
+        path = cmds.fileDialog2(fileMode=0, caption="Export profile", fileFilter="Python profile (*.prof);;Text report (*.txt)")
+        if not path: return
+        exportProfile(name, path[0])
+        print(f"Exported the profile of {name} to: {path[0]}")
 
-        thumbnails_path = os.path.dirname(os.path.realpath(__file__)) + "/../primitives/thumbnails/"
-        files = cmds.getFileList(folder = thumbnails_path)
-        if files: 
-            png_files = [f for f in files if f.endswith('.png')]
-        if png_files: 
-            for f in png_files:
-                if f == self.name +  ".png":
-                    os.remove(thumbnails_path + f)
-                    break
+    def exportTimings(self):
+        path = cmds.fileDialog2(fileMode=0, caption="Export trace", fileFilter="Chrome trace (*.json)")
+        if not path: return
+        count = exportTrace(path[0])
+        print(f"Exported {count} timed calls to: {path[0]} (open in chrome://tracing or ui.perfetto.dev)")
 
-        if self.name in mainWindow.window_instance.primitive_widgets:
-            del mainWindow.window_instance.primitive_widgets[self.name]
-        mainWindow.window_instance.refreshPrimitiveWidgets()
+    def clear(self):
+        clearOperations()
+        self.refresh()
 
 """
 Main plugin window. Is child of maya's main window.
 """
 class mainWindow(MayaQWidgetDockableMixin, QtWidgets.QMainWindow):
     window_instance = None
-    primitive_widgets = {} 
+    catalog = None
+    search_dialog = None
+    performance_dialog = None
+    library_load = None
+    session_stamp = None # (library, library stamp) last written to the session manifest
 
     # Highlight the window if already opened
     @classmethod
@@ -185,8 +350,9 @@ class mainWindow(MayaQWidgetDockableMixin, QtWidgets.QMainWindow):
             cls.window_instance.raise_()
             cls.window_instance.activateWindow() 
 
-    def __init__(self, parent=mayaWindow()):
-        super().__init__(parent)
+    # The parent is looked up when the window is built, importing this module does not touch Maya's UI
+    def __init__(self, parent=None):
+        super().__init__(parent if parent is not None else mayaWindow())
         self.setWindowTitle("Prim")
         self.setMinimumHeight(250)
         self.setMinimumWidth(200)
@@ -200,6 +366,10 @@ class mainWindow(MayaQWidgetDockableMixin, QtWidgets.QMainWindow):
         self.createWidgets()
         self.createLayouts()
         self.createConnections()
+        self.restoreSession()
+
+        # The library modules (and NumPy) load once the window is up
+        maya.utils.executeDeferred(self.finishStartup)
 
     def createMenus(self):
         menu_bar = self.menuBar()
@@ -210,32 +380,144 @@ class mainWindow(MayaQWidgetDockableMixin, QtWidgets.QMainWindow):
         if pyside_version == "pyside_6":
             self.new_action = QtGui.QAction("New primitive library", self)
             self.open_action = QtGui.QAction("Open primitive library", self)
+            self.open_remote_action = QtGui.QAction("Open remote library", self)
             self.export_action = QtGui.QAction("Export current library", self)
+            self.export_compact_action = QtGui.QAction("Export compact library", self)
+            self.compact_action = QtGui.QAction("Compact current library", self)
+            self.search_action = QtGui.QAction("Search all libraries", self)
         elif pyside_version == "pyside_2":
             self.new_action = QtWidgets.QAction("New primitive library", self)
             self.open_action = QtWidgets.QAction("Open primitive library", self)
+            self.open_remote_action = QtWidgets.QAction("Open remote library", self)
             self.export_action = QtWidgets.QAction("Export current library", self)
+            self.export_compact_action = QtWidgets.QAction("Export compact library", self)
+            self.compact_action = QtWidgets.QAction("Compact current library", self)
+            self.search_action = QtWidgets.QAction("Search all libraries", self)
 
         self.file_menu.addAction(self.new_action)
         self.file_menu.addAction(self.open_action)
+        self.file_menu.addAction(self.open_remote_action)
         self.file_menu.addAction(self.export_action)
+        self.file_menu.addAction(self.export_compact_action)
+        self.file_menu.addAction(self.compact_action)
+        self.file_menu.addAction(self.search_action)
         self.new_action.triggered.connect(self.newPrimitiveLibrary)
         self.open_action.triggered.connect(self.openPrimitiveLibrary)
+        self.open_remote_action.triggered.connect(self.openRemoteLibrary)
         self.export_action.triggered.connect(self.exportPrimitiveFile)
+        self.export_compact_action.triggered.connect(self.exportCompactPrimitiveFile)
+        self.compact_action.triggered.connect(self.compactPrimitiveFile)
+        self.search_action.triggered.connect(self.searchLibraries)
 
         # "Prim" menu
         self.prim_menu = menu_bar.addMenu("Prim")
 
         if pyside_version == "pyside_6":
             self.refresh_action = QtGui.QAction("Refresh primitives", self)
+            self.render_thumbnails_action = QtGui.QAction("Render missing thumbnails", self)
+            self.thumbnail_size_action = QtGui.QAction("Thumbnail size", self)
+            self.embed_thumbnails_action = QtGui.QAction("Embed thumbnails in library", self)
+            self.similar_selection_action = QtGui.QAction("Find similar to selection", self)
+            self.similar_primitive_action = QtGui.QAction("Find similar to selected primitive", self)
+            self.show_all_action = QtGui.QAction("Show all primitives", self)
+            self.cache_action = QtGui.QAction("Mesh cache size", self)
+            self.remote_cache_action = QtGui.QAction("Remote cache size", self)
+            self.binary_action = QtGui.QAction("Convert library to binary geometry", self)
+            self.text_action = QtGui.QAction("Convert library to OBJ text", self)
+            self.share_action = QtGui.QAction("Move library to shared geometry", self)
+            self.shared_saves_action = QtGui.QAction("Save to shared geometry", self)
+            self.shared_report_action = QtGui.QAction("Shared geometry report", self)
+            self.shared_clean_action = QtGui.QAction("Clean up shared geometry", self)
+            self.place_proxy_action = QtGui.QAction("Place as proxy", self)
+            self.place_instance_action = QtGui.QAction("Place as instance", self)
+            self.scatter_action = QtGui.QAction("Scatter selected primitive on selection", self)
+            self.swap_full_action = QtGui.QAction("Swap selection to full resolution", self)
+            self.swap_proxy_action = QtGui.QAction("Swap selection to proxy", self)
+            self.generate_proxies_action = QtGui.QAction("Build proxies for library", self)
+            self.proxy_settings_action = QtGui.QAction("Proxy settings", self)
+            self.performance_action = QtGui.QAction("Performance", self)
             self.help_action = QtGui.QAction("Help", self)
         elif pyside_version == "pyside_2":
             self.refresh_action = QtWidgets.QAction("Refresh primitives", self)
+            self.render_thumbnails_action = QtWidgets.QAction("Render missing thumbnails", self)
+            self.thumbnail_size_action = QtWidgets.QAction("Thumbnail size", self)
+            self.embed_thumbnails_action = QtWidgets.QAction("Embed thumbnails in library", self)
+            self.similar_selection_action = QtWidgets.QAction("Find similar to selection", self)
+            self.similar_primitive_action = QtWidgets.QAction("Find similar to selected primitive", self)
+            self.show_all_action = QtWidgets.QAction("Show all primitives", self)
+            self.cache_action = QtWidgets.QAction("Mesh cache size", self)
+            self.remote_cache_action = QtWidgets.QAction("Remote cache size", self)
+            self.binary_action = QtWidgets.QAction("Convert library to binary geometry", self)
+            self.text_action = QtWidgets.QAction("Convert library to OBJ text", self)
+            self.share_action = QtWidgets.QAction("Move library to shared geometry", self)
+            self.shared_saves_action = QtWidgets.QAction("Save to shared geometry", self)
+            self.shared_report_action = QtWidgets.QAction("Shared geometry report", self)
+            self.shared_clean_action = QtWidgets.QAction("Clean up shared geometry", self)
+            self.place_proxy_action = QtWidgets.QAction("Place as proxy", self)
+            self.place_instance_action = QtWidgets.QAction("Place as instance", self)
+            self.scatter_action = QtWidgets.QAction("Scatter selected primitive on selection", self)
+            self.swap_full_action = QtWidgets.QAction("Swap selection to full resolution", self)
+            self.swap_proxy_action = QtWidgets.QAction("Swap selection to proxy", self)
+            self.generate_proxies_action = QtWidgets.QAction("Build proxies for library", self)
+            self.proxy_settings_action = QtWidgets.QAction("Proxy settings", self)
+            self.performance_action = QtWidgets.QAction("Performance", self)
             self.help_action = QtWidgets.QAction("Help", self)
 
         self.prim_menu.addAction(self.refresh_action)
+        self.prim_menu.addAction(self.render_thumbnails_action)
+        self.prim_menu.addAction(self.thumbnail_size_action)
+        self.prim_menu.addAction(self.embed_thumbnails_action)
+        self.prim_menu.addAction(self.similar_selection_action)
+        self.prim_menu.addAction(self.similar_primitive_action)
+        self.prim_menu.addAction(self.show_all_action)
+        self.prim_menu.addAction(self.cache_action)
+        self.prim_menu.addAction(self.remote_cache_action)
+        self.prim_menu.addAction(self.binary_action)
+        self.prim_menu.addAction(self.text_action)
+        self.prim_menu.addAction(self.share_action)
+        self.prim_menu.addAction(self.shared_saves_action)
+        self.prim_menu.addAction(self.shared_report_action)
+        self.prim_menu.addAction(self.shared_clean_action)
+        self.prim_menu.addAction(self.place_proxy_action)
+        self.prim_menu.addAction(self.place_instance_action)
+        self.prim_menu.addAction(self.scatter_action)
+        self.prim_menu.addAction(self.swap_full_action)
+        self.prim_menu.addAction(self.swap_proxy_action)
+        self.prim_menu.addAction(self.generate_proxies_action)
+        self.prim_menu.addAction(self.proxy_settings_action)
+        self.prim_menu.addAction(self.performance_action)
         self.prim_menu.addAction(self.help_action)
-        self.refresh_action.triggered.connect(self.refreshPrimitiveWidgets)
+        self.refresh_action.triggered.connect(lambda: self.refreshThumbnails())
+        self.render_thumbnails_action.triggered.connect(self.renderMissingThumbnails)
+        self.thumbnail_size_action.triggered.connect(self.setThumbnailResolution)
+        self.embed_thumbnails_action.triggered.connect(self.embedThumbnails)
+        self.similar_selection_action.triggered.connect(lambda: self.findSimilar(from_gallery=False))
+        self.similar_primitive_action.triggered.connect(lambda: self.findSimilar(from_gallery=True))
+        self.show_all_action.triggered.connect(lambda: self.showAllPrimitives())
+        self.cache_action.triggered.connect(self.setMeshCacheSize)
+        self.remote_cache_action.triggered.connect(self.setRemoteCacheSize)
+        self.binary_action.triggered.connect(lambda: self.convertLibrary("geometry"))
+        self.text_action.triggered.connect(lambda: self.convertLibrary("obj"))
+        self.share_action.triggered.connect(self.shareLibrary)
+        self.shared_saves_action.setCheckable(True)
+        self.shared_saves_action.toggled.connect(lambda enabled: self.setOption("SharedGeometry", enabled))
+        self.shared_report_action.triggered.connect(self.showSharedGeometryReport)
+        self.shared_clean_action.triggered.connect(self.cleanSharedGeometry)
+        self.place_proxy_action.setCheckable(True)
+        self.place_proxy_action.toggled.connect(lambda enabled: self.setOption("PlaceAsProxy", enabled))
+        self.place_instance_action.setCheckable(True)
+        self.place_instance_action.toggled.connect(lambda enabled: self.setOption("PlaceAsInstance", enabled))
+
+        # Checkable options show their optionVar, read when the menu opens
+        self.option_actions = {"SharedGeometry": self.shared_saves_action, "PlaceAsProxy": self.place_proxy_action,
+                               "PlaceAsInstance": self.place_instance_action}
+        self.prim_menu.aboutToShow.connect(self.syncOptions)
+        self.scatter_action.triggered.connect(self.scatterPrimitive)
+        self.swap_full_action.triggered.connect(lambda: self.swapSelection(to_proxy=False))
+        self.swap_proxy_action.triggered.connect(lambda: self.swapSelection(to_proxy=True))
+        self.generate_proxies_action.triggered.connect(self.generateProxies)
+        self.proxy_settings_action.triggered.connect(self.setProxyDetail)
+        self.performance_action.triggered.connect(self.showPerformance)
         self.help_action.triggered.connect(self.redirectHelp)
 
     def createWidgets(self):
@@ -247,18 +529,28 @@ class mainWindow(MayaQWidgetDockableMixin, QtWidgets.QMainWindow):
         self.current_file_label = QtWidgets.QLabel("Current library: None")
         self.current_file_label.setStyleSheet("color:darkgrey")
 
+        # Label shown while the gallery holds search results
+        self.filter_label = QtWidgets.QLabel()
+        self.filter_label.setStyleSheet("color:darkgrey")
+        self.filter_label.hide()
+
         # Text field/buttons
         self.primitive_label = QtWidgets.QLabel("New primitive name")
         self.primitive_label.setStyleSheet("color:white")
         self.primitive_name = QtWidgets.QLineEdit()
         self.saveprimitive_button = QtWidgets.QPushButton("Save primitive")
         
-        # Scroll area setup
-        self.scroll_area = QtWidgets.QScrollArea()
-        self.scroll_area.setBackgroundRole(QtGui.QPalette.ColorRole.Dark)
-        self.scroll_area.setWidgetResizable(True)
-        self.scroll_area.setVerticalScrollBarPolicy(QtCore.Qt.ScrollBarPolicy.ScrollBarAlwaysOn)
-        self.scroll_area.setHorizontalScrollBarPolicy(QtCore.Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
+        # Gallery: only visible primitives are painted, thumbnails load as they scroll into view
+        self.gallery_model = primitiveModel(self)
+        self.gallery_delegate = primitiveDelegate(self)
+        self.gallery_view = createGalleryView(self.gallery_model, self.gallery_delegate)
+
+        # Shown while a library opens in the background
+        self.load_progress = QtWidgets.QProgressBar()
+        self.load_progress.setTextVisible(True)
+        self.load_cancel_button = QtWidgets.QPushButton("Cancel")
+        self.load_progress.hide()
+        self.load_cancel_button.hide()
 
     def createLayouts(self):
         main_layout = QtWidgets.QVBoxLayout(self.central_widget)
@@ -266,16 +558,69 @@ class mainWindow(MayaQWidgetDockableMixin, QtWidgets.QMainWindow):
         main_layout.addWidget(self.primitive_label)
         main_layout.addWidget(self.primitive_name)
         main_layout.addWidget(self.saveprimitive_button)
-        main_layout.addWidget(self.scroll_area)
-
-        self.gallery_widget = QtWidgets.QWidget()  # Widget to contain the gallery layout
-        self.gallery_layout = QtWidgets.QVBoxLayout(self.gallery_widget)
-
-        self.gallery_layout.addStretch()
-        self.scroll_area.setWidget(self.gallery_widget)  # Set the gallery widget as the scroll area's widget
+        main_layout.addWidget(self.filter_label)
+        load_layout = QtWidgets.QHBoxLayout()
+        load_layout.addWidget(self.load_progress)
+        load_layout.addWidget(self.load_cancel_button)
+        main_layout.addLayout(load_layout)
+        main_layout.addWidget(self.gallery_view)
 
     def createConnections(self):
         self.saveprimitive_button.clicked.connect(self.savePrimitive)
+        self.gallery_delegate.createClicked.connect(self.createPrimitive)
+        self.gallery_delegate.deleteClicked.connect(self.deletePrimitive)
+        self.load_cancel_button.clicked.connect(self.cancelLoad)
+
+    # Imports what the window does not need to show up, before the first action needs it
+    def finishStartup(self):
+        from MeshManager import getInstrumentation, setInstrumentation, getRemoteCacheLimit, setRemoteCacheLimit
+        from ThumbnailRenderer import thumbnailRenderer
+        setInstrumentation(getInstrumentation())
+        setRemoteCacheLimit(getRemoteCacheLimit())
+        if self.onThumbnailRendered not in thumbnailRenderer.get().listeners:
+            thumbnailRenderer.get().listeners.append(self.onThumbnailRendered)
+
+    def syncOptions(self):
+        import MeshManager
+        for option, action in self.option_actions.items():
+            action.blockSignals(True)
+            action.setChecked(getattr(MeshManager, "get" + option)())
+            action.blockSignals(False)
+
+    def setOption(self, option, enabled):
+        import MeshManager
+        getattr(MeshManager, "set" + option)(enabled)
+
+    """
+    Shows the library of the last session (see Session).
+    - Unchanged since, its primitives are listed from the manifest while the catalog loads
+    - Changed, it is opened in the background as usual
+    - Either starts once the window is up: laying out a large gallery, or a load competing
+      for the interpreter, would hold back its first paint
+    """
+    def restoreSession(self):
+        session = loadSession()
+        if session is None:
+            return
+        path, names = session
+        if libraryKey(path) in catalogs:
+            self.finishOpen(path)
+        else:
+            QtCore.QTimer.singleShot(0, lambda: self.openLibrary(path, ask_upgrade=False, shown=names))
+
+    # Remembers the current library for the next session, unless the manifest already holds it
+    def saveSession(self):
+        if self.catalog is None or self.library_load is not None or self.sessionStamp() == self.session_stamp:
+            return
+        saveSession(self.catalog)
+        self.session_stamp = self.sessionStamp()
+
+    def sessionStamp(self):
+        return self.catalog.library_path, self.catalog.library_stamp
+
+    def hideEvent(self, event):
+        self.saveSession()
+        super().hideEvent(event)
 
     # Updates current .prim file label
     def updateCurrentFile(self, file_path): 
@@ -290,6 +635,49 @@ class mainWindow(MayaQWidgetDockableMixin, QtWidgets.QMainWindow):
         self.current_file_label.setText("Current library: " + title)
         print(f"Current prim file updated to: {file_path}")
 
+    # Saves several meshes in one batch, with a progress bar and a single gallery refresh
+    def savePrimitiveBatch(self, transforms):
+        from MeshManager import savePrimitivesBatch
+        pattern = self.primitive_name.text() or None
+        if pattern and "{" not in pattern:
+            pattern += "_{index:03d}"
+        if pattern:
+            try:
+                pattern.format(name="mesh", index=1)
+            except (KeyError, IndexError, ValueError):
+                show_error_dialog("Invalid name pattern, use {name} and {index}, for example rock_{index:03d}")
+                return
+
+        progress_dialog = QtWidgets.QProgressDialog("Saving primitives ...", "Cancel", 0, len(transforms), self)
+        progress_dialog.setWindowTitle("Prim batch save")
+        progress_dialog.setWindowModality(QtCore.Qt.WindowModality.WindowModal)
+        progress_dialog.setMinimumDuration(0)
+
+        def progress(done, total, name):
+            progress_dialog.setValue(done)
+            progress_dialog.setLabelText(f"Saving \"{name}\" ({done + 1}/{total})")
+            QtWidgets.QApplication.processEvents()
+            return not progress_dialog.wasCanceled()
+
+        report = savePrimitivesBatch(transforms, pattern, progress)
+        progress_dialog.setValue(len(transforms))
+
+        # Thumbnails are not rendered in batch, saved rows show the default one
+        self.gallery_model.addPrimitives(report["saved"])
+
+        summary = f"Saved {len(report['saved'])} primitives in {report['seconds']:.1f}s ({report['meshes_per_second']:.1f} meshes/s)"
+        if report["cancelled"]:
+            summary += "\nThe batch was cancelled."
+        if report["failed"]:
+            failures = "\n".join(f"{node.split('|')[-1]}: {reason}" for node, reason in report["failed"][:20])
+            if len(report["failed"]) > 20:
+                failures += f"\n... and {len(report['failed']) - 20} more (see Script Editor)"
+            for node, reason in report["failed"]:
+                print(f"Error: Could not save {node}: {reason}")
+            summary += f"\n\n{len(report['failed'])} failed:\n" + failures
+
+        cmds.confirmDialog(title="Batch save", message=summary, button="Ok", dismissString="Ok")
+
     # User creates new primitive library file
     def newPrimitiveLibrary(self):
         user_file_name = None
@@ -306,35 +694,27 @@ class mainWindow(MayaQWidgetDockableMixin, QtWidgets.QMainWindow):
         user_file_name = cmds.promptDialog(query=True, text=True)
         dir_path = os.path.dirname(os.path.realpath(__file__)) + "/../primitives/libraries"
 
-        # Check for files in /libraries
-        files = cmds.getFileList(folder = dir_path)
-        if files: 
-            # Check for .prim files in /libraries
-            prim_files = [f for f in files if f.endswith('.prim')]
-            if prim_files: 
-                for item in prim_files:
-                    full_name = os.path.join(dir_path, item)
-                    file_name, ext = os.path.splitext(os.path.basename(full_name))
-                    if file_name == user_file_name:
-                        show_confirmation_dialog("A local primitive already has this name, try another name.")
-                        return
-
         if not user_file_name:
-            show_confirmation_dialog("Please enter a non-empty name")
+            show_error_dialog("Please enter a non-empty name")
+            return
+
+        # Check /libraries for a library with this name
+        if os.path.exists(os.path.join(dir_path, user_file_name + ".prim")):
+            show_error_dialog("A local primitive already has this name, try another name.")
             return
 
         full_filename = user_file_name + ".prim" 
 
         # TODO This breaks with spaces in file name
-        open(os.path.join(dir_path, full_filename), 'w')
+        createPrimFile(os.path.join(dir_path, full_filename))
         print("New prim library file with name: \"" + user_file_name + "\" created")
 
         # Update current file
+        self.cancelLoad()
         self.updateCurrentFile(os.path.join(dir_path, full_filename))
 
-        # Clear widgets
-        self.primitive_widgets = {}
-        self.refreshPrimitiveWidgets()
+        # Show the new, empty library
+        self.openCatalog(current_prim_file_path)
 
     # Imports a primitive library
     def openPrimitiveLibrary(self):
@@ -342,60 +722,552 @@ class mainWindow(MayaQWidgetDockableMixin, QtWidgets.QMainWindow):
         # Open file, and update current file data
         libraries_path = os.path.dirname(os.path.realpath(__file__)) + "/../primitives/libraries"
         path = cmds.fileDialog2(startingDirectory=libraries_path, fileFilter="Primitive Library(*.prim)", fileMode=1, dialogStyle=2)
-        if path[0]: self.updateCurrentFile(path[0])
+        if not path: return
+        self.openLibrary(path[0])
+
+    """
+    Opens a library served by a library server (see LibraryServer), read-only.
+    - A library URL opens directly, a server URL lists the server's libraries to pick from
+    - Only the index is downloaded up front, thumbnails and meshes as they are shown or placed (see RemoteLibrary)
+    """
+    def openRemoteLibrary(self):
+        import urllib.parse
+        from RemoteLibrary import listRemoteLibraries, RemoteLibraryError
+        default = current_prim_file_path if current_prim_file_path and isRemoteLibrary(current_prim_file_path) else "http://localhost:8765/"
+        prompt = cmds.promptDialog(title="Open remote library",
+                                   message="Library server or library URL:",
+                                   text=default,
+                                   button=["Open", "Cancel"],
+                                   defaultButton="Open",
+                                   cancelButton="Cancel")
+
+        if prompt != "Open": return
+        url = cmds.promptDialog(query=True, text=True).strip()
+        if not isRemoteLibrary(url):
+            show_error_dialog("Please enter an http:// or https:// URL, for example http://localhost:8765/")
+            return
+
+        if not url.endswith(".prim"):
+            try:
+                libraries = listRemoteLibraries(url)
+            except RemoteLibraryError as error:
+                show_error_dialog(str(error))
+                return
+            if not libraries:
+                show_error_dialog(f"The server has no primitive libraries: {url}")
+                return
+            names = [urllib.parse.unquote(library.split("/libraries/", 1)[1]) for library in libraries]
+            name, ok = QtWidgets.QInputDialog.getItem(self, "Open remote library", "Library:", names, 0, False)
+            if not ok: return
+            url = libraries[names.index(name)]
+
+        self.openLibrary(url)
+
+    """
+    Makes a library current and shows it, optionally scrolled to one primitive.
+    - Libraries not open yet are read in the background (see LibraryLoader), the gallery fills as names arrive
+    - The current library only changes once the load finishes, cancelling keeps the previous one
+    - ask_upgrade: offer to upgrade text libraries first, off when the window reopens the last session's library
+    - shown: primitive names known ahead (see Session), listed while the library loads
+    """
+    def openLibrary(self, path, select=None, ask_upgrade=True, shown=None):
+        self.cancelLoad()
+
+        # Offer to rewrite text-only libraries with an index
+        upgrade = False
+        if ask_upgrade and not isRemoteLibrary(path) and os.path.getsize(path) > 0 and isLegacyPrimFile(path):
+            upgrade = show_decision_dialog("This library uses the old text .prim format.\n\nUpgrade it to the indexed format for faster loading?")
+
+        # Already read in this session, the catalog is up to date
+        if not upgrade and libraryKey(path) in catalogs:
+            self.finishOpen(path, select)
+            return
+
+        self.library_load = libraryLoad(path, upgrade, parent=self)
+        self.library_load.progress = self.onLoadProgress
+        self.library_load.names = self.gallery_model.addPrimitives
+        self.library_load.thumbnails = self.gallery_model.setThumbnailIndex
+        self.library_load.finished = lambda preloaded: self.finishOpen(path, select, preloaded)
+        self.library_load.failed = self.onLoadFailed
+
+        self.gallery_model.setPrimitives(shown or [], {})
+        self.filter_label.setText(f"Opening {os.path.basename(path)} ...")
+        self.filter_label.show()
+        self.load_progress.setRange(0, 0)
+        self.load_progress.show()
+        self.load_cancel_button.show()
+        self.library_load.start()
+
+    # Switches to a library once it is read: preloaded is the data read in the background, None if already open
+    @instrumented()
+    def finishOpen(self, path, select=None, preloaded=None):
+        self.endLoad()
+        if preloaded is not None:
+            installCatalog(path, preloaded)
+        self.updateCurrentFile(path)
         print(f"Opened primitive library: {current_prim_file_path}")
 
-        # Delete all .obj meshes 
-        meshes_path = os.path.dirname(os.path.realpath(__file__)) + "/../primitives/meshes/"
-        files = cmds.getFileList(folder = meshes_path)
-        if files: 
-            obj_files = [f for f in files if f.endswith('.obj')]
-            if obj_files: 
-                for f in obj_files:
-                    os.remove(meshes_path + f)
-
-        #TODO: This deletes all images, but assumes they are regenerated on batch.
-
-        # Generate .obj meshes from prim file 
-        generateMeshesFromPrimFile()
-
-        # Update primitive UI using .obj meshes
-        self.primitive_widgets = {}
-        files = cmds.getFileList(folder = meshes_path)
-        if files: 
-            obj_files = [f for f in files if f.endswith('.obj')]
-            if obj_files: 
-                for f in obj_files:
-                    self.addPrimitiveWidget(f.split(".")[0])
-        self.refreshPrimitiveWidgets()
+        # Only read the name list, meshes are extracted to the cache on first use
+        self.openCatalog(current_prim_file_path)
+        maya.utils.executeDeferred(self.saveSession)
+
+        row = self.gallery_model.rows.get(select)
+        if row is not None:
+            index = self.gallery_model.index(row)
+            self.gallery_view.setCurrentIndex(index)
+            self.gallery_view.scrollTo(index, QtWidgets.QAbstractItemView.ScrollHint.PositionAtCenter)
+
+    def onLoadProgress(self, done, total, stage):
+        # QProgressBar holds ints, large files are shown in KB
+        scale = 1024 if total > 2 ** 31 - 1 else 1
+        self.load_progress.setRange(0, max(total // scale, 1))
+        self.load_progress.setValue(done // scale)
+        self.load_progress.setFormat(f"{stage} %p% ({len(self.gallery_model.names)} primitives)")
+
+    def onLoadFailed(self, message):
+        self.endLoad()
+        self.showAllPrimitives()
+        show_error_dialog(f"Could not open the library:\n\n{message}")
+
+    # Stops a library load in progress, the gallery goes back to the current library
+    def cancelLoad(self):
+        if self.library_load is None or not self.library_load.isRunning():
+            return
+        self.library_load.cancel()
+        self.endLoad()
+        self.showAllPrimitives()
+        print("Cancelled opening the primitive library")
+
+    def endLoad(self):
+        self.library_load = None
+        self.filter_label.hide()
+        self.load_progress.hide()
+        self.load_cancel_button.hide()
+
+    def showPerformance(self):
+        if self.performance_dialog is None:
+            self.performance_dialog = performanceDialog(self)
+        self.performance_dialog.show()
+        self.performance_dialog.raise_()
+
+    def searchLibraries(self):
+        if self.search_dialog is None:
+            self.search_dialog = librarySearchDialog(self)
+        self.search_dialog.show()
+        self.search_dialog.raise_()
+        self.search_dialog.reindex()
+
+    # Shows a library's catalog in the gallery, and follows its changes on disk
+    @instrumented()
+    def openCatalog(self, path):
+        if self.catalog is not None and self.onCatalogChanged in self.catalog.listeners:
+            self.catalog.listeners.remove(self.onCatalogChanged)
+
+        self.catalog = getCatalog(path)
+        self.catalog.revalidate()
+        self.catalog.listeners.append(self.onCatalogChanged)
+        self.showAllPrimitives()
+
+    # The library or thumbnails folder changed outside this window
+    @instrumented()
+    def onCatalogChanged(self, catalog, kind):
+        if self.library_load is not None:
+            return # the gallery shows the library being opened, it is resynced once that ends
+        if kind == "thumbnails":
+            self.gallery_model.setThumbnailIndex(catalog.thumbnails)
+        elif self.filter_label.isVisible():
+            # Keep the search results, minus deleted primitives
+            self.gallery_model.setPrimitives([name for name in self.gallery_model.names if name in catalog], catalog.thumbnails)
+        elif catalog.primitiveNames() != self.gallery_model.names:
+            self.gallery_model.setPrimitives(catalog.primitiveNames(), catalog.thumbnails)
 
     def exportPrimitiveFile(self):
         if current_prim_file_path == None:
-            show_confirmation_dialog("Please open a primitive library first")
+            show_error_dialog("Please open a primitive library first")
             return
 
-        def copyAndRename(src_path, dest_path, new_name):
-            shutil.copy(src_path, dest_path + "/" + new_name)
-
         path = cmds.fileDialog2(fileMode=0, caption="Save As", fileFilter="Primitive Library(*.prim)") 
-        file_name = os.path.basename(path[0])
-        dest_dir = os.path.dirname(path[0])
-        copyAndRename(current_prim_file_path, dest_dir, file_name)
+        if not path: return
 
-    # Create a widget object, add to dictionary
-    def addPrimitiveWidget(self, name):
-        widget = primitiveWidget(name)
-        self.primitive_widgets[name] = widget
+        # Streams the live entries into a fresh indexed library, loose thumbnails are embedded along the way
+        catalog = getCatalog(current_prim_file_path)
+        exportPrimFile(current_prim_file_path, path[0], {name: thumbnail[0] for name, thumbnail in catalog.loose_thumbnails.items()})
+        print(f"Exported primitive library to: {path[0]}")
+
+        missing = sum(1 for name in catalog.primitiveNames() if name not in catalog.thumbnails)
+        if missing:
+            print(f"Warning: {missing} primitives were exported without a thumbnail, \"Render missing thumbnails\" before exporting to include them")
+
+    # Exports a quantized copy of the current library, much smaller to share; it opens like any other library
+    def exportCompactPrimitiveFile(self):
+        from MeshManager import getCompactBits, setCompactBits, exportCompactLibrary
+        if current_prim_file_path == None:
+            show_error_dialog("Please open a primitive library first")
+            return
+
+        prompt = cmds.promptDialog(title="Export compact library",
+                                   message="Position precision (bits, 8 to 24):",
+                                   text=str(getCompactBits()),
+                                   button=["Ok", "Cancel"],
+                                   defaultButton="Ok",
+                                   cancelButton="Cancel")
+
+        if prompt != "Ok": return
+        value = cmds.promptDialog(query=True, text=True)
+        if not value.isdigit() or not 8 <= int(value) <= 24:
+            show_error_dialog("Please enter a whole number of bits between 8 and 24")
+            return
+        setCompactBits(int(value))
 
-    # Refresh the UI with any primitive changes in the dictionary
-    def refreshPrimitiveWidgets(self):
-        clear_layout(self.gallery_layout)
+        path = cmds.fileDialog2(fileMode=0, caption="Save As", fileFilter="Primitive Library(*.prim)")
+        if not path: return
 
-        for name, widget in self.primitive_widgets.items():
-            self.gallery_layout.addWidget(widget)
-        self.gallery_layout.addStretch()
+        try:
+            exportCompactLibrary(getCatalog(current_prim_file_path), path[0], int(value))
+        except ImportError as error:
+            show_error_dialog(f"Compact export needs NumPy: {error}")
+
+    # Reclaims the space left by deleted primitives
+    def compactPrimitiveFile(self):
+        from MeshManager import compactLibrary
+        if current_prim_file_path == None:
+            show_error_dialog("Please open a primitive library first")
+            return
+        if read_only_library(current_prim_file_path): return
+
+        if not compactLibrary(current_prim_file_path):
+            show_error_dialog("The library changed while compacting, please try again")
+
+    # Shows the primitives that look most like the scene selection, or like the primitive selected in the gallery
+    def findSimilar(self, from_gallery=False):
+        from MeshManager import findSimilarPrimitives
+        if self.catalog is None:
+            show_error_dialog("Open a primitive library (.prim) file first")
+            return
+
+        mesh_name = None
+        if from_gallery:
+            selection = self.gallery_view.selectionModel().selectedIndexes()
+            if not selection:
+                show_error_dialog("Select a primitive in the gallery first")
+                return
+            mesh_name = selection[0].data()
+
+        # Libraries saved elsewhere get their shapes indexed on the first search
+        progress_dialog = QtWidgets.QProgressDialog("Indexing primitive shapes ...", "Cancel", 0, 0, self)
+        progress_dialog.setWindowTitle("Prim shape search")
+        progress_dialog.setWindowModality(QtCore.Qt.WindowModality.WindowModal)
+        progress_dialog.setMinimumDuration(500)
+
+        def progress(done, total):
+            progress_dialog.setMaximum(total)
+            progress_dialog.setValue(done)
+            QtWidgets.QApplication.processEvents()
+            return not progress_dialog.wasCanceled()
+
+        try:
+            results = findSimilarPrimitives(mesh_name, SIMILAR_RESULTS, progress)
+        except ImportError as error:
+            show_error_dialog(str(error))
+            return
+        except (OSError, PrimFileError) as error:
+            show_error_dialog(f"Could not index the library's shapes:\n\n{error}")
+            return
+        finally:
+            progress_dialog.close()
+
+        if not results: return
+        self.gallery_model.setPrimitives([name for name, distance in results], self.catalog.thumbnails)
+        self.filter_label.setText(f"Similar to {mesh_name or 'selection'} ({len(results)} results)")
+        self.filter_label.show()
+
+    @instrumented()
+    def showAllPrimitives(self):
+        self.filter_label.hide()
+        if self.catalog is None:
+            self.gallery_model.setPrimitives([], {})
+            return
+
+        # Same rows (e.g. filled while loading): keep the scroll position, only follow the catalog's thumbnails
+        names = self.catalog.primitiveNames()
+        if names == self.gallery_model.names:
+            self.gallery_model.setThumbnailIndex(self.catalog.thumbnails)
+        else:
+            self.gallery_model.setPrimitives(names, self.catalog.thumbnails)
+
+    def createPrimitive(self, name):
+        from MeshManager import instanceMesh
+        if self.library_load is not None:
+            print("The library is still opening, please wait until it is loaded")
+            return
+        instanceMesh(name)
+
+    def deletePrimitive(self, name):
+        from MeshManager import deletePrimitiveData
+        if self.library_load is not None:
+            print("The library is still opening, please wait until it is loaded")
+            return
+        if read_only_library(current_prim_file_path): return
+        confirm = show_decision_dialog("Are you sure you wish to delete this primitive?\n\nThis action is irreversible!")
+        if confirm == False: return
+
+        # A failed delete keeps the row, the primitive is still in the library
+        if deletePrimitiveData(name):
+            self.gallery_model.removePrimitive(name)
+
+    # Re-lists the thumbnails folder, and reloads any thumbnail that changed; remote libraries also ask their server
+    @instrumented()
+    def refreshThumbnails(self):
+        if self.catalog is None: return
+        if isRemoteLibrary(self.catalog.library_path):
+            self.catalog.revalidate()
+            self.gallery_model.setPrimitives(self.catalog.primitiveNames(), self.catalog.thumbnails)
+        self.catalog.refreshThumbnails()
+        self.gallery_model.setThumbnailIndex(self.catalog.thumbnails)
+
+    # Renders the previews a library is missing (e.g. opened from a .prim file) while Maya is idle
+    def renderMissingThumbnails(self):
+        from ThumbnailRenderer import thumbnailRenderer
+        if self.catalog is None:
+            show_error_dialog("Open a primitive library (.prim) file first")
+            return
+        if read_only_library(self.catalog.library_path): return
+
+        renderer = thumbnailRenderer.get()
+        names = renderer.missingThumbnails(self.catalog)
+        if not names:
+            print("Every primitive already has a thumbnail")
+            return
+        renderer.enqueue(self.catalog.library_path, names)
+        print(f"Rendering {len(names)} thumbnails while Maya is idle ...")
+
+    # Packs the loose thumbnails of the current library into it
+    def embedThumbnails(self):
+        from MeshManager import embedLibraryThumbnails
+        if self.catalog is None:
+            show_error_dialog("Open a primitive library (.prim) file first")
+            return
+        if read_only_library(self.catalog.library_path): return
+        if isLegacyPrimFile(self.catalog.library_path):
+            show_error_dialog("Text libraries cannot hold thumbnails, reopen the library and upgrade it first")
+            return
+
+        embedLibraryThumbnails(self.catalog)
+        self.gallery_model.setThumbnailIndex(self.catalog.thumbnails)
+
+    # A thumbnail finished rendering, it shows as soon as its row is painted
+    def onThumbnailRendered(self, library_path, name, path):
+        if self.catalog is not None and self.catalog.library_path == library_path:
+            self.gallery_model.reloadThumbnail(name)
+
+    def setThumbnailResolution(self):
+        from MeshManager import getThumbnailSize, setThumbnailSize
+        prompt = cmds.promptDialog(title="Thumbnails",
+                                   message="Thumbnail size (pixels):",
+                                   text=str(getThumbnailSize()),
+                                   button=["Ok", "Cancel"],
+                                   defaultButton="Ok",
+                                   cancelButton="Cancel")
+
+        if prompt != "Ok": return
+        value = cmds.promptDialog(query=True, text=True)
+        if not value.isdigit() or not 16 <= int(value) <= 1024:
+            show_error_dialog("Please enter a whole number of pixels between 16 and 1024")
+            return
+
+        setThumbnailSize(int(value))
+        print(f"Thumbnail size set to {value} pixels, \"Render missing thumbnails\" re-renders the others")
+
+    # User sets the size limit (MB) of the extracted mesh cache
+    def setMeshCacheSize(self):
+        from MeshManager import getMeshCache, setMeshCacheLimit
+        current_mb = getMeshCache().limit // (1024 * 1024)
+        prompt = cmds.promptDialog(title="Mesh cache",
+                                   message="Mesh cache size limit (MB):",
+                                   text=str(current_mb),
+                                   button=["Ok", "Cancel"],
+                                   defaultButton="Ok",
+                                   cancelButton="Cancel")
+
+        if prompt != "Ok": return
+        value = cmds.promptDialog(query=True, text=True)
+        if not value.isdigit():
+            show_error_dialog("Please enter a whole number of megabytes")
+            return
+
+        setMeshCacheLimit(int(value) * 1024 * 1024)
+        print(f"Mesh cache limit set to {value} MB")
+
+    # User sets the size limit (MB) of the cache of thumbnails and meshes downloaded from library servers
+    def setRemoteCacheSize(self):
+        from MeshManager import getRemoteCacheLimit, setRemoteCacheLimit
+        current_mb = getRemoteCacheLimit() // (1024 * 1024)
+        prompt = cmds.promptDialog(title="Remote cache",
+                                   message="Remote library cache size limit (MB):",
+                                   text=str(current_mb),
+                                   button=["Ok", "Cancel"],
+                                   defaultButton="Ok",
+                                   cancelButton="Cancel")
+
+        if prompt != "Ok": return
+        value = cmds.promptDialog(query=True, text=True)
+        if not value.isdigit():
+            show_error_dialog("Please enter a whole number of megabytes")
+            return
+
+        setRemoteCacheLimit(int(value) * 1024 * 1024)
+        print(f"Remote library cache limit set to {value} MB")
+
+    # Rewrites the current library's payloads, new saves then use the same format
+    def convertLibrary(self, format):
+        from MeshManager import setPayloadFormat
+        from MeshData import convertPrimFile
+        if not current_prim_file_path:
+            show_error_dialog("Open a primitive library (.prim) file first")
+            return
+        if read_only_library(current_prim_file_path): return
+
+        convertPrimFile(current_prim_file_path, format)
+        self.catalog.revalidate()
+        setPayloadFormat(format)
+        print(f"Converted primitive library to \"{format}\" payloads: {current_prim_file_path}")
+
+    # Moves the current library's payloads to the shared blob store, storing duplicates once
+    def shareLibrary(self):
+        from MeshData import sharePrimFile
+        if not current_prim_file_path:
+            show_error_dialog("Open a primitive library (.prim) file first")
+            return
+        if read_only_library(current_prim_file_path): return
+
+        sharePrimFile(current_prim_file_path)
+        self.catalog.revalidate()
+        print(f"Moved primitive library to shared geometry: {current_prim_file_path}")
+        self.showSharedGeometryReport()
+
+    def showSharedGeometryReport(self):
+        from MeshManager import sharedGeometryReport
+        report = sharedGeometryReport()
+        total = report.pop("total")
+        megabytes = lambda size: f"{size / (1024 * 1024):.1f} MB"
+
+        lines = [f"{os.path.basename(path)}: {stats['entries']} primitives, {megabytes(stats['logical'])} "
+                 f"stored as {megabytes(stats['stored'])} (saved {megabytes(stats['saved'])})"
+                 for path, stats in sorted(report.items(), key=lambda item: -item[1]["saved"])]
+        for line in lines:
+            print(line)
+        if len(lines) > 20:
+            lines = lines[:20] + [f"... and {len(lines) - 20} more (see Script Editor)"]
+
+        summary = (f"{total['entries']} primitives in {len(report)} libraries: {megabytes(total['logical'])} "
+                   f"stored as {megabytes(total['stored'])}, saved {megabytes(total['saved'])}")
+        cmds.confirmDialog(title="Shared geometry", message=summary + "\n\n" + "\n".join(lines), button="Ok", dismissString="Ok")
+
+    """
+    Deletes shared geometry no library uses.
+    - Libraries that ever used the store are listed in it: while one of them cannot be read nothing is deleted,
+      unless the user says it is gone for good
+    """
+    def cleanSharedGeometry(self):
+        from MeshManager import cleanSharedGeometry
+        from PrimFile import BlobLibrariesUnavailable
+        prompt = ("Delete shared geometry that no library uses?\n\n"
+                  "Copies of libraries Prim never opened are not known, export libraries to copy them.")
+        if not show_decision_dialog(prompt): return
+        try:
+            freed = cleanSharedGeometry()
+        except BlobLibrariesUnavailable as error:
+            missing = "\n".join(error.paths[:20]) + (f"\n... and {len(error.paths) - 20} more" if len(error.paths) > 20 else "")
+            prompt = (f"These libraries use shared geometry but cannot be read, nothing was deleted:\n\n{missing}\n\n"
+                      "If they are offline or moved, reconnect them and try again. Were they deleted for good? "
+                      "Their shared geometry is then deleted too.")
+            if not show_decision_dialog(prompt): return
+            try:
+                freed = cleanSharedGeometry(forget=error.paths)
+            except BlobLibrariesUnavailable as error:
+                show_error_dialog(str(error))
+                return
+        cmds.confirmDialog(title="Shared geometry", message=f"Freed {freed / (1024 * 1024):.1f} MB", button="Ok", dismissString="Ok")
+
+    # Scatters the primitive selected in the gallery over the selected scene meshes
+    def scatterPrimitive(self):
+        from MeshManager import scatterOnSurface
+        selection = self.gallery_view.selectionModel().selectedIndexes()
+        targets = cmds.ls(sl=True, long=True) or []
+        if not selection or not targets:
+            show_error_dialog("Select a primitive in the gallery, and the meshes to scatter it on in the scene")
+            return
+
+        prompt = cmds.promptDialog(title="Scatter",
+                                   message="Number of copies:",
+                                   text="1000",
+                                   button=["Ok", "Cancel"],
+                                   defaultButton="Ok",
+                                   cancelButton="Cancel")
+        if prompt != "Ok": return
+        value = cmds.promptDialog(query=True, text=True)
+        if not value.isdigit() or int(value) == 0:
+            show_error_dialog("Please enter a whole number of copies")
+            return
+
+        try:
+            scatterOnSurface(selection[0].data(), targets, int(value))
+        except (ImportError, RuntimeError, ValueError) as error:
+            show_error_dialog(str(error))
+
+    # Swaps the selected primitives between their proxy and full resolution
+    def swapSelection(self, to_proxy):
+        from MeshManager import swapPrimitives
+        transforms = cmds.ls(sl=True, type="transform", long=True) or []
+        if not transforms:
+            show_error_dialog("Select placed primitives first")
+            return
+        swapPrimitives(transforms, to_proxy)
+
+    # Builds proxies in the background for primitives saved without them (opened libraries, text libraries since upgraded)
+    def generateProxies(self):
+        from MeshManager import generateLibraryProxies
+        if not current_prim_file_path:
+            show_error_dialog("Open a primitive library (.prim) file first")
+            return
+        if read_only_library(current_prim_file_path): return
+        count = generateLibraryProxies()
+        print(f"Building proxies for {count} primitives in the background ...")
+
+    # User sets the LOD levels and the mesh size worth decimating
+    def setProxyDetail(self):
+        from MeshManager import getProxySettings, setProxySettings
+        lod_cells, min_faces = getProxySettings()
+        prompt = cmds.promptDialog(title="Proxy settings",
+                                   message="LOD detail, grid cells per level, finest first\n(higher is closer to the full mesh but slower to build and place):",
+                                   text=",".join(str(cells) for cells in lod_cells),
+                                   button=["Ok", "Cancel"],
+                                   defaultButton="Ok",
+                                   cancelButton="Cancel")
+        if prompt != "Ok": return
+        cells_text = cmds.promptDialog(query=True, text=True)
+        cells = [value.strip() for value in cells_text.split(",") if value.strip()]
+        if not all(value.isdigit() and int(value) > 1 for value in cells):
+            show_error_dialog("Please enter whole numbers above 1 separated by commas, for example 64,16")
+            return
+
+        prompt = cmds.promptDialog(title="Proxy settings",
+                                   message="Only build LODs for primitives with at least this many faces\n(smaller ones only get a box proxy):",
+                                   text=str(min_faces),
+                                   button=["Ok", "Cancel"],
+                                   defaultButton="Ok",
+                                   cancelButton="Cancel")
+        if prompt != "Ok": return
+        value = cmds.promptDialog(query=True, text=True)
+        if not value.isdigit():
+            show_error_dialog("Please enter a whole number of faces")
+            return
+
+        setProxySettings([int(level) for level in cells], int(value))
+        print(f"Proxy LOD cells set to {cells_text}, for primitives with {value} faces or more")
 
     def redirectHelp(self):
+        import subprocess
         url = "https://github.com/Rafapp/Prim"
         if sys.platform=='win32':
             os.startfile(url)
@@ -408,11 +1280,16 @@ class mainWindow(MayaQWidgetDockableMixin, QtWidgets.QMainWindow):
                 print('Please open the link on your browser: ' + url)
 
     def savePrimitive(self):
+        from MeshManager import savePrimitiveData, renderMeshPreview
         if not current_prim_file_path:
             show_error_dialog("Open a primitive library (.prim) file first")
             return
+        if self.library_load is not None:
+            show_error_dialog("A library is still opening, please wait until it is loaded")
+            return
+        if read_only_library(current_prim_file_path): return
 
-        # Ensure a single mesh is selected
+        # At least one mesh must be selected, several are offered as a batch save
         selected = cmds.ls(sl=True,long=True) or []
         selectCount = len(selected)
 
@@ -420,12 +1297,15 @@ class mainWindow(MayaQWidgetDockableMixin, QtWidgets.QMainWindow):
             show_error_dialog("Error: Please select at least one mesh")
             return
         elif selectCount > 1:
-            show_error_dialog("Error: Please select only one mesh")
+            prompt = (f"Save the {selectCount} selected meshes as separate primitives?\n\n"
+                      "They are named after their transforms, or after the name field used as a pattern ({name}, {index})")
+            if show_decision_dialog(prompt):
+                self.savePrimitiveBatch(selected)
             return
 
         # Save the mesh and its data
         name = self.primitive_name.text()
-        savePrimitiveData(name)
+        if not savePrimitiveData(name): return
         renderMeshPreview(name)
-        self.addPrimitiveWidget(name)
-        self.refreshPrimitiveWidgets()
+        self.gallery_model.reloadThumbnail(name)
+        self.gallery_model.addPrimitive(name)
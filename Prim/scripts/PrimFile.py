@@ -0,0 +1,848 @@
+import struct
+import hashlib
+import json
+import mmap
+import threading
+import time
+import zlib
+import os
+
+from Instrumentation import countBytes
+
+# -----------------------------------------------------------------------
+# .prim library format: Versioned container with an index for random access.
+#
+# Version 2 layout:
+#   header   "PRIM", version, flags, offset of the current index record
+#   records  [record header][name][payload], one per saved mesh
+#            payloads are OBJ text ("obj"), packed arrays ("geometry") or
+#            quantized arrays ("compact"), see MeshData
+#   index    record mapping mesh name -> payload offset, length and checksum
+#   journal  tombstone records for primitives deleted since the index was written
+#
+# A primitive can carry its thumbnail: a PNG record written after its
+# payload, referenced from its index entry ("thumbnail": offset, length,
+# checksum). Previews travel with the library and are read one at a time,
+# only for the primitives shown.
+#
+# Libraries on a Prim library server (see LibraryServer) are opened by URL
+# instead of a path: the read functions below fetch what they need through
+# RemoteLibrary, entry by entry, and remote libraries cannot be written.
+#
+# A record can also reference a payload in the shared blob store
+# (primitives/blobs), where payloads are stored once by the SHA-256 of
+# their bytes whichever library or name saved them. Readers resolve
+# references transparently; exportPrimFile() inlines them again. The store
+# lists every library seen referencing it (libraries.txt), and blobs are
+# only collected when all of those can be read (see collectBlobs).
+#
+# Any primitive can be read with one seek once the index is loaded. Deletes
+# only append a tombstone; the space they leave is reclaimed by compactPrimFile()
+# which writes a new file and swaps it in. Version 1
+# files (plain text name/beginMesh/<obj data>/endMesh blocks) are still read
+# through a compatibility scanner, and upgradePrimFile() rewrites them.
+# -----------------------------------------------------------------------
+
+PRIM_MAGIC = b"PRIM"
+PRIM_VERSION = 2
+
+# magic, version, flags, offset of the index record
+HEADER = struct.Struct("<4sHHQ")
+
+# marker, kind, name length, payload length, payload crc32
+RECORD = struct.Struct("<2sBHQI")
+RECORD_MARKER = b"PR"
+
+RECORD_MESH = 1
+RECORD_INDEX = 2
+RECORD_GEOMETRY = 3
+RECORD_TOMBSTONE = 4
+RECORD_REFERENCE = 5
+RECORD_THUMBNAIL = 6
+RECORD_COMPACT = 7
+
+# Payload format -> record kind
+PAYLOAD_RECORDS = {"obj": RECORD_MESH, "geometry": RECORD_GEOMETRY, "compact": RECORD_COMPACT}
+RECORD_FORMATS = {kind: format for format, kind in PAYLOAD_RECORDS.items()}
+
+# Content-addressed payloads shared between libraries
+BLOBS_PATH = os.path.dirname(os.path.realpath(__file__)) + "/../primitives/blobs"
+
+# Libraries that reference the blob store, one path per line, kept in the store
+BLOB_LIBRARIES = "libraries.txt"
+
+# Blob store root -> libraries listed in it, as read or registered by this process
+blob_libraries = {}
+blob_libraries_lock = threading.Lock()
+
+class PrimFileError(Exception):
+    pass
+
+# Shared geometry cannot be collected: libraries that may reference it cannot be read
+class BlobLibrariesUnavailable(PrimFileError):
+    def __init__(self, paths):
+        super().__init__("Libraries using shared geometry cannot be read: " + ", ".join(paths))
+        self.paths = paths
+
+# Libraries served by a Prim library server are opened by their http(s) URL
+def isRemoteLibrary(path):
+    return isinstance(path, str) and path.startswith(("http://", "https://"))
+
+# What a library is known by (catalogs, caches): the real path of a file, the URL of a remote library
+def libraryKey(path):
+    return path if isRemoteLibrary(path) else os.path.realpath(path)
+
+# What a primitive's content is known by (mesh cache, descriptors, database): its checksum, or its location in text libraries
+def entryKey(entry):
+    return str(entry["checksum"]) if entry.get("checksum") is not None else f"{entry['offset']}x{entry['length']}"
+
+# Serializes writers of the same library (saves, deletes and background compaction)
+library_locks = {}
+library_locks_guard = threading.Lock()
+
+def libraryLock(path):
+    key = os.path.realpath(path)
+    with library_locks_guard:
+        if key not in library_locks:
+            library_locks[key] = threading.RLock()
+        return library_locks[key]
+
+# True for version 1 (text) libraries, including empty files. A server indexes text libraries itself, remote ones never are.
+def isLegacyPrimFile(path):
+    if isRemoteLibrary(path):
+        return False
+    with open(path, "rb") as file:
+        return file.read(len(PRIM_MAGIC)) != PRIM_MAGIC
+
+# Creates an empty version 2 library, overwriting anything at path
+def createPrimFile(path):
+    _checkWritable(path)
+    with open(path, "wb") as file:
+        file.write(HEADER.pack(PRIM_MAGIC, PRIM_VERSION, 0, HEADER.size))
+        _writeIndex(file, HEADER.size, {})
+
+"""
+Returns the library index: {mesh name: entry}, in save order.
+- Each entry holds the payload "offset", "length", "checksum" and "format", and its "thumbnail" if it has one
+- Legacy files are scanned, their entries have no checksum
+"""
+def readIndex(path):
+    if isRemoteLibrary(path):
+        from RemoteLibrary import getRemoteLibrary
+        return getRemoteLibrary(path).index()
+    with open(path, "rb") as file:
+        if file.read(len(PRIM_MAGIC)) != PRIM_MAGIC:
+            return _scanLegacyIndex(file)
+        entries, end, dead = _loadIndex(file)
+    _registerReferences(path, entries)
+    return entries
+
+"""
+Streams the library index as (name, entry, bytes read so far), to report progress while opening big libraries.
+- Indexed libraries are read in one go, text libraries are scanned block by block
+- A text library can list a name twice, the later block wins (as in readIndex)
+"""
+def iterIndex(path):
+    if isRemoteLibrary(path):
+        from RemoteLibrary import getRemoteLibrary
+        library = getRemoteLibrary(path)
+        for name, entry in library.index().items():
+            yield name, entry, library.size
+        return
+    with open(path, "rb") as file:
+        if file.read(len(PRIM_MAGIC)) != PRIM_MAGIC:
+            file.seek(0)
+            for name, start, length, lines in _iterLegacyBlocks(file):
+                yield name, {"offset": start, "length": length, "checksum": None, "format": "obj"}, start + length
+            return
+        entries, end, dead = _loadIndex(file)
+    _registerReferences(path, entries)
+
+    size = os.path.getsize(path)
+    for name, entry in entries.items():
+        yield name, entry, size
+
+# File size, live entry count and bytes held by deleted or replaced primitives
+def libraryStats(path):
+    with open(path, "rb") as file:
+        if file.read(len(PRIM_MAGIC)) != PRIM_MAGIC:
+            return {"size": os.path.getsize(path), "entries": len(_scanLegacyIndex(file)), "dead": 0}
+        entries, end, dead = _loadIndex(file)
+        return {"size": os.path.getsize(path), "entries": len(entries), "dead": dead}
+
+# Reads a single primitive payload (bytes) with one seek
+def readPrimitive(path, name, entries=None):
+    if entries is None:
+        entries = readIndex(path)
+    if name not in entries:
+        raise PrimFileError(f"No primitive named \"{name}\" in {path}")
+
+    entry = entries[name]
+    if isRemoteLibrary(path):
+        from RemoteLibrary import getRemoteLibrary
+        payload = getRemoteLibrary(path).payload(name, entry)
+    elif "blob" in entry:
+        payload = readBlob(entry["blob"])
+    else:
+        with open(path, "rb") as file:
+            file.seek(entry["offset"])
+            payload = file.read(entry["length"])
+        countBytes(read=len(payload))
+
+    _verifyPayload(name, entry, payload)
+    return payload
+
+# Appends a primitive to the library, replacing any entry with the same name
+def appendPrimitive(path, name, payload, format="obj", shared=False):
+    appendPrimitives(path, [(name, payload, format)], shared)
+
+"""
+Appends (name, payload, format) primitives in one buffered write with a single index update.
+- shared: payloads go to the blob store, the library only gets references (identical payloads are stored once)
+"""
+def appendPrimitives(path, primitives, shared=False):
+    _checkWritable(path)
+    primitives = list(primitives)
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        createPrimFile(path)
+    elif isLegacyPrimFile(path):
+        if shared or any(format != "obj" for name, payload, format in primitives):
+            raise PrimFileError(f"Text libraries can only hold OBJ payloads, upgrade {path} first")
+        blocks = b"".join(_legacyBlock(name, payload) for name, payload, format in primitives)
+        with libraryLock(path), open(path, "ab") as file:
+            file.write(blocks)
+        countBytes(written=len(blocks))
+        return
+
+    if shared:
+        registerBlobLibrary(path)
+
+    with libraryLock(path), open(path, "r+b") as file:
+        entries, end, dead = _loadIndex(file)
+        records = []
+        offset = end
+        for name, payload, format in primitives:
+            entry = {"length": len(payload), "checksum": zlib.crc32(payload), "format": format}
+            if shared:
+                entry["blob"] = writeBlob(payload)
+                record = _packRecord(RECORD_REFERENCE, name, _referencePayload(entry))
+            else:
+                record = _packRecord(PAYLOAD_RECORDS[format], name, payload)
+            if name in entries:
+                dead += _recordSize(name, entries.pop(name))
+            entries[name] = dict(entry, offset=offset + RECORD.size + len(name.encode("utf-8")))
+            records.append(record)
+            offset += len(record)
+        _writeIndex(file, end, entries, dead, b"".join(records))
+
+"""
+Stores PNG thumbnails in the library, one record each and a single index update. Returns the names stored.
+- thumbnails: {name: png bytes}, names with no primitive in the library are skipped
+- A primitive's previous thumbnail becomes dead space, as does the thumbnail of a primitive saved again
+"""
+def writeThumbnails(path, thumbnails):
+    _checkWritable(path)
+    if os.path.getsize(path) == 0 or isLegacyPrimFile(path):
+        raise PrimFileError(f"Text libraries cannot hold thumbnails, upgrade {path} first")
+
+    with libraryLock(path), open(path, "r+b") as file:
+        entries, end, dead = _loadIndex(file)
+        records = []
+        offset = end
+        stored = []
+        for name, png in thumbnails.items():
+            if name not in entries:
+                continue
+            entry = entries[name]
+            if "thumbnail" in entry:
+                dead += RECORD.size + len(name.encode("utf-8")) + entry["thumbnail"]["length"]
+            record = _packRecord(RECORD_THUMBNAIL, name, png)
+            entry["thumbnail"] = {"offset": offset + RECORD.size + len(name.encode("utf-8")), "length": len(png), "checksum": zlib.crc32(png)}
+            records.append(record)
+            offset += len(record)
+            stored.append(name)
+        if records:
+            _writeIndex(file, end, entries, dead, b"".join(records))
+        return stored
+
+# PNG bytes of a primitive's thumbnail, None if it has none
+def readThumbnail(path, name, entries=None):
+    if entries is None:
+        entries = readIndex(path)
+    thumbnail = entries.get(name, {}).get("thumbnail")
+    if thumbnail is None:
+        return None
+    return readThumbnailAt(path, thumbnail["offset"], thumbnail["length"], thumbnail["checksum"])
+
+# Reads a thumbnail from its index entry fields with one seek (one range request when remote), without loading the index
+def readThumbnailAt(path, offset, length, checksum):
+    if isRemoteLibrary(path):
+        from RemoteLibrary import getRemoteLibrary
+        png = getRemoteLibrary(path).thumbnailAt(offset, length, checksum)
+    else:
+        with open(path, "rb") as file:
+            file.seek(offset)
+            png = file.read(length)
+        countBytes(read=len(png))
+    if len(png) != length or zlib.crc32(png) != checksum:
+        raise PrimFileError(f"Corrupt thumbnail at offset {offset} in {path}")
+    return png
+
+"""
+Streams the primitives of a library as (name, payload) pairs, one at a time.
+- Memory use is bounded by the largest single mesh, not by the library size
+- Works on both indexed and legacy text libraries
+"""
+def iterPrimitives(path):
+    for name, entry, payload in iterEntries(path):
+        yield name, payload
+
+"""
+Removes a primitive by exact name. Returns False if there is no such primitive.
+- Indexed libraries only get a tombstone appended, the payload stays until compaction
+- Text libraries are rewritten without the primitive
+"""
+def removePrimitive(path, name):
+    _checkWritable(path)
+    with libraryLock(path):
+        if name not in readIndex(path):
+            return False
+
+        if isLegacyPrimFile(path):
+            records = (record for record in iterEntries(path) if record[0] != name)
+            writePrimFile(path, records, legacy=True)
+            return True
+
+        with open(path, "ab") as file:
+            file.write(_packRecord(RECORD_TOMBSTONE, name, b""))
+        countBytes(written=RECORD.size + len(name.encode("utf-8")))
+        return True
+
+"""
+Rewrites a library without deleted or replaced payloads. Returns False if it was left untouched.
+- The copy is written without holding the library lock, so saves are not blocked
+- If the library changed while copying, the copy is discarded (try again later)
+"""
+def compactPrimFile(path):
+    stamp = _fileStamp(path)
+    temp_path = path + ".compact"
+    writePrimFile(temp_path, iterEntries(path, resolve=False))
+
+    with libraryLock(path):
+        if _fileStamp(path) != stamp:
+            os.remove(temp_path)
+            return False
+        os.replace(temp_path, path)
+    return True
+
+class _UpgradeCancelled(Exception):
+    pass
+
+"""
+Rewrites a version 1 text library in the indexed format. Returns False if already upgraded, or cancelled.
+- progress: optional callback(bytes read, file size), returning False cancels and leaves the library untouched
+"""
+def upgradePrimFile(path, progress=None):
+    if os.path.getsize(path) > 0 and not isLegacyPrimFile(path):
+        return False
+
+    size = os.path.getsize(path)
+    def records():
+        for name, entry, payload in iterEntries(path):
+            if progress is not None and progress(entry["offset"] + entry["length"], size) is False:
+                raise _UpgradeCancelled()
+            yield name, entry, payload
+
+    try:
+        with libraryLock(path):
+            writePrimFile(path, records())
+    except _UpgradeCancelled:
+        return False
+    return True
+
+"""
+Writes a self-contained copy of a library to dest_path in the indexed format, shared payloads are inlined.
+- thumbnails: optional {name: png path}, embedded for primitives that do not carry a thumbnail yet
+- encode: optional function(name, entry, payload) -> (entry, payload) re-encoding each primitive on the way
+"""
+def exportPrimFile(path, dest_path, thumbnails=None, encode=None):
+    thumbnails = thumbnails or {}
+    def records():
+        for name, entry, payload in iterEntries(path):
+            if "thumbnail" not in entry and name in thumbnails:
+                try:
+                    with open(thumbnails[name], "rb") as file:
+                        entry = dict(entry, thumbnail={"png": file.read()})
+                except OSError:
+                    pass
+            if encode is not None:
+                entry, payload = encode(name, entry, payload)
+            yield name, entry, payload
+
+    writePrimFile(dest_path, records(), inline=True)
+
+"""
+Memory-maps a library for zero-copy reads, payloads are handed out as memoryviews.
+- Use as a context manager, and release any views before it closes
+- Checksums are only verified when asked for, to keep reads free of copies
+"""
+class primFileMap():
+    def __init__(self, path):
+        self.path = path
+        self.entries = readIndex(path)
+        self.file = open(path, "rb")
+        self.map = None
+        self.view = memoryview(b"")
+        if os.path.getsize(path) > 0:
+            self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+            self.view = memoryview(self.map)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def payload(self, name, verify=False):
+        if name not in self.entries:
+            raise PrimFileError(f"No primitive named \"{name}\" in {self.path}")
+
+        entry = self.entries[name]
+        if "blob" in entry:
+            payload = memoryview(readBlob(entry["blob"]))
+        else:
+            payload = self.view[entry["offset"]:entry["offset"] + entry["length"]]
+            countBytes(read=entry["length"])
+        if verify:
+            _verifyPayload(name, entry, payload)
+        return payload
+
+    def close(self):
+        self.view.release()
+        if self.map is not None:
+            try:
+                self.map.close()
+            except BufferError:
+                # Views are still in use, the map is freed along with them
+                pass
+        self.file.close()
+
+def _fileStamp(path):
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime_ns
+
+# Remote libraries are read through their server, nothing writes to them
+def _checkWritable(path):
+    if isRemoteLibrary(path):
+        raise PrimFileError(f"{path} is served by a library server, it is read-only")
+
+# Bytes a primitive's records (payload and thumbnail) take up in the file
+def _recordSize(name, entry):
+    length = len(_referencePayload(entry)) if "blob" in entry else entry["length"]
+    if "thumbnail" in entry:
+        length += RECORD.size + len(name.encode("utf-8")) + entry["thumbnail"]["length"]
+    return RECORD.size + len(name.encode("utf-8")) + length
+
+# Payload of a reference record: the blob it points at, and what the blob holds
+def _referencePayload(entry):
+    reference = {key: entry[key] for key in ("blob", "length", "checksum", "format")}
+    return json.dumps(reference, separators=(",", ":"), sort_keys=True).encode("utf-8")
+
+def _packRecord(kind, name, payload):
+    name_bytes = name.encode("utf-8")
+    header = RECORD.pack(RECORD_MARKER, kind, len(name_bytes), len(payload), zlib.crc32(payload))
+    return header + name_bytes + payload
+
+# Reads the record at offset, returns (kind, name, payload, end offset)
+def _readRecord(file, offset):
+    file.seek(offset)
+    header = file.read(RECORD.size)
+    if len(header) < RECORD.size:
+        raise PrimFileError(f"Truncated record at offset {offset}")
+
+    marker, kind, name_length, payload_length, checksum = RECORD.unpack(header)
+    if marker != RECORD_MARKER:
+        raise PrimFileError(f"Invalid record at offset {offset}")
+
+    name = file.read(name_length).decode("utf-8")
+    payload = file.read(payload_length)
+    countBytes(read=RECORD.size + name_length + len(payload))
+    if len(payload) < payload_length or zlib.crc32(payload) != checksum:
+        raise PrimFileError(f"Corrupt record at offset {offset}")
+
+    return kind, name, payload, offset + RECORD.size + name_length + payload_length
+
+"""
+Loads the index of an open version 2 file, and applies the tombstones after it.
+- Returns (entries, offset where the next record should be written, dead bytes)
+- Falls back to rebuilding the index from the records if it is missing or corrupt
+"""
+def _loadIndex(file):
+    file.seek(0)
+    magic, version, flags, index_offset = HEADER.unpack(file.read(HEADER.size))
+    if version > PRIM_VERSION:
+        raise PrimFileError(f"Unsupported .prim version {version}, please update Prim")
+
+    try:
+        kind, name, payload, end = _readRecord(file, index_offset)
+        if kind != RECORD_INDEX:
+            raise PrimFileError(f"Expected index record at offset {index_offset}")
+    except PrimFileError as error:
+        print(f"Warning: {error}, rebuilding .prim index from records ...")
+        return _recoverIndex(file)
+
+    index = json.loads(payload.decode("utf-8"))
+    entries = index["entries"]
+    dead = index.get("dead", 0)
+    while True:
+        try:
+            kind, name, payload, end = _readRecord(file, end)
+        except PrimFileError:
+            break
+        if kind == RECORD_TOMBSTONE and name in entries:
+            dead += _recordSize(name, entries.pop(name))
+
+    # The next save overwrites the journal, its tombstones are folded into the new index
+    return entries, index_offset, dead
+
+"""
+Rebuilds the index by walking every record after the header.
+- Tombstones already folded into an index are gone, so those primitives reappear until the next compaction
+"""
+def _recoverIndex(file):
+    entries = {}
+    dead = 0
+    offset = HEADER.size
+    while True:
+        try:
+            kind, name, payload, end = _readRecord(file, offset)
+        except PrimFileError:
+            break
+        if kind == RECORD_TOMBSTONE and name in entries:
+            dead += _recordSize(name, entries.pop(name))
+        elif kind in RECORD_FORMATS or kind == RECORD_REFERENCE:
+            if name in entries:
+                dead += _recordSize(name, entries.pop(name))
+            if kind == RECORD_REFERENCE:
+                entries[name] = dict(json.loads(payload.decode("utf-8")), offset=end - len(payload))
+            else:
+                entries[name] = {
+                    "offset": end - len(payload),
+                    "length": len(payload),
+                    "checksum": zlib.crc32(payload),
+                    "format": RECORD_FORMATS[kind]
+                }
+        elif kind == RECORD_THUMBNAIL:
+            if name not in entries:
+                dead += end - offset
+            else:
+                if "thumbnail" in entries[name]:
+                    dead += RECORD.size + len(name.encode("utf-8")) + entries[name]["thumbnail"]["length"]
+                entries[name]["thumbnail"] = {"offset": end - len(payload), "length": len(payload), "checksum": zlib.crc32(payload)}
+        offset = end
+    return entries, offset, dead
+
+# Writes the index record (after any pending records) at offset, then points the header at it
+def _writeIndex(file, offset, entries, dead=0, records=b""):
+    index = json.dumps({"entries": entries, "dead": dead}, separators=(",", ":")).encode("utf-8")
+    file.seek(offset)
+    file.write(records + _packRecord(RECORD_INDEX, "", index))
+    countBytes(written=len(records) + RECORD.size + len(index))
+    file.truncate()
+    file.flush()
+
+    file.seek(0)
+    file.write(HEADER.pack(PRIM_MAGIC, PRIM_VERSION, 0, offset + len(records)))
+    file.flush()
+
+# Libraries opened with blob references are listed in the store, copies included
+def _registerReferences(path, entries):
+    if any("blob" in entry for entry in entries.values()):
+        registerBlobLibrary(path)
+
+def _verifyPayload(name, entry, payload):
+    if len(payload) != entry["length"]:
+        raise PrimFileError(f"Truncated payload for primitive \"{name}\"")
+    if entry.get("checksum") is not None and zlib.crc32(payload) != entry["checksum"]:
+        raise PrimFileError(f"Checksum mismatch for primitive \"{name}\"")
+
+# Version 1 text block, as written by older Prim versions
+def _legacyBlock(name, payload):
+    if payload and not payload.endswith(b"\n"):
+        payload += b"\n"
+    return b"\n" + name.encode("utf-8") + b"\nbeginMesh\n" + payload + b"endMesh"
+
+# Indexes a version 1 text library
+def _scanLegacyIndex(file):
+    entries = {}
+    file.seek(0)
+    for name, start, length, lines in _iterLegacyBlocks(file):
+        entries.pop(name, None)
+        entries[name] = {"offset": start, "length": length, "checksum": None, "format": "obj"}
+    return entries
+
+"""
+Walks the blocks of a version 1 text library, yields (name, payload offset, payload length, payload lines).
+- Framing is strict: "beginMesh"/"endMesh" must be whole lines, and the name is the line right before "beginMesh"
+- Payload lines are only kept when collect is set
+"""
+def _iterLegacyBlocks(file, collect=False):
+    offset = 0
+    previous = b""
+    name = None
+    start = 0
+    lines = []
+
+    for number, line in enumerate(file, 1):
+        stripped = line.strip()
+        if stripped == b"beginMesh":
+            if name is not None:
+                raise PrimFileError(f"Line {number}: beginMesh inside primitive \"{name}\"")
+            if not previous:
+                raise PrimFileError(f"Line {number}: beginMesh without a primitive name")
+            name = previous.decode("utf-8")
+            start = offset + len(line)
+            lines = []
+        elif stripped == b"endMesh":
+            if name is None:
+                raise PrimFileError(f"Line {number}: endMesh outside of a primitive")
+            yield name, start, offset - start, lines
+            name = None
+            stripped = b""
+        elif name is not None and collect:
+            lines.append(line)
+
+        offset += len(line)
+        previous = stripped
+
+    countBytes(read=offset)
+    if name is not None:
+        raise PrimFileError(f"Primitive \"{name}\" is missing endMesh")
+
+"""
+Streams (name, index entry, payload) for every primitive, in file order.
+- Shared payloads are read from the blob store, or yielded as None when resolve is off
+- A primitive's thumbnail comes with its entry, as entry["thumbnail"]["png"]
+- Remote libraries are fetched entry by entry, through the local cache (see RemoteLibrary)
+"""
+def iterEntries(path, resolve=True):
+    if isRemoteLibrary(path):
+        entries = readIndex(path)
+        for name, entry in entries.items():
+            if "thumbnail" in entry:
+                thumbnail = entry["thumbnail"]
+                png = readThumbnailAt(path, thumbnail["offset"], thumbnail["length"], thumbnail["checksum"])
+                entry = dict(entry, thumbnail=dict(thumbnail, png=png))
+            yield name, entry, readPrimitive(path, name, entries)
+        return
+
+    with open(path, "rb") as file:
+        if file.read(len(PRIM_MAGIC)) != PRIM_MAGIC:
+            file.seek(0)
+            for name, start, length, lines in _iterLegacyBlocks(file, collect=True):
+                yield name, {"offset": start, "length": length, "checksum": None, "format": "obj"}, b"".join(lines)
+            return
+
+        entries, end, dead = _loadIndex(file)
+        for name, entry in sorted(entries.items(), key=lambda item: item[1]["offset"]):
+            if "blob" in entry:
+                payload = readBlob(entry["blob"]) if resolve else None
+            else:
+                file.seek(entry["offset"])
+                payload = file.read(entry["length"])
+                countBytes(read=len(payload))
+            if payload is not None:
+                _verifyPayload(name, entry, payload)
+            if "thumbnail" in entry:
+                thumbnail = entry["thumbnail"]
+                file.seek(thumbnail["offset"])
+                png = file.read(thumbnail["length"])
+                countBytes(read=len(png))
+                if zlib.crc32(png) != thumbnail["checksum"]:
+                    raise PrimFileError(f"Checksum mismatch for the thumbnail of primitive \"{name}\"")
+                entry = dict(entry, thumbnail=dict(thumbnail, png=png))
+            yield name, entry, payload
+
+"""
+Writes (name, entry, payload) records to a fresh library, and atomically swaps it in at path.
+- Entries pointing at a blob stay references (their payload may be None), unless inline is set; callers adding
+  references list the library in the blob store first (registerBlobLibrary)
+- Thumbnails are written after their primitive when the entry carries their bytes (entry["thumbnail"]["png"])
+"""
+def writePrimFile(path, records, legacy=False, inline=False):
+    _checkWritable(path)
+    temp_path = path + ".tmp"
+    try:
+        with open(temp_path, "wb") as target:
+            entries = {}
+            if not legacy:
+                target.write(HEADER.pack(PRIM_MAGIC, PRIM_VERSION, 0, HEADER.size))
+
+            for name, entry, payload in records:
+                if legacy:
+                    block = _legacyBlock(name, payload)
+                    target.write(block)
+                    countBytes(written=len(block))
+                    continue
+
+                thumbnail = entry.get("thumbnail", {}).get("png")
+                if "blob" in entry and not inline:
+                    entry = {key: entry[key] for key in ("blob", "length", "checksum", "format")}
+                    record = _packRecord(RECORD_REFERENCE, name, _referencePayload(entry))
+                else:
+                    entry = dict({key: value for key, value in entry.items() if key not in ("blob", "thumbnail")}, checksum=zlib.crc32(payload))
+                    record = _packRecord(PAYLOAD_RECORDS[entry["format"]], name, payload)
+                entries.pop(name, None)
+                entries[name] = dict(entry, offset=target.tell() + RECORD.size + len(name.encode("utf-8")))
+                target.write(record)
+                countBytes(written=len(record))
+
+                if thumbnail is not None:
+                    entries[name]["thumbnail"] = {"offset": target.tell() + RECORD.size + len(name.encode("utf-8")),
+                                                  "length": len(thumbnail), "checksum": zlib.crc32(thumbnail)}
+                    target.write(_packRecord(RECORD_THUMBNAIL, name, thumbnail))
+                    countBytes(written=RECORD.size + len(name.encode("utf-8")) + len(thumbnail))
+
+            if not legacy:
+                _writeIndex(target, target.tell(), entries)
+    except BaseException:
+        # Failed or cancelled half way, the library at path is untouched
+        os.remove(temp_path)
+        raise
+
+    os.replace(temp_path, path)
+
+# --- Shared blob store ---
+
+def blobPath(digest, root=BLOBS_PATH):
+    return os.path.join(root, digest[:2], digest)
+
+# Stores a payload under the SHA-256 of its bytes, once. Returns the digest.
+def writeBlob(payload, root=BLOBS_PATH):
+    digest = hashlib.sha256(payload).hexdigest()
+    path = blobPath(digest, root)
+    if os.path.exists(path):
+        return digest
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temp_path, "wb") as file:
+        file.write(payload)
+    countBytes(written=len(payload))
+    os.replace(temp_path, path)
+    return digest
+
+def readBlob(digest, root=BLOBS_PATH):
+    try:
+        with open(blobPath(digest, root), "rb") as file:
+            payload = file.read()
+        countBytes(read=len(payload))
+        return payload
+    except FileNotFoundError:
+        raise PrimFileError(f"Shared geometry {digest[:12]} is missing from {root}, the library needs its blob store")
+
+"""
+Storage report for libraries using the blob store, each blob counted once across all of them.
+- Per library: "entries", "logical" (bytes its primitives represent), "stored" (bytes it costs on its own:
+  inline payloads plus blobs no other library uses) and "saved"
+- "total" sums the same figures over every library
+"""
+def sharedStorageReport(paths, root=BLOBS_PATH):
+    references = {}
+    report = {}
+    for path in paths:
+        entries = readIndex(path) if os.path.getsize(path) > 0 else {}
+        blobs = {entry["blob"]: entry["length"] for entry in entries.values() if "blob" in entry}
+        references[path] = blobs
+        report[path] = {
+            "entries": len(entries),
+            "logical": sum(entry["length"] for entry in entries.values()),
+            "inline": sum(entry["length"] for entry in entries.values() if "blob" not in entry)
+        }
+
+    users = {}
+    for path, blobs in references.items():
+        for digest in blobs:
+            users[digest] = users.get(digest, 0) + 1
+
+    blob_bytes = {}
+    for path, blobs in references.items():
+        blob_bytes.update(blobs)
+        own = sum(length for digest, length in blobs.items() if users[digest] == 1)
+        stats = report[path]
+        stats["stored"] = stats.pop("inline") + own
+        stats["saved"] = stats["logical"] - stats["stored"]
+
+    logical = sum(stats["logical"] for stats in report.values())
+    stored = sum(stats["stored"] for stats in report.values()) + sum(length for digest, length in blob_bytes.items() if users[digest] > 1)
+    report["total"] = {"entries": sum(stats["entries"] for stats in report.values()), "logical": logical,
+                       "stored": stored, "saved": logical - stored}
+    return report
+
+# Libraries listed in the blob store as referencing it
+def blobLibraries(root=BLOBS_PATH):
+    try:
+        with open(os.path.join(root, BLOB_LIBRARIES), encoding="utf-8") as file:
+            return sorted({line.rstrip("\n") for line in file if line.strip()})
+    except FileNotFoundError:
+        return []
+
+# Lists a library in the blob store, before it references any blob; once per process
+def registerBlobLibrary(path, root=BLOBS_PATH):
+    path = os.path.realpath(path)
+    with blob_libraries_lock:
+        registered = blob_libraries.get(root)
+        if registered is None:
+            registered = blob_libraries[root] = set(blobLibraries(root))
+        if path in registered:
+            return
+        os.makedirs(root, exist_ok=True)
+        with open(os.path.join(root, BLOB_LIBRARIES), "a", encoding="utf-8") as file:
+            file.write(path + "\n")
+        registered.add(path)
+
+# Stops listing libraries in the blob store (e.g. deleted ones), the next collection may delete what only they used
+def forgetBlobLibraries(paths, root=BLOBS_PATH):
+    forgotten = {os.path.realpath(path) for path in paths}
+    with blob_libraries_lock:
+        kept = [path for path in blobLibraries(root) if path not in forgotten]
+        if not os.path.isdir(root):
+            return
+        temp_path = os.path.join(root, BLOB_LIBRARIES + ".tmp")
+        with open(temp_path, "w", encoding="utf-8") as file:
+            file.writelines(path + "\n" for path in kept)
+        os.replace(temp_path, os.path.join(root, BLOB_LIBRARIES))
+        blob_libraries[root] = set(kept)
+
+"""
+Deletes blobs that neither the libraries in paths nor those listed in the store reference. Returns the bytes freed.
+- Raises BlobLibrariesUnavailable, deleting nothing, when any of them cannot be read (moved, offline share):
+  what they reference is unknown
+- Blobs younger than min_age seconds are kept, a save may be about to reference them
+- Copies of a library Prim never opened are not listed, export libraries (which inlines blobs) to copy them
+"""
+def collectBlobs(paths, root=BLOBS_PATH, min_age=3600):
+    used = set()
+    unavailable = []
+    for path in sorted({os.path.realpath(path) for path in paths} | set(blobLibraries(root))):
+        try:
+            if os.path.getsize(path) > 0:
+                used.update(entry["blob"] for entry in readIndex(path).values() if "blob" in entry)
+        except (OSError, PrimFileError):
+            unavailable.append(path)
+    if unavailable:
+        raise BlobLibrariesUnavailable(unavailable)
+
+    freed = 0
+    if not os.path.isdir(root):
+        return freed
+    now = time.time()
+    for folder in os.scandir(root):
+        if not folder.is_dir():
+            continue
+        for item in os.scandir(folder.path):
+            stat = item.stat()
+            if item.name not in used and now - stat.st_mtime > min_age:
+                os.remove(item.path)
+                freed += stat.st_size
+    return freed
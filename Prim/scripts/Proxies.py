@@ -0,0 +1,130 @@
+from array import array
+
+# -----------------------------------------------------------------------
+# Lightweight stand-ins for heavy primitives.
+#
+# Variants are stored in the same library as the full mesh, as ordinary
+# entries named "<primitive>#<variant>":
+#   lod1, lod2 ...  vertex-clustered decimations, finest first (NumPy)
+#   proxy           the bounding box, 8 vertices and 6 faces
+# New names cannot contain "#", but older libraries may: a name is only a
+# variant with one of these suffixes and its primitive in the library.
+#
+# Any mechanism that handles entries (appends, tombstones, compaction,
+# shared blobs, export) handles variants; the catalog hides them from the
+# gallery and from name lookups.
+#
+# The naming helpers are all the catalog needs: MeshData (and NumPy) are
+# only imported once variants are built.
+# -----------------------------------------------------------------------
+
+VARIANT_SEPARATOR = "#"
+BOX_PROXY = "proxy"
+
+# Clustering grid cells along the longest side, per LOD level (finest first)
+DEFAULT_LOD_CELLS = (64, 16)
+
+# Meshes with fewer faces than this only get a box proxy
+DEFAULT_LOD_MIN_FACES = 5000
+
+def variantName(name, variant):
+    return name + VARIANT_SEPARATOR + variant
+
+# "lod1", "lod2" ... or "proxy"
+def isVariantSuffix(variant):
+    return variant == BOX_PROXY or (variant.startswith("lod") and variant[3:].isdigit())
+
+# Whether name is a variant of a primitive in names (any container of the library's names)
+def isVariantName(name, names):
+    base, variant = splitVariantName(name)
+    return variant is not None and base in names
+
+# "rock#lod1" -> ("rock", "lod1"), "rock" or "package#2" -> (name, None)
+def splitVariantName(name):
+    if VARIANT_SEPARATOR not in name:
+        return name, None
+    base, variant = name.rsplit(VARIANT_SEPARATOR, 1)
+    if not isVariantSuffix(variant):
+        return name, None
+    return base, variant
+
+# Axis aligned bounding box of a mesh as a closed box mesh
+def boxProxy(mesh):
+    from MeshData import meshData
+    positions = mesh.positions
+    if not len(positions):
+        return meshData(array("f"), array("i"), array("i"))
+
+    lower = [min(positions[axis::3]) for axis in range(3)]
+    upper = [max(positions[axis::3]) for axis in range(3)]
+    corners = array("f")
+    for x in (lower[0], upper[0]):
+        for y in (lower[1], upper[1]):
+            for z in (lower[2], upper[2]):
+                corners.extend((x, y, z))
+
+    faces = [(0, 1, 3, 2), (4, 6, 7, 5), (0, 4, 5, 1), (2, 3, 7, 6), (0, 2, 6, 4), (1, 5, 7, 3)]
+    return meshData(corners, array("i", [4] * len(faces)), array("i", [index for face in faces for index in face]))
+
+"""
+Decimates a mesh by vertex clustering (requires NumPy).
+- Vertices falling in the same cell of a cells^3 grid over the bounding box merge into their average
+- Faces are triangulated, collapsed triangles and duplicates are dropped, UVs and normals are not kept
+- Cost is linear in the mesh size, quality is set by cells
+"""
+def clusterMesh(mesh, cells):
+    from MeshData import meshData, triangulate, numpy
+    if numpy is None:
+        raise ImportError("NumPy is not available in this Python, LOD generation needs it")
+
+    positions = numpy.frombuffer(mesh.positions, dtype=numpy.float32).reshape(-1, 3)
+    if not len(positions):
+        return mesh
+
+    lower = positions.min(axis=0)
+    extent = float((positions.max(axis=0) - lower).max())
+    if extent <= 0:
+        return mesh
+
+    grid = numpy.minimum(((positions - lower) * (cells / extent)).astype(numpy.int64), cells - 1)
+    keys = (grid[:, 0] * cells + grid[:, 1]) * cells + grid[:, 2]
+    unique_keys, cluster = numpy.unique(keys, return_inverse=True)
+    cluster = cluster.reshape(-1)
+
+    sizes = numpy.bincount(cluster)
+    merged = numpy.stack([numpy.bincount(cluster, weights=positions[:, axis]) / sizes for axis in range(3)], axis=1)
+
+    triangles = cluster[triangulate(mesh.counts, mesh.connects)]
+    triangles = triangles[(triangles[:, 0] != triangles[:, 1]) & (triangles[:, 1] != triangles[:, 2]) & (triangles[:, 0] != triangles[:, 2])]
+    if len(triangles):
+        unique, first = numpy.unique(numpy.sort(triangles, axis=1), axis=0, return_index=True)
+        triangles = triangles[numpy.sort(first)]
+
+    # Drop clusters no triangle uses any more
+    used = numpy.zeros(len(merged), dtype=bool)
+    used[triangles.reshape(-1)] = True
+    remap = numpy.cumsum(used) - 1
+    triangles = remap[triangles]
+    merged = merged[used]
+
+    return meshData(
+        memoryview(numpy.ascontiguousarray(merged, dtype=numpy.float32).reshape(-1)),
+        memoryview(numpy.full(len(triangles), 3, dtype=numpy.int32)),
+        memoryview(numpy.ascontiguousarray(triangles, dtype=numpy.int32).reshape(-1)))
+
+"""
+Builds the variants of a mesh: [(variant, meshData)], finest LOD first, box proxy last.
+- LODs are only built for meshes with at least min_faces faces, and only kept if they actually reduce the mesh
+"""
+def buildVariants(mesh, lod_cells=DEFAULT_LOD_CELLS, min_faces=DEFAULT_LOD_MIN_FACES):
+    from MeshData import numpy
+    variants = []
+    if numpy is not None and mesh.faceCount() >= min_faces:
+        faces = sum(count - 2 for count in mesh.counts if count > 2)
+        for cells in sorted(lod_cells, reverse=True):
+            lod = clusterMesh(mesh, cells)
+            if lod.faceCount() and lod.faceCount() < faces:
+                variants.append((f"lod{len(variants) + 1}", lod))
+                faces = lod.faceCount()
+    variants.append((BOX_PROXY, boxProxy(mesh)))
+    return variants
@@ -0,0 +1,386 @@
+import collections
+import gzip
+import hashlib
+import http.client
+import json
+import os
+import threading
+import time
+import urllib.parse
+import zlib
+
+from PrimFile import PrimFileError
+from Instrumentation import instrumented, countBytes
+
+# -----------------------------------------------------------------------
+# Client side of the Prim library server (see LibraryServer): libraries
+# opened by URL instead of copied whole from a network share.
+# - The index is fetched once per open with If-None-Match: an unchanged
+#   library costs a 304, nothing is transferred again
+# - Payloads (by name) and embedded thumbnails (one byte range each) are
+#   only fetched when a primitive is placed or its row is shown
+# - Everything fetched goes to an on-disk cache keyed by the index entry
+#   checksums, bounded in size and evicted least recently used first
+#   (file mtimes record use, so it survives restarting Maya). Cached
+#   payloads and thumbnails never need a request, and a library whose
+#   server is unreachable still opens with whatever is cached
+# - Requests go through a pool of kept-alive connections per server, shared
+#   by the UI and the thumbnail threads
+# PrimFile routes reads of http(s) paths here, the rest of Prim handles a
+# remote library like any read-only library.
+# -----------------------------------------------------------------------
+
+REMOTE_CACHE_PATH = os.path.dirname(os.path.realpath(__file__)) + "/../primitives/remote"
+DEFAULT_REMOTE_CACHE_LIMIT = 1024 * 1024 * 1024
+
+# Idle connections kept per server, and seconds before a request gives up
+POOL_SIZE = 8
+TIMEOUT = 30.0
+
+# Seconds an index is trusted before a refresh asks the server again
+REFRESH_INTERVAL = 2.0
+
+# Open remote libraries: URL -> remoteLibrary
+remote_libraries = {}
+
+# Shared by every remote library, created on first use
+remote_cache = None
+remote_cache_limit = DEFAULT_REMOTE_CACHE_LIMIT
+connection_pool = None
+
+# The UI and the thumbnail threads both look libraries up
+remote_lock = threading.Lock()
+
+class RemoteLibraryError(PrimFileError):
+    pass
+
+"""
+Keeps HTTP/1.1 connections open between requests, per (scheme, host).
+- A connection is used by one thread at a time, request() checks one out and puts it back
+- size: idle connections kept per server, 0 opens a connection per request
+"""
+class connectionPool():
+    def __init__(self, size=POOL_SIZE, timeout=TIMEOUT):
+        self.size = size
+        self.timeout = timeout
+        self.idle = {} # (scheme, host) -> [connection]
+        self.lock = threading.Lock()
+        self.opened = 0
+        self.requests = 0
+
+    def checkout(self, key):
+        with self.lock:
+            self.requests += 1
+            if self.idle.get(key):
+                return self.idle[key].pop(), True
+            self.opened += 1
+        scheme, host = key
+        if scheme == "https":
+            return http.client.HTTPSConnection(host, timeout=self.timeout), False
+        return http.client.HTTPConnection(host, timeout=self.timeout), False
+
+    def checkin(self, key, connection):
+        with self.lock:
+            idle = self.idle.setdefault(key, [])
+            if len(idle) < self.size:
+                idle.append(connection)
+                return
+        connection.close()
+
+    """
+    Sends a request and reads the whole response. Returns (status, headers, body).
+    - A kept-alive connection the server closed in the meantime is dropped, and the request sent again
+    - Network errors are raised as they are (OSError, http.client.HTTPException)
+    """
+    def request(self, url, headers=None, method="GET"):
+        parts = urllib.parse.urlsplit(url)
+        key = (parts.scheme, parts.netloc)
+        target = urllib.parse.urlunsplit(("", "", parts.path or "/", parts.query, ""))
+        while True:
+            connection, reused = self.checkout(key)
+            try:
+                connection.request(method, target, headers=headers or {})
+                response = connection.getresponse()
+                body = response.read()
+            except (ConnectionError, http.client.BadStatusLine):
+                connection.close()
+                if reused:
+                    continue
+                raise
+            except BaseException:
+                connection.close()
+                raise
+
+            if response.will_close:
+                connection.close()
+            else:
+                self.checkin(key, connection)
+            countBytes(read=len(body))
+            return response.status, response.headers, body
+
+    def close(self):
+        with self.lock:
+            idle, self.idle = self.idle, {}
+        for connections in idle.values():
+            for connection in connections:
+                connection.close()
+
+"""
+On-disk cache of what remote libraries sent: their last index, payloads and thumbnails.
+- One folder per library URL, file names carry the entry checksum so changed primitives never hit stale files
+- Total size is bounded, least recently used files are evicted first (as in MeshCache)
+- Safe to use from several threads
+"""
+class remoteCache():
+    def __init__(self, root, limit=DEFAULT_REMOTE_CACHE_LIMIT):
+        self.root = root
+        self.limit = limit
+        self.entries = collections.OrderedDict() # cache path -> size, oldest first
+        self.size = 0
+        self.lock = threading.Lock()
+        self.scan()
+
+    # Load existing cache files, oldest use first
+    def scan(self):
+        self.entries.clear()
+        self.size = 0
+        if not os.path.isdir(self.root):
+            return
+
+        found = []
+        for folder in os.listdir(self.root):
+            folder_path = os.path.join(self.root, folder)
+            if not os.path.isdir(folder_path):
+                continue
+            for item in os.listdir(folder_path):
+                if not item.endswith(".tmp"):
+                    stat = os.stat(os.path.join(folder_path, item))
+                    found.append((stat.st_mtime, os.path.join(folder_path, item), stat.st_size))
+
+        for mtime, path, size in sorted(found):
+            self.entries[path] = size
+            self.size += size
+
+    def setLimit(self, limit):
+        self.limit = limit
+        with self.lock:
+            self.evict()
+
+    # Cache folder for a library: readable name plus a hash of its URL
+    def libraryFolder(self, url):
+        name = os.path.splitext(os.path.basename(urllib.parse.urlsplit(url).path))[0]
+        digest = hashlib.sha1(url.encode("utf-8")).hexdigest()[:10]
+        return os.path.join(self.root, f"{name}-{digest}")
+
+    # Cached bytes, marked as most recently used. None on a miss.
+    def read(self, path):
+        with self.lock:
+            if path not in self.entries:
+                return None
+            self.entries.move_to_end(path)
+        try:
+            with open(path, "rb") as file:
+                data = file.read()
+            os.utime(path)
+        except OSError:
+            with self.lock:
+                self.size -= self.entries.pop(path, 0)
+            return None
+        return data
+
+    def write(self, path, data):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(temp_path, "wb") as file:
+            file.write(data)
+        os.replace(temp_path, path)
+
+        with self.lock:
+            self.size -= self.entries.pop(path, 0)
+            self.entries[path] = len(data)
+            self.size += len(data)
+            self.evict(keep=path)
+
+    # Evict least recently used files until the cache fits its limit, with the lock held
+    def evict(self, keep=None):
+        for path in list(self.entries):
+            if self.size <= self.limit:
+                break
+            if path != keep:
+                self.size -= self.entries.pop(path, 0)
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+"""
+One library on a Prim library server, read entry by entry through the remote cache.
+- url: the library's URL on the server, e.g. http://server:8765/libraries/props.prim
+- Index entries are the library's own (offsets, lengths, checksums, thumbnails), shared payloads already resolved
+"""
+class remoteLibrary():
+    def __init__(self, url, cache=None, pool=None):
+        self.url = url.rstrip("/")
+        self.cache = cache or getRemoteCache()
+        self.pool = pool or getConnectionPool()
+        self.folder = self.cache.libraryFolder(self.url)
+        self.entries = None
+        self.size = 0
+        self.library_etag = None # of the library file, offsets in the index are only valid for it
+        self.index_etag = None # of the index response, which may be gzipped
+        self.checked = 0.0
+        self.lock = threading.Lock()
+
+    # (library size, library ETag) of the index in use, the stamp catalogs compare (see Catalog.libraryStamp)
+    def stamp(self, refresh=False):
+        self.index(refresh)
+        return self.size, self.library_etag
+
+    """
+    Returns the library index: {name: entry}, as PrimFile.readIndex.
+    - Fetched on first use, then only on refresh and at most once per REFRESH_INTERVAL; unchanged, it costs a 304
+    - A payload or thumbnail that no longer matches the index also makes the next call ask again
+    - Starts from the index cached by an earlier session, which is also used as is when the server cannot be reached
+    """
+    @instrumented()
+    def index(self, refresh=False):
+        with self.lock:
+            if self.entries is not None and self.checked and (not refresh or time.monotonic() - self.checked < REFRESH_INTERVAL):
+                return self.entries
+            if self.entries is None:
+                self.loadCachedIndex()
+
+            headers = {"Accept-Encoding": "gzip"}
+            if self.index_etag is not None:
+                headers["If-None-Match"] = self.index_etag
+            try:
+                status, response_headers, body = self.pool.request(self.url + "/index", headers)
+            except (OSError, http.client.HTTPException) as error:
+                if self.entries is None:
+                    raise RemoteLibraryError(f"Could not reach {self.url}: {error}")
+                print(f"Warning: Could not reach {self.url} ({error}), showing the cached library")
+                self.checked = time.monotonic()
+                return self.entries
+
+            self.checked = time.monotonic()
+            if status == 304 and self.entries is not None:
+                return self.entries
+            self.checkStatus(status, body, "index")
+
+            if response_headers.get("Content-Encoding") == "gzip":
+                body = gzip.decompress(body)
+            index = json.loads(body)
+            self.entries, self.size, self.library_etag = index["entries"], index["size"], index["etag"]
+            self.index_etag = response_headers.get("ETag")
+            self.cache.write(self.indexPath(), json.dumps(dict(index, index_etag=self.index_etag)).encode("utf-8"))
+            return self.entries
+
+    def loadCachedIndex(self):
+        data = self.cache.read(self.indexPath())
+        if data is None:
+            return
+        try:
+            index = json.loads(data)
+            self.entries, self.size, self.library_etag, self.index_etag = index["entries"], index["size"], index["etag"], index["index_etag"]
+        except (ValueError, KeyError):
+            pass
+
+    # Payload bytes of a primitive from its index entry, from the cache or the server
+    @instrumented()
+    def payload(self, name, entry):
+        path = os.path.join(self.folder, f"{name}.{self.entryStamp(entry)}.payload")
+        payload = self.cache.read(path)
+        if payload is not None:
+            return payload
+
+        status, headers, payload = self.pool.request(self.url + "/payloads/" + urllib.parse.quote(name, safe=""), {"Accept-Encoding": "gzip"})
+        self.checkStatus(status, payload, f"primitive \"{name}\"")
+        if headers.get("Content-Encoding") == "gzip":
+            payload = gzip.decompress(payload)
+        if len(payload) != entry["length"] or (entry.get("checksum") is not None and zlib.crc32(payload) != entry["checksum"]):
+            # Saved again on the server since the index was read, the catalog re-reads the index
+            self.checked = 0.0
+            raise RemoteLibraryError(f"Primitive \"{name}\" changed on {self.url}")
+        self.cache.write(path, payload)
+        return payload
+
+    """
+    PNG bytes of an embedded thumbnail, from the cache or as one byte range of the library.
+    - The range is only served from the library the index was read from (If-Match), offsets move when it is rewritten
+    """
+    @instrumented()
+    def thumbnailAt(self, offset, length, checksum):
+        path = os.path.join(self.folder, f"{checksum:08x}-{length}.png")
+        png = self.cache.read(path)
+        if png is not None:
+            return png
+
+        headers = {"Range": f"bytes={offset}-{offset + length - 1}"}
+        if self.library_etag is not None:
+            headers["If-Match"] = self.library_etag
+        status, response_headers, png = self.pool.request(self.url, headers)
+        if status == 412:
+            self.checked = 0.0
+            raise RemoteLibraryError(f"{self.url} changed on the server since it was opened")
+        self.checkStatus(status, png, f"thumbnail at offset {offset}")
+        if len(png) != length or zlib.crc32(png) != checksum:
+            raise RemoteLibraryError(f"Corrupt thumbnail at offset {offset} in {self.url}")
+        self.cache.write(path, png)
+        return png
+
+    def indexPath(self):
+        return os.path.join(self.folder, "index.json")
+
+    # The entry's checksum (or location for text libraries) names its cache file, as in MeshCache
+    def entryStamp(self, entry):
+        return f"{entry['checksum']:08x}" if entry.get("checksum") is not None else f"{entry['offset']}x{entry['length']}"
+
+    def checkStatus(self, status, body, what):
+        if status == 404:
+            raise RemoteLibraryError(f"No {what} on {self.url}")
+        if status not in (200, 206):
+            message = body[:200].decode("utf-8", "replace").strip()
+            raise RemoteLibraryError(f"{self.url} answered {status} for the {what}" + (f": {message}" if message else ""))
+
+# Cache shared by every remote library, bounded by the limit set last (see setRemoteCacheLimit)
+def getRemoteCache():
+    global remote_cache
+    with remote_lock:
+        if remote_cache is None:
+            remote_cache = remoteCache(REMOTE_CACHE_PATH, remote_cache_limit)
+        return remote_cache
+
+def setRemoteCacheLimit(limit):
+    global remote_cache_limit
+    remote_cache_limit = limit
+    if remote_cache is not None:
+        remote_cache.setLimit(limit)
+
+def getConnectionPool():
+    global connection_pool
+    with remote_lock:
+        if connection_pool is None:
+            connection_pool = connectionPool()
+        return connection_pool
+
+# Client of a remote library, created on first use
+def getRemoteLibrary(url):
+    url = url.rstrip("/")
+    with remote_lock:
+        library = remote_libraries.get(url)
+    if library is None:
+        library = remoteLibrary(url)
+        with remote_lock:
+            library = remote_libraries.setdefault(url, library)
+    return library
+
+# URLs of the libraries a server lists, e.g. to pick one to open
+def listRemoteLibraries(server_url, pool=None):
+    server_url = server_url.rstrip("/")
+    try:
+        status, headers, body = (pool or getConnectionPool()).request(server_url + "/libraries")
+    except (OSError, http.client.HTTPException) as error:
+        raise RemoteLibraryError(f"Could not reach {server_url}: {error}")
+    if status != 200:
+        raise RemoteLibraryError(f"{server_url} answered {status}, is it a Prim library server?")
+    return [server_url + "/libraries/" + urllib.parse.quote(library["name"]) for library in json.loads(body)["libraries"]]
@@ -0,0 +1,118 @@
+from MeshData import triangulate
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# -----------------------------------------------------------------------
+# Placement matrices for scattering many copies of a primitive (requires
+# NumPy). Everything here works on whole arrays, one row per copy.
+#
+# Matrices follow Maya's convention (as cmds.xform(matrix=...) takes them):
+# row vectors, the rows are the local X, Y, Z axes and the translation.
+# TRS rows are tx, ty, tz, rx, ry, rz (degrees, xyz rotate order), sx, sy, sz.
+# -----------------------------------------------------------------------
+
+def _requireNumpy():
+    if numpy is None:
+        raise ImportError("NumPy is not available in this Python, scattering needs it")
+
+# Row-vector rotation matrices about one axis, one per angle (radians)
+def _axisRotations(angles, axis):
+    cos, sin = numpy.cos(angles), numpy.sin(angles)
+    rotations = numpy.zeros((len(angles), 3, 3))
+    first, second = [(1, 2), (2, 0), (0, 1)][axis]
+    rotations[:, axis, axis] = 1.0
+    rotations[:, first, first] = cos
+    rotations[:, first, second] = sin
+    rotations[:, second, first] = -sin
+    rotations[:, second, second] = cos
+    return rotations
+
+# N x 9 TRS rows -> N x 4 x 4 matrices
+def trsToMatrices(trs):
+    _requireNumpy()
+    trs = numpy.asarray(trs, dtype=numpy.float64).reshape(-1, 9)
+    angles = numpy.radians(trs[:, 3:6])
+    rotations = _axisRotations(angles[:, 0], 0) @ _axisRotations(angles[:, 1], 1) @ _axisRotations(angles[:, 2], 2)
+
+    matrices = numpy.zeros((len(trs), 4, 4))
+    matrices[:, :3, :3] = trs[:, 6:9, numpy.newaxis] * rotations
+    matrices[:, 3, :3] = trs[:, :3]
+    matrices[:, 3, 3] = 1.0
+    return matrices
+
+"""
+Checks and converts scatter transforms to an N x 4 x 4 float64 array.
+- Takes N x 4 x 4 matrices (or N x 16 rows), or N x 9 TRS rows
+"""
+def placementMatrices(transforms):
+    _requireNumpy()
+    transforms = numpy.asarray(transforms, dtype=numpy.float64)
+    if transforms.ndim == 2 and transforms.shape[1] == 9:
+        return trsToMatrices(transforms)
+    if transforms.ndim == 2 and transforms.shape[1] == 16:
+        transforms = transforms.reshape(-1, 4, 4)
+    if transforms.ndim != 3 or transforms.shape[1:] != (4, 4):
+        raise ValueError(f"Expected N x 4 x 4 matrices or N x 9 TRS rows, got an array of shape {transforms.shape}")
+    return numpy.ascontiguousarray(transforms)
+
+"""
+Samples points spread uniformly over a mesh surface: returns (positions, normals), N x 3 each.
+- Normals are the normals of the sampled triangles, following the mesh winding
+"""
+def surfacePoints(mesh, count, rng):
+    _requireNumpy()
+    positions = numpy.frombuffer(mesh.positions, dtype=numpy.float32).reshape(-1, 3).astype(numpy.float64)
+    triangles = triangulate(mesh.counts, mesh.connects)
+    if not len(triangles):
+        raise ValueError("The target mesh has no faces to scatter on")
+
+    a, b, c = positions[triangles[:, 0]], positions[triangles[:, 1]], positions[triangles[:, 2]]
+    normals = numpy.cross(b - a, c - a)
+    areas = numpy.linalg.norm(normals, axis=1)
+    if areas.sum() <= 0:
+        raise ValueError("The target mesh has no surface area to scatter on")
+
+    picks = numpy.minimum(numpy.searchsorted(numpy.cumsum(areas), rng.random(count) * areas.sum()), len(triangles) - 1)
+    r1 = numpy.sqrt(rng.random((count, 1)))
+    r2 = rng.random((count, 1))
+    points = (1 - r1) * a[picks] + r1 * (1 - r2) * b[picks] + r1 * r2 * c[picks]
+    return points, normals[picks] / areas[picks, numpy.newaxis]
+
+"""
+Builds matrices placing copies at points, their Y axis along the normals.
+- yaw: rotation about the normal per copy (radians), scales: uniform scale per copy
+"""
+def alignedMatrices(points, normals, yaw=None, scales=None):
+    _requireNumpy()
+    count = len(points)
+    y_axes = normals / numpy.maximum(numpy.linalg.norm(normals, axis=1, keepdims=True), 1e-12)
+
+    # Any direction across the normal, then turned by the yaw
+    reference = numpy.tile([0.0, 0.0, 1.0], (count, 1))
+    reference[numpy.abs(y_axes[:, 2]) > 0.9] = (1.0, 0.0, 0.0)
+    x_axes = numpy.cross(y_axes, reference)
+    x_axes /= numpy.linalg.norm(x_axes, axis=1, keepdims=True)
+    if yaw is not None:
+        yaw = numpy.asarray(yaw, dtype=numpy.float64)[:, numpy.newaxis]
+        x_axes = x_axes * numpy.cos(yaw) + numpy.cross(y_axes, x_axes) * numpy.sin(yaw)
+    z_axes = numpy.cross(x_axes, y_axes)
+
+    matrices = numpy.zeros((count, 4, 4))
+    matrices[:, 0, :3], matrices[:, 1, :3], matrices[:, 2, :3] = x_axes, y_axes, z_axes
+    if scales is not None:
+        matrices[:, :3, :3] *= numpy.asarray(scales, dtype=numpy.float64)[:, numpy.newaxis, numpy.newaxis]
+    matrices[:, 3, :3] = points
+    matrices[:, 3, 3] = 1.0
+    return matrices
+
+# Placement matrices of count copies over a mesh surface, with random yaw and scale
+def surfaceMatrices(mesh, count, scale_range=(1.0, 1.0), align=True, seed=None):
+    _requireNumpy()
+    rng = numpy.random.default_rng(seed)
+    points, normals = surfacePoints(mesh, count, rng)
+    if not align:
+        normals = numpy.tile([0.0, 1.0, 0.0], (count, 1))
+    return alignedMatrices(points, normals, rng.uniform(0.0, 2 * numpy.pi, count), rng.uniform(scale_range[0], scale_range[1], count))
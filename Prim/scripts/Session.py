@@ -0,0 +1,66 @@
+import json
+import os
+
+from Catalog import fileStamp
+from PrimFile import isRemoteLibrary
+
+# -----------------------------------------------------------------------
+# Session manifest: what the Prim window showed when it was last closed.
+# - The last library, the (size, mtime) stamp it was read at and the
+#   names of its primitives
+# - On the next open only the stamp is checked: unchanged, the gallery
+#   lists the names right away while the catalog (index entries and
+#   thumbnails) is read in the background as usual (see LibraryLoader)
+# - Names only keep the manifest small: decoding it stays off the
+#   window's construction time, however large the library
+# - A stale or unreadable manifest only costs the usual background open
+# - Remote libraries are always reopened, through their cached index (see
+#   RemoteLibrary): asking the server whether it changed is the check
+# -----------------------------------------------------------------------
+
+SESSION_PATH = os.path.dirname(os.path.realpath(__file__)) + "/../primitives/session.json"
+SESSION_VERSION = 2
+
+# Records a catalog as the last library shown, written atomically
+def saveSession(catalog, path=SESSION_PATH):
+    session = {
+        "version": SESSION_VERSION,
+        "library": catalog.library_path,
+        "library_stamp": catalog.library_stamp,
+        "names": catalog.primitiveNames()
+    }
+
+    temp_path = path + ".tmp"
+    try:
+        with open(temp_path, "w") as file:
+            json.dump(session, file, separators=(",", ":"))
+        os.replace(temp_path, path)
+    except OSError as error:
+        print(f"Warning: Could not save the Prim session: {error}")
+
+"""
+Reads the last session: returns (library path, names), or None if there is no library to go back to.
+- names lists the library's primitives while its stamp still matches, None when it changed since
+  or is remote
+"""
+def loadSession(path=SESSION_PATH):
+    try:
+        with open(path) as file:
+            session = json.load(file)
+    except (OSError, ValueError):
+        return None
+    if session.get("version") != SESSION_VERSION:
+        return None
+    if isRemoteLibrary(session.get("library")):
+        return session["library"], None
+    if not os.path.isfile(session.get("library", "")):
+        return None
+
+    library_stamp = session["library_stamp"] and tuple(session["library_stamp"])
+    if library_stamp is not None and fileStamp(session["library"]) == library_stamp:
+        return session["library"], session["names"]
+    return session["library"], None
+
+def clearSession(path=SESSION_PATH):
+    if os.path.exists(path):
+        os.remove(path)
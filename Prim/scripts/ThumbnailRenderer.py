@@ -0,0 +1,244 @@
+import maya.cmds as cmds
+import maya.utils
+import collections
+import math
+import os
+import time
+
+from PrimFile import PrimFileError
+from Catalog import getCatalog
+from Thumbnails import pngSize
+from MeshManager import getGeometry, createMeshFromGeometry, getMeshCache, getThumbnailSize, embedThumbnails
+
+# -----------------------------------------------------------------------
+# Batch thumbnail rendering for primitives without a preview.
+# - Jobs are rendered from Maya idle events, a few at a time, so the UI
+#   stays interactive while a whole library renders
+# - Each primitive is built on its own in a hidden model panel with a
+#   fixed three-quarter camera, fitted to its bounding box, and
+#   playblasted offscreen: every thumbnail gets the same framing
+# - Undo is off while a thumbnail renders, nothing ends up in the undo
+#   queue, and the panel and camera are removed once the queue is empty
+# - Each idle event's thumbnails are embedded in their (indexed) library
+#   with one write, then handed to the listeners
+# -----------------------------------------------------------------------
+
+# Seconds of rendering per idle event, at least one thumbnail is rendered each time
+IDLE_BUDGET = 0.1
+
+# Camera direction (from the object), and how much of the frame the object fills
+CAMERA_DIRECTION = (1.0, 0.8, 1.0)
+FIT_FACTOR = 0.9
+
+"""
+Queue of thumbnails to render, shared by every Prim window.
+- enqueue() adds (library, name) jobs, rendering starts on the next idle event
+- listeners are called as listener(library_path, name, png_path) as each thumbnail is written
+- Throughput is reported when the queue empties, and kept in report
+"""
+class thumbnailRenderer():
+    instance = None
+
+    @classmethod
+    def get(cls):
+        if cls.instance is None:
+            cls.instance = thumbnailRenderer()
+        return cls.instance
+
+    def __init__(self):
+        self.jobs = collections.deque()
+        self.queued = set()
+        self.listeners = []
+        self.idle_job = None
+
+        self.window = None
+        self.panel = None
+        self.camera = None
+        self.size = None
+
+        self.report = None
+        self.started = None
+        self.render_seconds = 0.0
+        self.rendered = 0
+        self.failed = 0
+
+    # Names in a library whose thumbnail is missing, or rendered at another resolution
+    @staticmethod
+    def missingThumbnails(catalog, size=None):
+        size = size or getThumbnailSize()
+        missing = []
+        for name in catalog.primitiveNames():
+            thumbnail = catalog.thumbnail(name)
+            if thumbnail is None or pngSize(thumbnail) != (size, size):
+                missing.append(name)
+        return missing
+
+    def enqueue(self, library_path, names):
+        library_path = os.path.realpath(library_path)
+        for name in names:
+            if (library_path, name) not in self.queued:
+                self.queued.add((library_path, name))
+                self.jobs.append((library_path, name))
+
+        if self.jobs and self.idle_job is None:
+            self.started = time.perf_counter()
+            self.render_seconds = 0.0
+            self.rendered = self.failed = 0
+            self.idle_job = cmds.scriptJob(idleEvent=self.onIdle)
+
+    def pending(self):
+        return len(self.jobs)
+
+    # Drops the jobs not rendered yet
+    def cancel(self):
+        self.jobs.clear()
+        self.queued.clear()
+        self.finish()
+
+    def onIdle(self):
+        deadline = time.perf_counter() + IDLE_BUDGET
+        rendered = {} # library path -> {name: png path}
+        while self.jobs:
+            library_path, name = self.jobs.popleft()
+            self.queued.discard((library_path, name))
+            path = self.renderJob(library_path, name)
+            if path is not None:
+                rendered.setdefault(library_path, {})[name] = path
+            if time.perf_counter() >= deadline:
+                break
+
+        for library_path, paths in rendered.items():
+            self.publish(library_path, paths)
+        if not self.jobs:
+            self.finish()
+
+    # Renders one job, returns the thumbnail path or None
+    def renderJob(self, library_path, name):
+        start = time.perf_counter()
+        try:
+            path = self.render(getCatalog(library_path), name)
+        except (PrimFileError, OSError, RuntimeError, ValueError) as error:
+            print(f"Warning: Could not render a thumbnail for \"{name}\": {error}")
+            path = None
+        self.render_seconds += time.perf_counter() - start
+
+        if path is None:
+            self.failed += 1
+        else:
+            self.rendered += 1
+        return path
+
+    # Embeds a batch of thumbnails in their library, then tells the listeners
+    def publish(self, library_path, paths):
+        try:
+            embedThumbnails(getCatalog(library_path), paths)
+        except (PrimFileError, OSError) as error:
+            print(f"Warning: Could not embed thumbnails in {os.path.basename(library_path)}: {error}")
+
+        for name, path in paths.items():
+            for listener in list(self.listeners):
+                try:
+                    listener(library_path, name, path)
+                except RuntimeError:
+                    # The window listening was closed
+                    self.listeners.remove(listener)
+
+    """
+    Renders one primitive's thumbnail into the catalog's thumbnails folder. Returns its path, None if the primitive is gone.
+    - The primitive is built without undo, isolated in the hidden panel, and deleted right after
+    """
+    def render(self, catalog, name):
+        if name not in catalog:
+            return None
+        self.setUp()
+
+        undo = cmds.undoInfo(query=True, state=True)
+        cmds.undoInfo(stateWithoutFlush=False)
+        nodes = []
+        try:
+            nodes = self.buildPrimitive(catalog, name)
+            if not nodes:
+                return None
+            for node in nodes:
+                cmds.isolateSelect(self.panel, addDagObject=node)
+            cmds.viewFit(self.camera, nodes, fitFactor=FIT_FACTOR)
+
+            path = os.path.join(catalog.thumbnails_path, name + ".png")
+            frame = cmds.currentTime(query=True)
+            cmds.playblast(frame=[frame], format="image", compression="png", completeFilename=path,
+                           widthHeight=[self.size, self.size], percent=100, viewer=False, showOrnaments=False,
+                           offScreen=True, editorPanelName=self.panel, forceOverwrite=True)
+        finally:
+            for node in nodes:
+                if cmds.objExists(node):
+                    cmds.isolateSelect(self.panel, removeDagObject=node)
+                    cmds.delete(node)
+            cmds.undoInfo(stateWithoutFlush=undo)
+
+        catalog.recordThumbnail(name, path)
+        return path
+
+    # Builds a primitive in the scene, in memory or from its .obj. Returns its transforms.
+    def buildPrimitive(self, catalog, name):
+        if hasattr(cmds, "primCreateMesh"):
+            geometry = getGeometry(name, catalog)
+            return [createMeshFromGeometry(name + "_thumbnail", geometry)] if geometry is not None else []
+
+        mesh_path = getMeshCache().getMesh(catalog.library_path, name, catalog.entries())
+        if not mesh_path:
+            return []
+        return cmds.ls(cmds.file(mesh_path, i=True, rnn=True), type="transform", long=True)
+
+    # Hidden window, model panel and camera, created on first use and again if the scene was replaced
+    def setUp(self):
+        if self.camera is not None and cmds.objExists(self.camera) and self.panel is not None and cmds.modelPanel(self.panel, exists=True):
+            return
+        self.tearDown()
+        self.size = getThumbnailSize()
+
+        self.camera = cmds.camera(name="primThumbnailCamera")[0]
+        cmds.setAttr(self.camera + ".visibility", False)
+        x, y, z = CAMERA_DIRECTION
+        cmds.xform(self.camera, worldSpace=True, translation=(x * 10, y * 10, z * 10),
+                   rotation=(-math.degrees(math.atan2(y, math.hypot(x, z))), math.degrees(math.atan2(x, z)), 0))
+
+        self.window = cmds.window(title="Prim thumbnails", widthHeight=(self.size, self.size))
+        layout = cmds.paneLayout(parent=self.window)
+        self.panel = cmds.modelPanel(parent=layout, camera=self.camera, menuBarVisible=False)
+        cmds.modelEditor(self.panel, edit=True, displayAppearance="smoothShaded", displayTextures=True, grid=False,
+                         headsUpDisplay=False, selectionHiliteDisplay=False, allObjects=False, polymeshes=True)
+        cmds.isolateSelect(self.panel, state=True)
+
+    def tearDown(self):
+        if self.panel is not None and cmds.modelPanel(self.panel, exists=True):
+            cmds.deleteUI(self.panel, panel=True)
+        if self.window is not None and cmds.window(self.window, exists=True):
+            cmds.deleteUI(self.window)
+        if self.camera is not None and cmds.objExists(self.camera):
+            undo = cmds.undoInfo(query=True, state=True)
+            cmds.undoInfo(stateWithoutFlush=False)
+            cmds.delete(self.camera)
+            cmds.undoInfo(stateWithoutFlush=undo)
+        self.window = self.panel = self.camera = None
+
+    # Stops listening to idle events, removes the hidden panel, and reports throughput
+    def finish(self):
+        if self.idle_job is not None:
+            # Called from the idle job itself, it is killed once the event is done
+            maya.utils.executeDeferred(cmds.scriptJob, kill=self.idle_job, force=True)
+            self.idle_job = None
+        self.tearDown()
+        if self.started is None:
+            return
+
+        seconds = time.perf_counter() - self.started
+        self.report = {
+            "rendered": self.rendered,
+            "failed": self.failed,
+            "seconds": seconds,
+            "thumbnails_per_second": self.rendered / seconds if seconds > 0 else 0.0,
+            "render_ms": self.render_seconds * 1000 / max(self.rendered + self.failed, 1)
+        }
+        self.started = None
+        print(f"Rendered {self.rendered} thumbnails in {seconds:.1f}s ({self.report['thumbnails_per_second']:.1f}/s, "
+              f"{self.report['render_ms']:.0f} ms each while rendering), {self.failed} failed")
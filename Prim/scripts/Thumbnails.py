@@ -0,0 +1,163 @@
+try:
+    from PySide2 import QtCore
+    from PySide2 import QtGui
+except ImportError:
+    from PySide6 import QtCore
+    from PySide6 import QtGui
+
+import collections
+import os
+
+from PrimFile import PrimFileError, readThumbnailAt
+
+# -----------------------------------------------------------------------
+# Thumbnail lookup and loading for the Prim gallery.
+# - thumbnailIndex() lists the thumbnails folder once per refresh
+# - Index entries are (png path, mtime) for loose files, or
+#   (library path, offset, length, checksum) for thumbnails embedded in a
+#   library, read with one seek (see PrimFile)
+# - thumbnailLoader decodes PNGs into QImages on a thread pool, and keeps
+#   the resulting QPixmaps in a bounded LRU cache shared by every window
+# -----------------------------------------------------------------------
+
+THUMBNAILS_PATH = os.path.dirname(os.path.realpath(__file__)) + "/../primitives/thumbnails"
+DEFAULT_THUMBNAIL = THUMBNAILS_PATH + "/default.png"
+
+# Pixmaps kept in memory, 100x100 thumbnails are ~40KB each
+PIXMAP_CACHE_LIMIT = 64 * 1024 * 1024
+
+# Maps primitive name -> (png path, mtime) with a single directory listing
+def thumbnailIndex(dir_path=THUMBNAILS_PATH):
+    index = {}
+    if not os.path.isdir(dir_path):
+        return index
+
+    for item in os.scandir(dir_path):
+        name, ext = os.path.splitext(item.name)
+        if ext == ".png" and item.is_file():
+            index[name] = (item.path, item.stat().st_mtime_ns)
+    return index
+
+# Embedded entries carry the thumbnail's place in its library, loose ones a file path and mtime
+def isEmbeddedThumbnail(entry):
+    return len(entry) == 4
+
+# PNG bytes of a thumbnail index entry
+def readThumbnail(entry):
+    if isEmbeddedThumbnail(entry):
+        return readThumbnailAt(*entry)
+    with open(entry[0], "rb") as file:
+        return file.read()
+
+# (width, height) of a thumbnail from its PNG header, None if it is missing or not a PNG
+def pngSize(entry):
+    try:
+        header = readThumbnail(entry)[:24]
+    except (OSError, PrimFileError):
+        return None
+    if len(header) < 24 or header[:8] != b"\x89PNG\r\n\x1a\n":
+        return None
+    return int.from_bytes(header[16:20], "big"), int.from_bytes(header[20:24], "big")
+
+class thumbnailSignals(QtCore.QObject):
+    loaded = QtCore.Signal(object, object) # cache key, QImage
+
+# Decodes one PNG on a pool thread, from its file or its library. QImage is safe off the UI thread, QPixmap is not.
+class thumbnailTask(QtCore.QRunnable):
+    def __init__(self, key, signals):
+        super().__init__()
+        self.key = key
+        self.signals = signals
+
+    def run(self):
+        if not isEmbeddedThumbnail(self.key):
+            self.signals.loaded.emit(self.key, QtGui.QImage(self.key[0]))
+            return
+
+        image = QtGui.QImage()
+        try:
+            image.loadFromData(readThumbnail(self.key), "PNG")
+        except (OSError, PrimFileError):
+            # The library was rewritten since its index was read, the catalog reloads it
+            pass
+        self.signals.loaded.emit(self.key, image)
+
+"""
+Loads thumbnails off the UI thread.
+- request() calls back right away on a cache hit, otherwise once the PNG is decoded
+- Concurrent requests for the same file share one decode
+"""
+class thumbnailLoader(QtCore.QObject):
+    instance = None
+
+    @classmethod
+    def get(cls):
+        if cls.instance is None:
+            cls.instance = thumbnailLoader()
+        return cls.instance
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.pool = QtCore.QThreadPool()
+        self.pool.setMaxThreadCount(max(1, min(4, QtCore.QThread.idealThreadCount() - 1)))
+
+        # Signals are delivered on the UI thread, where this object lives
+        self.signals = thumbnailSignals()
+        self.signals.loaded.connect(self.onLoaded)
+
+        self.pixmaps = collections.OrderedDict() # (path, mtime) -> QPixmap, oldest first
+        self.pixmaps_size = 0
+        self.pending = {} # (path, mtime) -> callbacks
+        self.placeholder = None
+
+    # Default thumbnail, shown until the real one arrives
+    def placeholderPixmap(self):
+        if self.placeholder is None:
+            self.placeholder = QtGui.QPixmap(DEFAULT_THUMBNAIL)
+        return self.placeholder
+
+    # Already decoded thumbnail for an index entry, or None
+    def cached(self, entry):
+        if entry is None:
+            return self.placeholderPixmap()
+        if entry in self.pixmaps:
+            self.pixmaps.move_to_end(entry)
+            return self.pixmaps[entry]
+        return None
+
+    # Calls callback(QPixmap) with the thumbnail for an index entry
+    def request(self, entry, callback):
+        if entry is None:
+            callback(self.placeholderPixmap())
+            return
+
+        if entry in self.pixmaps:
+            self.pixmaps.move_to_end(entry)
+            callback(self.pixmaps[entry])
+            return
+
+        if entry in self.pending:
+            self.pending[entry].append(callback)
+            return
+
+        self.pending[entry] = [callback]
+        self.pool.start(thumbnailTask(entry, self.signals))
+
+    def onLoaded(self, entry, image):
+        pixmap = QtGui.QPixmap.fromImage(image) if not image.isNull() else self.placeholderPixmap()
+        self.insert(entry, pixmap)
+
+        for callback in self.pending.pop(entry, []):
+            try:
+                callback(pixmap)
+            except RuntimeError:
+                # The widget was deleted while its thumbnail was loading
+                pass
+
+    def insert(self, entry, pixmap):
+        size = pixmap.width() * pixmap.height() * 4
+        self.pixmaps[entry] = pixmap
+        self.pixmaps_size += size
+        while self.pixmaps_size > PIXMAP_CACHE_LIMIT and len(self.pixmaps) > 1:
+            evicted, evicted_pixmap = self.pixmaps.popitem(last=False)
+            self.pixmaps_size -= evicted_pixmap.width() * evicted_pixmap.height() * 4
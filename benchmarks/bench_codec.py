@@ -0,0 +1,177 @@
+"""
+Compression and decode speed of "compact" payloads against OBJ text.
+
+Encodes a few synthetic meshes (a wavy grid, a UV sphere with UVs and
+normals, a noisy scan-like blob) at several position bit depths, and for
+each reports: payload size against OBJ text, zlib-compressed OBJ text and
+packed "geometry", encode and decode time against parsing the text, and the
+codec's maximum vertex deviation (absolute, and relative to the mesh's
+bounding box diagonal). Then exports a synthetic OBJ library as a compact
+library and reads every primitive back from both. Runs under plain CPython
+with NumPy, no Maya needed:
+
+    python benchmarks/bench_codec.py
+    python benchmarks/bench_codec.py --faces 40000 --bits 10 12 16 --json codec.json
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import zlib
+from array import array
+
+import numpy
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), "..", "Prim", "scripts"))
+
+from MeshData import meshData, packMeshData, meshDataToObj, objToMeshData, unpackMeshData, compactMeshData, \
+    expandMeshData, exportCompactPrimFile, payloadToMeshData
+from PrimFile import writePrimFile, iterEntries
+
+def mesh_from_numpy(positions, faces, uvs=None, normals=None):
+    counts = numpy.full(len(faces), faces.shape[1], dtype=numpy.int32)
+    connects = faces.reshape(-1).astype(numpy.int32)
+    mesh = meshData(array("f", positions.astype(numpy.float32).tobytes()), array("i", counts.tobytes()), array("i", connects.tobytes()))
+    if uvs is not None:
+        mesh.uvs, mesh.uv_ids = array("f", uvs.astype(numpy.float32).tobytes()), array("i", connects.tobytes())
+    if normals is not None:
+        mesh.normals, mesh.normal_ids = array("f", normals.astype(numpy.float32).tobytes()), array("i", connects.tobytes())
+    return mesh
+
+# side x side quads on a (u, v) grid, for grid-like surfaces
+def grid_quads(rows, columns):
+    corners = numpy.arange((rows + 1) * (columns + 1)).reshape(rows + 1, columns + 1)[:rows, :columns]
+    return numpy.stack([corners, corners + 1, corners + columns + 2, corners + columns + 1], axis=-1).reshape(-1, 4)
+
+def wavy_grid(faces):
+    side = max(1, int(round(faces ** 0.5)))
+    x, z = numpy.meshgrid(numpy.linspace(0, 50, side + 1), numpy.linspace(0, 50, side + 1))
+    positions = numpy.stack([x, numpy.sin(x * 0.5) * numpy.cos(z * 0.5), z], axis=-1).reshape(-1, 3)
+    return mesh_from_numpy(positions, grid_quads(side, side))
+
+def uv_sphere(faces):
+    rows = max(2, int(round((faces / 2) ** 0.5)))
+    columns = rows * 2
+    u, v = numpy.meshgrid(numpy.linspace(0, 1, columns + 1), numpy.linspace(0, 1, rows + 1))
+    normals = numpy.stack([numpy.cos(u * 2 * numpy.pi) * numpy.sin(v * numpy.pi), numpy.cos(v * numpy.pi),
+                           numpy.sin(u * 2 * numpy.pi) * numpy.sin(v * numpy.pi)], axis=-1).reshape(-1, 3)
+    uvs = numpy.stack([u, v], axis=-1).reshape(-1, 2)
+    return mesh_from_numpy(normals * 5, grid_quads(rows, columns), uvs, normals)
+
+def noisy_blob(faces):
+    rows = max(2, int(round((faces / 2) ** 0.5)))
+    columns = rows * 2
+    u, v = numpy.meshgrid(numpy.linspace(0, 1, columns + 1), numpy.linspace(0, 1, rows + 1))
+    radius = 3 + numpy.random.default_rng(7).normal(0, 0.05, u.shape)
+    positions = numpy.stack([numpy.cos(u * 2 * numpy.pi) * numpy.sin(v * numpy.pi) * radius, numpy.cos(v * numpy.pi) * radius,
+                             numpy.sin(u * 2 * numpy.pi) * numpy.sin(v * numpy.pi) * radius], axis=-1).reshape(-1, 3)
+    triangles = grid_quads(rows, columns)[:, [0, 1, 2, 0, 2, 3]].reshape(-1, 3)
+    return mesh_from_numpy(positions, triangles)
+
+MESHES = {"wavy_grid": wavy_grid, "uv_sphere": uv_sphere, "noisy_blob": noisy_blob}
+
+# Best of `repeat` runs, in milliseconds
+def best_ms(function, repeat):
+    best = float("inf")
+    for i in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return round(best * 1000, 3)
+
+def bench_mesh(name, mesh, bits, repeat):
+    obj = meshDataToObj(mesh)
+    geometry = packMeshData(mesh)
+    positions = numpy.frombuffer(mesh.positions, dtype=numpy.float32).reshape(-1, 3)
+    diagonal = float(numpy.linalg.norm(positions.max(axis=0) - positions.min(axis=0)))
+    result = {
+        "mesh": name,
+        "vertices": mesh.vertexCount(),
+        "faces": mesh.faceCount(),
+        "obj_bytes": len(obj),
+        "obj_zlib_bytes": len(zlib.compress(obj, 9)),
+        "geometry_bytes": len(geometry),
+        "obj_parse_ms": best_ms(lambda: objToMeshData(obj), max(1, repeat // 5)),
+        "geometry_unpack_ms": best_ms(lambda: unpackMeshData(geometry), repeat),
+        "compact": []
+    }
+    for depth in bits:
+        payload, max_error = compactMeshData(mesh, depth)
+        result["compact"].append({
+            "bits": depth,
+            "bytes": len(payload),
+            "ratio_vs_obj": round(len(obj) / len(payload), 2),
+            "ratio_vs_obj_zlib": round(result["obj_zlib_bytes"] / len(payload), 2),
+            "encode_ms": best_ms(lambda: compactMeshData(mesh, depth), max(1, repeat // 5)),
+            "decode_ms": best_ms(lambda: expandMeshData(payload), repeat),
+            "max_error": max_error,
+            "relative_error": max_error / diagonal if diagonal else 0.0
+        })
+    return result
+
+# Exports an OBJ library as a compact one, then reads every primitive back from each
+def bench_library(work_dir, count, faces, bits):
+    source = os.path.join(work_dir, "obj.prim")
+    compact = os.path.join(work_dir, "compact.prim")
+    meshes = [MESHES[name](faces) for name in sorted(MESHES)]
+    writePrimFile(source, ((f"mesh_{i:05d}", {"format": "obj", "length": len(obj)}, obj)
+                           for i, obj in enumerate(meshDataToObj(meshes[i % len(meshes)]) for i in range(count))))
+
+    start = time.perf_counter()
+    report = exportCompactPrimFile(source, compact, bits)
+    export_s = time.perf_counter() - start
+
+    def read_all(path):
+        start = time.perf_counter()
+        for name, entry, payload in iterEntries(path):
+            payloadToMeshData(payload, entry["format"])
+        return round(time.perf_counter() - start, 3)
+
+    return {
+        "meshes": count,
+        "bits": bits,
+        "obj_mb": round(os.path.getsize(source) / 1024 / 1024, 2),
+        "compact_mb": round(os.path.getsize(compact) / 1024 / 1024, 2),
+        "export_s": round(export_s, 3),
+        "read_obj_s": read_all(source),
+        "read_compact_s": read_all(compact),
+        "max_error": report["max_error"]
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--faces", type=int, default=10000, help="approximate faces per synthetic mesh (default 10000)")
+    parser.add_argument("--bits", type=int, nargs="+", default=[10, 12, 14, 16], help="position bit depths (default 10 12 14 16)")
+    parser.add_argument("--repeat", type=int, default=20, help="runs per timing, the best one counts (default 20)")
+    parser.add_argument("--library", type=int, default=200, help="meshes in the library export test, 0 to skip (default 200)")
+    parser.add_argument("--json", default=None, help="write results to this file")
+    args = parser.parse_args()
+
+    results = {"meshes": [], "library": None}
+    for name, build in MESHES.items():
+        result = bench_mesh(name, build(args.faces), args.bits, args.repeat)
+        results["meshes"].append(result)
+        print(f"{name}: {result['vertices']} vertices, {result['faces']} faces, OBJ {result['obj_bytes']} B "
+              f"(zlib {result['obj_zlib_bytes']} B), geometry {result['geometry_bytes']} B, "
+              f"OBJ parse {result['obj_parse_ms']} ms")
+        for compact in result["compact"]:
+            print(f"  {compact['bits']:>2} bits: {compact['bytes']:>8} B, {compact['ratio_vs_obj']:>6.1f}x vs OBJ, "
+                  f"{compact['ratio_vs_obj_zlib']:>5.1f}x vs zlib OBJ, encode {compact['encode_ms']} ms, "
+                  f"decode {compact['decode_ms']} ms, max error {compact['max_error']:.3g} "
+                  f"({compact['relative_error']:.2e} of the diagonal)")
+
+    if args.library:
+        with tempfile.TemporaryDirectory(prefix="prim_codec_") as work_dir:
+            library = results["library"] = bench_library(work_dir, args.library, args.faces // 10, args.bits[-1])
+        print(f"library: {library['meshes']} meshes, OBJ {library['obj_mb']} MB -> compact {library['compact_mb']} MB "
+              f"at {library['bits']} bits in {library['export_s']}s, reading every primitive "
+              f"{library['read_obj_s']}s (OBJ) vs {library['read_compact_s']}s (compact)")
+
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(results, file, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""
+Gallery benchmark: populate, scroll and edit a library of N primitives.
+
+Runs the model/view gallery offscreen, without Maya (needs PySide2 or
+PySide6). Thumbnails are synthetic PNGs written to a temp folder:
+
+    python benchmarks/bench_gallery.py --count 10000 50000
+    python benchmarks/bench_gallery.py --count 2000 --baseline --json out.json
+
+--baseline also times the old approach, one QWidget per primitive in a
+QScrollArea; it gets slow quickly, keep --count small with it.
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), "..", "Prim", "scripts"))
+
+try:
+    from PySide2 import QtGui, QtWidgets
+except ImportError:
+    from PySide6 import QtGui, QtWidgets
+
+from Gallery import primitiveModel, primitiveDelegate, createGalleryView
+from Thumbnails import thumbnailIndex
+
+# Processes pending events (paints, thumbnail callbacks) until idle
+def drain(app, seconds=0.0):
+    deadline = time.perf_counter() + seconds
+    app.processEvents()
+    while time.perf_counter() < deadline:
+        app.processEvents()
+
+# Writes `count` thumbnails, cycling through a few distinct colors
+def generate_thumbnails(dir_path, names):
+    for i, name in enumerate(names):
+        image = QtGui.QImage(100, 100, QtGui.QImage.Format.Format_RGB32)
+        image.fill(QtGui.QColor.fromHsv(i * 37 % 360, 160, 200))
+        image.save(os.path.join(dir_path, name + ".png"))
+
+def bench_model_view(app, names, index):
+    model = primitiveModel()
+    view = createGalleryView(model, primitiveDelegate())
+    view.resize(320, 900)
+    view.show()
+    drain(app)
+
+    results = {}
+    start = time.perf_counter()
+    model.setPrimitives(names, index)
+    drain(app)
+    results["populate_ms"] = (time.perf_counter() - start) * 1000
+
+    # Page through the whole list, one repaint per step
+    scroll_bar = view.verticalScrollBar()
+    steps = 0
+    start = time.perf_counter()
+    for value in range(0, scroll_bar.maximum() + 1, max(1, view.viewport().height())):
+        scroll_bar.setValue(value)
+        view.viewport().repaint()
+        steps += 1
+    results["scroll_ms_per_page"] = (time.perf_counter() - start) * 1000 / max(1, steps)
+
+    start = time.perf_counter()
+    model.addPrimitive("inserted_primitive")
+    drain(app)
+    results["insert_ms"] = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    model.removePrimitive(names[len(names) // 2])
+    drain(app)
+    results["remove_ms"] = (time.perf_counter() - start) * 1000
+
+    view.close()
+    return results
+
+# One widget per primitive, rebuilt on every change, as the gallery used to work
+def bench_widgets(app, names, index):
+    scroll_area = QtWidgets.QScrollArea()
+    scroll_area.setWidgetResizable(True)
+    scroll_area.resize(320, 900)
+    scroll_area.show()
+
+    def build(names):
+        gallery = QtWidgets.QWidget()
+        layout = QtWidgets.QVBoxLayout(gallery)
+        for name in names:
+            widget = QtWidgets.QWidget()
+            widget_layout = QtWidgets.QVBoxLayout(widget)
+            widget_layout.addWidget(QtWidgets.QLabel(name))
+            image_label = QtWidgets.QLabel()
+            image_label.setPixmap(QtGui.QPixmap(index[name][0]))
+            widget_layout.addWidget(image_label)
+            widget_layout.addWidget(QtWidgets.QPushButton("Create"))
+            widget_layout.addWidget(QtWidgets.QPushButton("Delete"))
+            layout.addWidget(widget)
+        layout.addStretch()
+        scroll_area.setWidget(gallery)
+        drain(app)
+
+    results = {}
+    start = time.perf_counter()
+    build(names)
+    results["populate_ms"] = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    build(names + ["inserted_primitive"])
+    results["insert_ms"] = (time.perf_counter() - start) * 1000
+
+    scroll_area.close()
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, nargs="+", default=[10000, 50000], help="library sizes (default 10000 50000)")
+    parser.add_argument("--baseline", action="store_true", help="also time one widget per primitive")
+    parser.add_argument("--json", default=None, help="write results to this file")
+    args = parser.parse_args()
+
+    app = QtWidgets.QApplication.instance() or QtWidgets.QApplication(sys.argv)
+    work_dir = tempfile.mkdtemp(prefix="prim_gallery_")
+    all_results = []
+
+    try:
+        names = [f"mesh_{i:06d}" for i in range(max(args.count))]
+        generate_thumbnails(work_dir, names)
+        index = thumbnailIndex(work_dir)
+
+        for count in args.count:
+            result = {"count": count, "model_view": bench_model_view(app, names[:count], index)}
+            if args.baseline:
+                result["widgets"] = bench_widgets(app, names[:count], index)
+            all_results.append(result)
+
+            for approach in ("model_view", "widgets"):
+                if approach in result:
+                    timings = ", ".join(f"{key} {value:.1f}" for key, value in result[approach].items())
+                    print(f"{count:>7} {approach:>10}: {timings}")
+
+        if args.json:
+            with open(args.json, "w") as file:
+                json.dump({"results": all_results}, file, indent=2)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,294 @@
+"""
+Library benchmark: how Prim's library operations scale with library size.
+
+Generates synthetic libraries (10, 1k, 10k and 100k meshes by default) and
+times, for each size: opening the library (catalog), regenerating the .obj
+meshes, saving and deleting primitives, name lookups and reads, export, and
+a gallery refresh. Runs under plain CPython with a stand-in for Maya (see
+maya_stub.py), and needs NumPy and PySide2 or PySide6:
+
+    python benchmarks/bench_library.py
+    python benchmarks/bench_library.py --sizes 1000 10000 --faces 400 --format geometry
+    python benchmarks/bench_library.py --json new.json --compare old.json
+    python benchmarks/bench_library.py --instrument --json instrumented.json --compare new.json
+
+Prim's scripts run from a copy in a temp folder, so meshes, thumbnails and
+indexes written by the benchmark never touch the real primitives folder.
+--compare reports every timing that got slower than --tolerance times the
+old run, and exits with status 1 if any did. --instrument turns Prim's
+operation timings on (see Instrumentation.py) and logs their percentiles for
+each size; compared with a plain run it shows what recording costs.
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from array import array
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+import numpy
+
+import maya_stub
+
+PRIM_PATH = os.path.join(os.path.dirname(os.path.realpath(__file__)), "..", "Prim")
+
+# Results where a higher number is better, everything else ending in _ms or _s is a timing
+NOT_TIMINGS = {"size", "faces", "file_mb", "thumbnails_loaded"}
+
+# Progress lines go to the real stdout, Prim's own prints are silenced while timing
+def log(message):
+    print(message, file=sys.__stdout__, flush=True)
+
+def timed(function, *args, **kwargs):
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+# Copies Prim's scripts and primitives folder to root, returns the scripts folder to import from
+def make_sandbox(root):
+    ignore = shutil.ignore_patterns("__pycache__", "*.pyc")
+    shutil.copytree(os.path.join(PRIM_PATH, "scripts"), os.path.join(root, "scripts"), ignore=ignore)
+    shutil.copytree(os.path.join(PRIM_PATH, "primitives"), os.path.join(root, "primitives"), ignore=ignore)
+    for folder in ("libraries", "meshes", "cache", "thumbnails"):
+        os.makedirs(os.path.join(root, "primitives", folder), exist_ok=True)
+    return os.path.join(root, "scripts")
+
+# Wavy grid of about `faces` quads, the same topology for every mesh of a library
+def grid_arrays(faces):
+    side = max(1, int(round(faces ** 0.5)))
+    x, z = numpy.meshgrid(numpy.arange(side + 1, dtype=numpy.float32), numpy.arange(side + 1, dtype=numpy.float32))
+    positions = numpy.stack([x, numpy.sin(x * 0.5) * numpy.cos(z * 0.5), z], axis=-1).reshape(-1, 3)
+    corners = numpy.arange((side + 1) * side).reshape(side, side + 1)[:, :side]
+    connects = numpy.stack([corners, corners + 1, corners + side + 2, corners + side + 1], axis=-1).reshape(-1)
+    return positions, array("i", [4] * side * side), array("i", connects.astype(numpy.int32).tobytes())
+
+# Synthetic library records: (name, entry, payload), each mesh slightly different so no two payloads match
+def synthetic_records(count, faces, format, thumbnail):
+    from MeshData import meshData, packMeshData, meshDataToObj
+
+    positions, counts, connects = grid_arrays(faces)
+    obj = meshDataToObj(meshData(array("f", positions.tobytes()), counts, connects))
+    for index in range(count):
+        if format == "geometry":
+            shifted = positions + numpy.float32(index * 1e-3)
+            payload = packMeshData(meshData(memoryview(shifted.reshape(-1)), counts, connects))
+        else:
+            payload = obj + b"# %d\n" % index
+        entry = {"format": format, "length": len(payload)}
+        if thumbnail is not None:
+            entry["thumbnail"] = {"png": thumbnail}
+        yield f"mesh_{index:06d}", entry, payload
+
+# Small PNG like the ones Prim renders
+def synthetic_thumbnail(QtCore, QtGui, size=100):
+    image = QtGui.QImage(size, size, QtGui.QImage.Format.Format_RGB32)
+    image.fill(QtGui.QColor(90, 120, 160))
+    buffer = QtCore.QBuffer()
+    buffer.open(QtCore.QIODevice.OpenModeFlag.WriteOnly)
+    image.save(buffer, "PNG")
+    return bytes(buffer.data())
+
+def summary(seconds):
+    if not seconds:
+        return {}
+    return {"median_ms": round(statistics.median(seconds) * 1000, 3), "max_ms": round(max(seconds) * 1000, 3)}
+
+# Runs deferred calls until `expected` have run, e.g. the proxy worker's results
+def settle(expected, timeout=120.0):
+    ran = 0
+    deadline = time.perf_counter() + timeout
+    while ran < expected and time.perf_counter() < deadline:
+        ran += maya_stub.processIdleEvents()
+        time.sleep(0.01)
+    return ran
+
+def drain(app, seconds=0.0):
+    deadline = time.perf_counter() + seconds
+    app.processEvents()
+    while time.perf_counter() < deadline:
+        app.processEvents()
+
+def bench_size(size, args, root, app, QtCore, QtGui):
+    import MeshManager
+    import Prim
+    from Catalog import getCatalog, closeCatalog
+    from Gallery import primitiveModel, primitiveDelegate, createGalleryView
+    from MeshData import meshData
+    from PrimFile import writePrimFile, readPrimitive, exportPrimFile
+    from Thumbnails import thumbnailLoader
+
+    result = {"size": size, "faces": args.faces}
+    library = os.path.join(root, "primitives", "libraries", f"bench_{size}.prim")
+    thumbnail = None if args.no_thumbnails or args.format == "legacy" else synthetic_thumbnail(QtCore, QtGui)
+    records = synthetic_records(size, args.faces, "obj" if args.format == "legacy" else args.format, thumbnail)
+    result["generate_s"] = round(timed(writePrimFile, library, records, legacy=args.format == "legacy")[1], 3)
+    result["file_mb"] = round(os.path.getsize(library) / 1024 / 1024, 2)
+    log(f"{size:>7} meshes: generated {result['file_mb']} MB in {result['generate_s']:.1f}s")
+
+    # Open: reading the index and thumbnails into a fresh catalog
+    closeCatalog(library)
+    catalog, seconds = timed(lambda: getCatalog(library))
+    result["open_ms"] = round(seconds * 1000, 3)
+    Prim.current_prim_file_path = library
+
+    if size <= args.regenerate_limit:
+        result["regenerate_s"] = round(timed(MeshManager.generateMeshesFromPrimFile)[1], 3)
+        shutil.rmtree(os.path.join(root, "primitives", "meshes"))
+        os.makedirs(os.path.join(root, "primitives", "meshes"))
+
+    # Lookups by name, and single reads through the catalog's index
+    rng = random.Random(size)
+    names = catalog.primitiveNames()
+    probes = [rng.choice(names) for i in range(args.ops * 100)] + [f"missing_{i}" for i in range(args.ops * 10)]
+    seconds = timed(lambda: [name in catalog for name in probes])[1]
+    result["lookup_us"] = round(seconds * 1e6 / len(probes), 3)
+    reads = [timed(readPrimitive, library, rng.choice(names), catalog.entries())[1] for i in range(args.ops)]
+    result["read"] = summary(reads)
+
+    # Saves through savePrimitiveData, with a synthetic mesh selected in the stand-in scene
+    positions, counts, connects = grid_arrays(args.faces)
+    maya_stub.scene["|bench_mesh|bench_meshShape"] = meshData(array("f", positions.tobytes()), counts, connects)
+    maya_stub.selection[:] = ["|bench_mesh"]
+    saved = [f"bench_save_{i}" for i in range(args.ops)]
+    saves = [timed(MeshManager.savePrimitiveData, name)[1] for name in saved]
+    result["save"] = summary(saves)
+    settle(0 if args.format == "legacy" else len(saved))
+
+    # Deletes of the primitives just saved, then any compaction they triggered
+    deletes = [timed(MeshManager.deletePrimitiveData, name)[1] for name in saved]
+    result["delete"] = summary(deletes)
+    compaction = MeshManager.compaction_thread
+    if compaction is not None:
+        compaction.join()
+    maya_stub.processIdleEvents()
+
+    export_path = os.path.join(root, f"export_{size}.prim")
+    result["export_s"] = round(timed(exportPrimFile, library, export_path)[1], 3)
+    os.remove(export_path)
+
+    # Gallery: listing every primitive, then painting the first screen with its thumbnails
+    model = primitiveModel()
+    view = createGalleryView(model, primitiveDelegate())
+    view.resize(900, 700)
+    view.show()
+    drain(app)
+    seconds = timed(lambda: (model.setPrimitives(catalog.primitiveNames(), catalog.thumbnails), view.viewport().repaint()))[1]
+    result["gallery_ms"] = round(seconds * 1000, 3)
+    loader = thumbnailLoader.get()
+    start = time.perf_counter()
+    while (loader.pending or model.requested) and time.perf_counter() - start < 30:
+        drain(app, 0.001)
+    view.viewport().repaint()
+    result["gallery_thumbnails_ms"] = round((time.perf_counter() - start) * 1000, 3)
+    result["thumbnails_loaded"] = len(loader.pixmaps)
+    view.close()
+    view.deleteLater()
+    drain(app)
+
+    log(f"{size:>7} meshes: open {result['open_ms']:.1f} ms, "
+          + (f"regenerate {result['regenerate_s']:.2f}s, " if "regenerate_s" in result else "")
+          + f"lookup {result['lookup_us']:.2f} us, read {result['read']['median_ms']:.2f} ms, "
+          f"save {result['save']['median_ms']:.1f} ms, delete {result['delete']['median_ms']:.1f} ms, "
+          f"export {result['export_s']:.2f}s, gallery {result['gallery_ms']:.1f} ms "
+          f"(+{result['gallery_thumbnails_ms']:.1f} ms thumbnails)")
+
+    if args.instrument:
+        import Instrumentation
+        for name, stats in Instrumentation.summary():
+            log(f"{size:>7} meshes:   {name:<40} {stats['calls']:>6} calls, p50 {stats['p50_ms']:.2f} ms, "
+                f"p99 {stats['p99_ms']:.2f} ms, read {stats['bytes_read']} B, written {stats['bytes_written']} B")
+        Instrumentation.clear()
+
+    closeCatalog(library)
+    os.remove(library)
+    return result
+
+# Flattens a result into {"stage.metric": value} timings
+def timings(result):
+    flat = {}
+    for key, value in result.items():
+        if isinstance(value, dict):
+            flat.update({f"{key}.{metric}": number for metric, number in value.items()})
+        elif key not in NOT_TIMINGS:
+            flat[key] = value
+    return flat
+
+# Prints timings slower than tolerance x the old run, returns how many there were
+def compare(results, old_path, tolerance):
+    with open(old_path) as file:
+        old = {result["size"]: timings(result) for result in json.load(file)["results"]}
+
+    regressions = 0
+    for result in results:
+        before = old.get(result["size"])
+        if before is None:
+            continue
+        for metric, value in timings(result).items():
+            previous = before.get(metric)
+            if not previous or value is None:
+                continue
+            ratio = value / previous
+            if ratio > tolerance:
+                regressions += 1
+                print(f"REGRESSION {result['size']:>7} meshes {metric}: {previous} -> {value} ({ratio:.2f}x)")
+    print(f"{regressions} regressions against {old_path} (tolerance {tolerance:.2f}x)")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 1000, 10000, 100000], help="library sizes in meshes (default 10 1000 10000 100000)")
+    parser.add_argument("--faces", type=int, default=100, help="quads per synthetic mesh (default 100)")
+    parser.add_argument("--format", choices=["obj", "geometry", "legacy"], default="obj",
+                        help="payload format of the synthetic libraries, legacy writes version 1 text files (default obj)")
+    parser.add_argument("--ops", type=int, default=20, help="saves, deletes and reads timed per size (default 20)")
+    parser.add_argument("--regenerate-limit", type=int, default=10000, help="skip regenerating .obj meshes for bigger libraries (default 10000)")
+    parser.add_argument("--no-thumbnails", action="store_true", help="generate libraries without embedded thumbnails")
+    parser.add_argument("--instrument", action="store_true", help="record Prim's operation timings while benchmarking, and log them")
+    parser.add_argument("--json", default=None, help="write results to this file")
+    parser.add_argument("--compare", default=None, help="JSON results of an earlier run to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=1.25, help="slowdown ratio reported as a regression (default 1.25)")
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix="prim_library_")
+    try:
+        maya_stub.install()
+        sys.path.insert(0, make_sandbox(root))
+
+        try:
+            from PySide2 import QtCore, QtGui, QtWidgets
+        except ImportError:
+            from PySide6 import QtCore, QtGui, QtWidgets
+        app = QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+
+        # Proxies are built for every save, as in Maya; keep their decimation off the timings' critical path
+        maya_stub.option_vars["primProxyMinFaces"] = max(args.faces * 10, 5000)
+        maya_stub.option_vars["primInstrumentation"] = int(args.instrument)
+        if args.instrument:
+            import Instrumentation
+            Instrumentation.setEnabled(True)
+        with open(os.devnull, "w") as quiet, contextlib.redirect_stdout(quiet):
+            results = [bench_size(size, args, root, app, QtCore, QtGui) for size in args.sizes]
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    if args.json:
+        meta = {"python": platform.python_version(), "platform": platform.platform(), "format": args.format,
+                "faces": args.faces, "ops": args.ops, "thumbnails": not args.no_thumbnails, "instrument": args.instrument,
+                "threads": threading.active_count()}
+        with open(args.json, "w") as file:
+            json.dump({"meta": meta, "results": results}, file, indent=2)
+
+    if args.compare and compare(results, args.compare, args.tolerance):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
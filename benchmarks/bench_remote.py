@@ -0,0 +1,206 @@
+"""
+Remote library benchmark: browsing a library on a Prim library server
+(see LibraryServer.py and RemoteLibrary.py) against copying the whole
+.prim file first, as opening it from a network share does.
+
+A synthetic library with embedded thumbnails is served from this process
+over a simulated link: --rtt milliseconds of latency per request (and per
+new connection), --bandwidth MB/s shared by every connection. Each
+workflow opens the library, shows the thumbnails of the first --rows
+primitives (on 4 threads, like the gallery's thumbnail loader) and places
+--place primitives:
+
+- copy: download the .prim file, then read it locally
+- remote cold: empty local cache, the index and each entry on demand
+- remote warm: a later session with the cache the cold run left behind
+- remote cold, no pool: a new connection for every request
+
+    python benchmarks/bench_remote.py
+    python benchmarks/bench_remote.py --size 20000 --rtt 40 --bandwidth 10 --json remote.json
+
+Runs under plain CPython with a stand-in for Maya (see maya_stub.py) and
+needs NumPy. Everything is written to a temp folder.
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import maya_stub
+
+PRIM_PATH = os.path.join(os.path.dirname(os.path.realpath(__file__)), "..", "Prim")
+
+def log(message):
+    print(message, file=sys.__stdout__, flush=True)
+
+"""
+A network link shared by the server's connections: bytes queue up behind each other at `bandwidth` bytes/s.
+- Counts what was sent, each workflow reads and resets it
+"""
+class simulatedLink():
+    def __init__(self, rtt, bandwidth):
+        self.rtt = rtt
+        self.bandwidth = bandwidth
+        self.lock = threading.Lock()
+        self.free_at = 0.0
+        self.sent = 0
+
+    def send(self, size):
+        with self.lock:
+            self.sent += size
+            done = max(time.perf_counter(), self.free_at) + size / self.bandwidth
+            self.free_at = done
+        delay = done - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+
+class throttledWriter():
+    def __init__(self, writer, link):
+        self.writer = writer
+        self.link = link
+
+    def write(self, data):
+        self.link.send(len(data))
+        return self.writer.write(data)
+
+    def __getattr__(self, name):
+        return getattr(self.writer, name)
+
+def throttledHandler(link):
+    from LibraryServer import libraryRequestHandler
+
+    class handler(libraryRequestHandler):
+        # A new connection costs a round trip (TCP handshake) before its first request
+        def setup(self):
+            super().setup()
+            time.sleep(link.rtt)
+            self.wfile = throttledWriter(self.wfile, link)
+
+        def do_GET(self):
+            time.sleep(link.rtt)
+            super().do_GET()
+
+    return handler
+
+# Library records with a distinct thumbnail of thumbnail_size bytes each, PNG-like (only checksums are checked)
+def thumbnail_records(count, faces, thumbnail_size):
+    import bench_library
+    for name, entry, payload in bench_library.synthetic_records(count, faces, "obj", None):
+        entry["thumbnail"] = {"png": b"\x89PNG\r\n\x1a\n" + name.encode("utf-8") + os.urandom(max(0, thumbnail_size - 20))}
+        yield name, entry, payload
+
+# Shows the first rows' thumbnails, then places primitives: what an artist does right after opening a library
+def browse(path, entries, rows, placed):
+    from PrimFile import readPrimitive, readThumbnailAt
+    names = sorted(entries)
+    shown = [entries[name]["thumbnail"] for name in names[:rows]]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(4) as executor:
+        list(executor.map(lambda thumbnail: readThumbnailAt(path, thumbnail["offset"], thumbnail["length"], thumbnail["checksum"]), shown))
+    thumbnails = time.perf_counter()
+    step = max(1, len(names) // max(1, placed))
+    for name in names[::step][:placed]:
+        readPrimitive(path, name, entries)
+    return thumbnails - start, time.perf_counter() - thumbnails
+
+def copy_workflow(url, root, args):
+    from PrimFile import readIndex
+    from RemoteLibrary import connectionPool
+    pool = connectionPool(0)
+    start = time.perf_counter()
+    status, headers, body = pool.request(url)
+    local = os.path.join(root, "copy.prim")
+    with open(local, "wb") as file:
+        file.write(body)
+    entries = readIndex(local)
+    opened = time.perf_counter() - start
+    thumbnails, placing = browse(local, entries, args.rows, args.place)
+    os.remove(local)
+    return opened, thumbnails, placing, pool
+
+def remote_workflow(url, cache_path, args, pool_size):
+    import RemoteLibrary
+    from PrimFile import readIndex
+    pool = RemoteLibrary.connectionPool(pool_size)
+    RemoteLibrary.remote_libraries[url] = RemoteLibrary.remoteLibrary(url, cache=RemoteLibrary.remoteCache(cache_path), pool=pool)
+    start = time.perf_counter()
+    entries = readIndex(url)
+    opened = time.perf_counter() - start
+    thumbnails, placing = browse(url, entries, args.rows, args.place)
+    pool.close()
+    return opened, thumbnails, placing, pool
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=5000, help="primitives in the synthetic library (default 5000)")
+    parser.add_argument("--faces", type=int, default=400, help="quads per synthetic mesh (default 400)")
+    parser.add_argument("--thumbnail-kb", type=int, default=12, help="bytes per thumbnail, in KB (default 12)")
+    parser.add_argument("--rows", type=int, default=60, help="thumbnails shown after opening (default 60)")
+    parser.add_argument("--place", type=int, default=5, help="primitives placed after browsing (default 5)")
+    parser.add_argument("--rtt", type=float, default=20.0, help="simulated round trip time, ms (default 20)")
+    parser.add_argument("--bandwidth", type=float, default=25.0, help="simulated link bandwidth, MB/s (default 25)")
+    parser.add_argument("--repeat", type=int, default=3, help="runs of each workflow (default 3)")
+    parser.add_argument("--json", default=None, help="write results to this file")
+    args = parser.parse_args()
+
+    maya_stub.install()
+    sys.path.insert(0, os.path.join(PRIM_PATH, "scripts"))
+    from PrimFile import writePrimFile
+    from LibraryServer import libraryServer
+
+    root = tempfile.mkdtemp(prefix="prim_remote_")
+    link = simulatedLink(args.rtt / 1000, args.bandwidth * 1024 * 1024)
+    server = None
+    try:
+        os.makedirs(os.path.join(root, "served"))
+        library = os.path.join(root, "served", "remote.prim")
+        writePrimFile(library, thumbnail_records(args.size, args.faces, args.thumbnail_kb * 1024))
+        file_mb = os.path.getsize(library) / 1024 / 1024
+        log(f"{args.size} primitives, {file_mb:.1f} MB, over {args.rtt:g} ms RTT and {args.bandwidth:g} MB/s")
+
+        server = libraryServer(os.path.join(root, "served"), ("127.0.0.1", 0), handler=throttledHandler(link))
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = server.url() + "/libraries/remote.prim"
+
+        runs = {"copy": [], "remote_cold": [], "remote_warm": [], "remote_cold_no_pool": []}
+        for i in range(args.repeat):
+            cache_path = os.path.join(root, f"cache_{i}")
+            workflows = [
+                ("copy", lambda: copy_workflow(url, root, args)),
+                ("remote_cold", lambda: remote_workflow(url, cache_path, args, 8)),
+                ("remote_warm", lambda: remote_workflow(url, cache_path, args, 8)),
+                ("remote_cold_no_pool", lambda: remote_workflow(url, cache_path + "_no_pool", args, 0))
+            ]
+            for mode, workflow in workflows:
+                link.sent = 0
+                opened, thumbnails, placing, pool = workflow()
+                runs[mode].append({"open_ms": opened * 1000, "thumbnails_ms": thumbnails * 1000, "place_ms": placing * 1000,
+                                   "browse_ms": (opened + thumbnails) * 1000, "total_ms": (opened + thumbnails + placing) * 1000,
+                                   "mb": link.sent / 1024 / 1024, "requests": pool.requests, "connections": pool.opened})
+    finally:
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+        shutil.rmtree(root, ignore_errors=True)
+
+    results = {}
+    for mode, samples in runs.items():
+        results[mode] = {key: round(statistics.median(sample[key] for sample in samples), 3) for key in samples[0]}
+        result = results[mode]
+        log(f"{mode:>20}: open {result['open_ms']:8.1f} ms, {args.rows} thumbnails {result['thumbnails_ms']:7.1f} ms, "
+            f"place {args.place} {result['place_ms']:6.1f} ms, total {result['total_ms']:8.1f} ms, "
+            f"{result['mb']:.2f} MB in {result['requests']:.0f} requests over {result['connections']:.0f} connections")
+
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump({"size": args.size, "faces": args.faces, "file_mb": round(file_mb, 2), "rtt_ms": args.rtt,
+                       "bandwidth_mb_s": args.bandwidth, "results": results}, file, indent=2)
+
+if __name__ == "__main__":
+    main()
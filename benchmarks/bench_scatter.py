@@ -0,0 +1,116 @@
+"""
+Scatter benchmark: placing 1k, 10k and 100k copies of a primitive.
+
+Always times the NumPy stages (TRS rows to matrices, sampling a target
+surface). Under mayapy, also times MeshManager.scatter() end to end in a
+standalone Maya session, then undo and redo of the whole scatter:
+
+    mayapy benchmarks/bench_scatter.py --count 1000 10000 100000
+    mayapy benchmarks/bench_scatter.py --count 1000 --baseline --json out.json
+
+--baseline also times the per-copy approach, one cmds.instance + cmds.xform
+per copy; it is slow, keep --count small with it.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), "..", "Prim", "scripts"))
+
+import numpy
+
+from bench_similarity import box, revolved
+from MeshData import packMeshData
+from Scatter import trsToMatrices, surfaceMatrices
+
+PLUGIN_PATH = os.path.join(os.path.dirname(os.path.realpath(__file__)), "..", "Prim", "plug-ins", "PrimPlugin.py")
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+def random_trs(count, rng):
+    trs = numpy.zeros((count, 9))
+    trs[:, :3] = rng.uniform(-500.0, 500.0, (count, 3))
+    trs[:, 4] = rng.uniform(0.0, 360.0, count)
+    trs[:, 6:] = rng.uniform(0.5, 2.0, (count, 1))
+    return trs
+
+# Starts a standalone Maya session with the Prim plug-in, None outside mayapy
+def start_maya():
+    try:
+        import maya.standalone
+    except ImportError:
+        return None
+    maya.standalone.initialize(name="python")
+    import maya.cmds as cmds
+    cmds.loadPlugin(os.path.realpath(PLUGIN_PATH))
+    return cmds
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, nargs="+", default=[1000, 10000, 100000], help="copies to place (default 1000 10000 100000)")
+    parser.add_argument("--baseline", action="store_true", help="also time one cmds.instance per copy")
+    parser.add_argument("--json", default=None, help="write results to this file")
+    args = parser.parse_args()
+
+    rng = numpy.random.default_rng(1)
+    target = revolved(100.0, 200.0, 64, 96)
+    results = []
+    for count in args.count:
+        trs = random_trs(count, rng)
+        matrices, trs_seconds = timed(trsToMatrices, trs)
+        surface, surface_seconds = timed(surfaceMatrices, target, count, (0.5, 2.0), True, 0)
+        results.append({"count": count, "trs_ms": round(trs_seconds * 1000, 3), "surface_ms": round(surface_seconds * 1000, 3)})
+        print(f"{count:>7} copies: TRS to matrices {trs_seconds * 1000:.1f} ms, surface sampling {surface_seconds * 1000:.1f} ms")
+
+    cmds = start_maya()
+    if cmds is None:
+        print("Not running under mayapy, scene placement was not timed")
+    else:
+        import MeshManager
+        from Catalog import getCatalog
+        from PrimFile import createPrimFile, appendPrimitive
+
+        with tempfile.TemporaryDirectory(prefix="prim_scatter_") as root:
+            library = os.path.join(root, "scatter.prim")
+            createPrimFile(library)
+            appendPrimitive(library, "rock", packMeshData(box(1.0, 0.5, 0.8)), "geometry")
+            # No Prim window in a standalone session, point the current library at ours
+            MeshManager.currentCatalog = lambda: getCatalog(library)
+
+            for result in results:
+                count = result["count"]
+                matrices = trsToMatrices(random_trs(count, rng))
+                cmds.file(new=True, force=True)
+
+                group, scatter_seconds = timed(MeshManager.scatter, "rock", matrices, False)
+                undo_seconds = timed(cmds.undo)[1]
+                redo_seconds = timed(cmds.redo)[1]
+                result.update({"scatter_ms": round(scatter_seconds * 1000, 3), "undo_ms": round(undo_seconds * 1000, 3),
+                               "redo_ms": round(redo_seconds * 1000, 3), "copies_per_second": round(count / scatter_seconds, 1)})
+                print(f"{count:>7} copies: scatter {scatter_seconds:.2f}s ({count / scatter_seconds:,.0f}/s), "
+                      f"undo {undo_seconds:.2f}s, redo {redo_seconds:.2f}s")
+
+                if args.baseline:
+                    cmds.file(new=True, force=True)
+                    source = MeshManager.instanceSource(MeshManager.currentCatalog(), "rock")
+                    def per_copy():
+                        for matrix in matrices.reshape(-1, 16).tolist():
+                            copy = cmds.instance(source)[0]
+                            copy = cmds.parent(copy, world=True)[0]
+                            cmds.xform(copy, matrix=matrix)
+                    baseline_seconds = timed(per_copy)[1]
+                    result["baseline_ms"] = round(baseline_seconds * 1000, 3)
+                    print(f"{count:>7} copies: per-copy cmds {baseline_seconds:.2f}s ({baseline_seconds / scatter_seconds:.1f}x slower)")
+
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump({"results": results}, file, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Shape search benchmark: descriptor cost per mesh, and query time at scale.
+
+Computes descriptors for synthetic boxes, cylinders and spheres of varied
+proportions, fills a descriptor index with jittered copies up to each
+requested size, then times nearest-neighbour queries. Needs NumPy, no Maya:
+
+    python benchmarks/bench_similarity.py --count 1000 10000 50000
+    python benchmarks/bench_similarity.py --queries 200 --json out.json
+
+Also reports how often the closest match has the query's shape family.
+"""
+import argparse
+import json
+import math
+import os
+import sys
+import tempfile
+import time
+from array import array
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), "..", "Prim", "scripts"))
+
+import numpy
+
+from MeshData import meshData
+from Descriptors import descriptorIndex, computeDescriptor
+
+def box(sx, sy, sz):
+    positions = array("f")
+    for x in (-sx, sx):
+        for y in (-sy, sy):
+            for z in (-sz, sz):
+                positions.extend((x, y, z))
+    faces = [(0, 1, 3, 2), (4, 6, 7, 5), (0, 4, 5, 1), (2, 3, 7, 6), (0, 2, 6, 4), (1, 5, 7, 3)]
+    return meshData(positions, array("i", [4] * 6), array("i", [i for face in faces for i in face]))
+
+# Latitude/longitude grid: a sphere, or a cylinder when the rings keep the same radius
+def revolved(radius, height, rings=16, segments=24, cylinder=False):
+    positions, counts, connects = array("f"), array("i"), array("i")
+    for ring in range(rings + 1):
+        angle = math.pi * ring / rings
+        ring_radius = radius if cylinder else radius * math.sin(angle)
+        y = height * (ring / rings - 0.5) if cylinder else height * 0.5 * math.cos(angle)
+        for segment in range(segments):
+            theta = 2 * math.pi * segment / segments
+            positions.extend((ring_radius * math.cos(theta), y, ring_radius * math.sin(theta)))
+    for ring in range(rings):
+        for segment in range(segments):
+            a = ring * segments + segment
+            b = ring * segments + (segment + 1) % segments
+            counts.append(4)
+            connects.extend((a, b, b + segments, a + segments))
+    return meshData(positions, counts, connects)
+
+def shape(family, rng):
+    scale = rng.uniform(0.5, 5.0)
+    if family == "box":
+        return box(scale, scale * rng.uniform(0.2, 0.4), scale * rng.uniform(0.6, 1.0))
+    if family == "cylinder":
+        return revolved(scale * 0.2, scale * rng.uniform(2.0, 3.0), cylinder=True)
+    return revolved(scale, scale * rng.uniform(1.8, 2.2))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, nargs="+", default=[1000, 10000, 50000], help="index sizes (default 1000 10000 50000)")
+    parser.add_argument("--meshes", type=int, default=300, help="meshes to compute descriptors for (default 300)")
+    parser.add_argument("--queries", type=int, default=100, help="queries per index size (default 100)")
+    parser.add_argument("--json", default=None, help="write results to this file")
+    args = parser.parse_args()
+
+    rng = numpy.random.default_rng(1)
+    families = ["box", "cylinder", "sphere"]
+
+    start = time.perf_counter()
+    computed = []
+    for i in range(args.meshes):
+        family = families[i % len(families)]
+        computed.append((family, computeDescriptor(shape(family, rng))))
+    descriptor_ms = (time.perf_counter() - start) * 1000 / args.meshes
+    print(f"Descriptors: {descriptor_ms:.2f} ms per mesh")
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix="prim_similarity_") as root:
+        for count in args.count:
+            index = descriptorIndex(os.path.join(root, f"library_{count}.prim"), root)
+            rows = []
+            for i in range(count):
+                family, descriptor = computed[i % len(computed)]
+                jitter = 1.0 + rng.normal(0.0, 0.02, descriptor.shape).astype(numpy.float32)
+                rows.append((f"{family}_{i:06d}", {"checksum": i}, descriptor * jitter))
+            index.addMany(rows)
+            index.nearest(computed[0][1], 1) # builds the search features once
+
+            hits = 0
+            start = time.perf_counter()
+            for query in range(args.queries):
+                family, descriptor = computed[query % len(computed)]
+                matches = index.nearest(descriptor, 12)
+                hits += matches[0][0].startswith(family)
+            query_ms = (time.perf_counter() - start) * 1000 / args.queries
+
+            results.append({"count": count, "query_ms": round(query_ms, 3), "top1_same_family": hits / args.queries})
+            print(f"{count:>7} descriptors: {query_ms:.2f} ms per query, top match same family {hits}/{args.queries}")
+
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump({"descriptor_ms": round(descriptor_ms, 3), "results": results}, file, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""
+Startup benchmark: how long the Prim window takes to show the last library.
+
+Each run is a fresh Python process (under the Maya stand-in, see
+maya_stub.py) that imports Prim, builds the window and waits until the
+gallery lists every primitive of a synthetic library (rows) and its
+catalog is current (shown):
+
+- cold: no session manifest, the library is opened as a user would
+- warm: the manifest the previous run left behind (see Session.py)
+
+Runs alternate cold and warm, after one untimed run that compiles the
+scripts. --scripts points at another copy of Prim/scripts, e.g. an older
+checkout, to measure before and after a change (trees without a session
+manifest only get cold-like opens):
+
+    python benchmarks/bench_startup.py --size 10000
+    git worktree add /tmp/prim_old HEAD~1
+    python benchmarks/bench_startup.py --scripts /tmp/prim_old/Prim/scripts --json old.json
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+import maya_stub
+
+PRIM_PATH = os.path.join(os.path.dirname(os.path.realpath(__file__)), "..", "Prim")
+
+# Copies a scripts folder and Prim's primitives folder to root
+def make_sandbox(root, scripts_path):
+    ignore = shutil.ignore_patterns("__pycache__", "*.pyc", "session.json")
+    shutil.copytree(scripts_path, os.path.join(root, "scripts"), ignore=ignore)
+    shutil.copytree(os.path.join(PRIM_PATH, "primitives"), os.path.join(root, "primitives"), ignore=ignore)
+    for folder in ("libraries", "meshes", "cache", "thumbnails"):
+        os.makedirs(os.path.join(root, "primitives", folder), exist_ok=True)
+    return os.path.join(root, "scripts")
+
+# One timed startup, in this process: prints its timings as JSON
+def run_phase(root, library, size):
+    maya_stub.install()
+    sys.path.insert(0, os.path.join(root, "scripts"))
+    try:
+        from PySide2 import QtWidgets
+    except ImportError:
+        from PySide6 import QtWidgets
+    app = QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+
+    start = time.perf_counter()
+    import Prim
+    imported = time.perf_counter()
+    window = Prim.mainWindow()
+    window.show()
+    built = time.perf_counter()
+
+    # The window reopens the last library once it is up
+    app.processEvents()
+    restored = len(window.gallery_model.names) == size
+
+    # Trees without a session (or with a stale one) open the library in the background
+    if not restored and window.library_load is None:
+        window.openLibrary(library)
+    # Rows: every name listed in the gallery, ready: the library's catalog is current as well
+    deadline = time.perf_counter() + 600
+    rows = time.perf_counter() if restored else None
+    while (len(window.gallery_model.names) < size or window.library_load is not None) and time.perf_counter() < deadline:
+        app.processEvents()
+        if rows is None and len(window.gallery_model.names) >= size:
+            rows = time.perf_counter()
+    ready = time.perf_counter()
+    rows = rows or ready
+    numpy_loaded = "numpy" in sys.modules
+
+    # Maya's idle queue (deferred startup work), then closing the window saves the session
+    maya_stub.processIdleEvents()
+    window.close()
+
+    print(json.dumps({
+        "import_ms": round((imported - start) * 1000, 3),
+        "window_ms": round((built - imported) * 1000, 3),
+        "rows_ms": round((rows - start) * 1000, 3),
+        "ready_ms": round((ready - start) * 1000, 3),
+        "restored": restored,
+        "numpy_at_ready": numpy_loaded,
+        "rows": len(window.gallery_model.names)
+    }), flush=True)
+
+def measure(root, library, size):
+    with open(os.devnull, "w") as quiet:
+        output = subprocess.run([sys.executable, os.path.realpath(__file__), "--phase", root, library, str(size)],
+                                check=True, stdout=subprocess.PIPE, stderr=quiet, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=10000, help="primitives in the synthetic library (default 10000)")
+    parser.add_argument("--faces", type=int, default=100, help="quads per synthetic mesh (default 100)")
+    parser.add_argument("--repeat", type=int, default=5, help="cold and warm runs each (default 5)")
+    parser.add_argument("--legacy", action="store_true", help="write the library in the version 1 text format")
+    parser.add_argument("--scripts", default=os.path.join(PRIM_PATH, "scripts"), help="Prim scripts folder to measure (default: this tree)")
+    parser.add_argument("--json", default=None, help="write results to this file")
+    parser.add_argument("--phase", nargs=3, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.phase:
+        root, library, size = args.phase
+        run_phase(root, library, int(size))
+        # The timings are out: skip the interpreter's teardown of Qt, which offscreen PySide can crash in
+        os._exit(0)
+
+    root = tempfile.mkdtemp(prefix="prim_startup_")
+    try:
+        scripts = make_sandbox(root, os.path.realpath(args.scripts))
+        sys.path.insert(0, scripts)
+        import bench_library
+        from PrimFile import writePrimFile
+
+        library = os.path.join(root, "primitives", "libraries", "startup.prim")
+        writePrimFile(library, bench_library.synthetic_records(args.size, args.faces, "obj", None), legacy=args.legacy)
+        session = os.path.join(root, "primitives", "session.json")
+
+        measure(root, library, args.size) # compiles the scripts
+        runs = {"cold": [], "warm": []}
+        for i in range(args.repeat):
+            if os.path.exists(session):
+                os.remove(session)
+            runs["cold"].append(measure(root, library, args.size))
+            runs["warm"].append(measure(root, library, args.size))
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    results = {}
+    for mode, samples in runs.items():
+        results[mode] = {key: round(statistics.median(sample[key] for sample in samples), 3) for key in ("import_ms", "window_ms", "rows_ms", "ready_ms")}
+        results[mode]["restored"] = all(sample["restored"] for sample in samples)
+        results[mode]["numpy_at_ready"] = any(sample["numpy_at_ready"] for sample in samples)
+        print(f"{mode}: import {results[mode]['import_ms']:.1f} ms, window {results[mode]['window_ms']:.1f} ms, "
+              f"primitives listed after {results[mode]['rows_ms']:.1f} ms, library shown after {results[mode]['ready_ms']:.1f} ms"
+              + (" (from the session manifest)" if results[mode]["restored"] else "")
+              + (", NumPy loaded" if results[mode]["numpy_at_ready"] else ""))
+
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump({"size": args.size, "legacy": args.legacy, "scripts": os.path.realpath(args.scripts), "results": results}, file, indent=2)
+
+if __name__ == "__main__":
+    main()
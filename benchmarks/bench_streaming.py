@@ -0,0 +1,155 @@
+"""
+Memory and throughput benchmark for streaming .prim reads.
+
+Builds a synthetic text (version 1) library of the requested size, exports a
+copy in the indexed format, then streams every primitive from each file in a
+separate process so peak memory is measured per reader. Runs under plain
+CPython, no Maya needed:
+
+    python benchmarks/bench_streaming.py --size-mb 4096
+    python benchmarks/bench_streaming.py --size-mb 512 --baseline --json out.json
+
+--baseline also runs the old readlines() + dict reader for comparison; it
+needs several times the library size in RAM.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), "..", "Prim", "scripts"))
+
+from PrimFile import iterPrimitives, exportPrimFile
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# Peak resident memory of this process in MB, None where unsupported
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KB, macOS bytes
+    return round(peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024, 1)
+
+# Writes a text library of roughly size_mb, made of meshes of roughly mesh_kb
+def generate_legacy_library(path, size_mb, mesh_kb):
+    lines = []
+    size = 0
+    index = 0
+    while size < mesh_kb * 1024:
+        vertex = f"v {index * 0.001:.6f} {index * 0.002:.6f} {index * 0.003:.6f}\n"
+        face = f"f {index + 1} {index + 2} {index + 3}\n"
+        lines.append(vertex + face)
+        size += len(vertex) + len(face)
+        index += 1
+    mesh = "".join(lines).encode("utf-8")
+
+    count = 0
+    with open(path, "wb") as file:
+        while file.tell() < size_mb * 1024 * 1024:
+            file.write(b"\nmesh_%06d\nbeginMesh\n" % count + mesh + b"endMesh")
+            count += 1
+    return count
+
+# The reader generateMeshesFromPrimFile used before streaming
+def read_with_readlines(path):
+    obj_meshes = {}
+    with open(path, "r") as file:
+        lines = file.readlines()
+        previous_line = None
+        obj_data = []
+        skip = True
+        name = ""
+        for line in lines:
+            current_line = line.strip()
+            if "beginMesh" in line:
+                name = previous_line
+                skip = False
+            if skip == False:
+                obj_data.append(current_line)
+            if "endMesh" in line:
+                skip = True
+                obj_meshes[name] = obj_data
+                obj_data = []
+            previous_line = current_line
+    return len(obj_meshes)
+
+def read_streaming(path):
+    count = 0
+    for name, payload in iterPrimitives(path):
+        count += 1
+    return count
+
+# Child process entry point: runs one reader and prints its stats as JSON
+def run_phase(reader, path):
+    start = time.perf_counter()
+    count = read_with_readlines(path) if reader == "readlines" else read_streaming(path)
+    seconds = time.perf_counter() - start
+    size_mb = os.path.getsize(path) / (1024 * 1024)
+    print(json.dumps({
+        "reader": reader,
+        "file": os.path.basename(path),
+        "meshes": count,
+        "size_mb": round(size_mb, 1),
+        "seconds": round(seconds, 3),
+        "mb_per_second": round(size_mb / seconds, 1),
+        "peak_rss_mb": peak_rss_mb()
+    }))
+
+def measure(reader, path):
+    output = subprocess.check_output([sys.executable, __file__, "--phase", reader, path])
+    return json.loads(output.decode("utf-8").strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size-mb", type=int, default=2048, help="synthetic library size (default 2048)")
+    parser.add_argument("--mesh-kb", type=int, default=256, help="approximate size of each mesh (default 256)")
+    parser.add_argument("--dir", default=None, help="where to write the libraries (default: temp dir)")
+    parser.add_argument("--baseline", action="store_true", help="also run the old readlines() reader")
+    parser.add_argument("--json", default=None, help="write results to this file")
+    parser.add_argument("--phase", nargs=2, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.phase:
+        run_phase(*args.phase)
+        return
+
+    work_dir = args.dir or tempfile.mkdtemp(prefix="prim_bench_")
+    legacy_path = os.path.join(work_dir, "legacy.prim")
+    indexed_path = os.path.join(work_dir, "indexed.prim")
+
+    try:
+        start = time.perf_counter()
+        count = generate_legacy_library(legacy_path, args.size_mb, args.mesh_kb)
+        print(f"Generated {count} meshes ({args.size_mb} MB) in {time.perf_counter() - start:.1f}s")
+
+        start = time.perf_counter()
+        exportPrimFile(legacy_path, indexed_path)
+        print(f"Wrote indexed copy in {time.perf_counter() - start:.1f}s")
+
+        results = [measure("streaming", legacy_path), measure("streaming", indexed_path)]
+        if args.baseline:
+            results.append(measure("readlines", legacy_path))
+
+        for result in results:
+            print(f"{result['reader']:>10} {result['file']:>12}: {result['meshes']} meshes, "
+                  f"{result['mb_per_second']} MB/s, peak RSS {result['peak_rss_mb']} MB")
+
+        if args.json:
+            with open(args.json, "w") as file:
+                json.dump({"size_mb": args.size_mb, "mesh_kb": args.mesh_kb, "results": results}, file, indent=2)
+    finally:
+        if not args.dir:
+            for path in (legacy_path, indexed_path):
+                if os.path.exists(path):
+                    os.remove(path)
+            os.rmdir(work_dir)
+
+if __name__ == "__main__":
+    main()
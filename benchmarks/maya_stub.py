@@ -0,0 +1,192 @@
+"""
+Stand-in for the Maya modules Prim imports, so its library code runs under
+plain CPython (see bench_library.py).
+
+install() registers maya, maya.cmds, maya.mel, maya.utils, maya.api.OpenMaya,
+maya.OpenMayaUI and maya.app.general.mayaMixin in sys.modules, replacing the
+real ones if this runs under mayapy. It has to run before any Prim module is
+imported.
+
+- cmds keeps optionVars in a dict, answers dialogs with their default button,
+  and lists the synthetic meshes in `scene`; other commands do nothing,
+  return None, and are counted in `calls`
+- OpenMaya reads meshes from `scene` (shape path -> MeshData.meshData)
+- maya.utils.executeDeferred() queues calls until processIdleEvents(), like
+  Maya's idle queue; background workers post their results there
+- Plug-in commands (primCreateMesh, primScatter) are not registered, Prim
+  takes its plain maya.cmds paths
+"""
+import collections
+import itertools
+import sys
+import types
+
+# Shape path ("|transform|shape") -> meshData, and the selected transforms
+scene = {}
+selection = []
+
+# Command name -> times called, for commands without a stand-in
+calls = collections.Counter()
+
+option_vars = {}
+deferred = collections.deque()
+script_jobs = itertools.count(1)
+
+def _module(name, **attributes):
+    module = types.ModuleType(name)
+    module.__dict__.update(attributes)
+    return module
+
+# --- maya.cmds ---
+
+def _shapes(node):
+    if node in scene:
+        return [node]
+    return [shape for shape in scene if shape.startswith(node + "|")]
+
+def optionVar(exists=None, query=None, remove=None, intValue=None, floatValue=None, stringValue=None, **kwargs):
+    for value in (intValue, floatValue, stringValue):
+        if value is not None:
+            option_vars[value[0]] = value[1]
+            return None
+    if exists is not None:
+        return exists in option_vars
+    if query is not None:
+        return option_vars.get(query, 0)
+    if remove is not None:
+        option_vars.pop(remove, None)
+    return None
+
+def confirmDialog(*args, **kwargs):
+    calls["confirmDialog"] += 1
+    return kwargs.get("defaultButton", kwargs.get("dismissString"))
+
+def promptDialog(*args, **kwargs):
+    calls["promptDialog"] += 1
+    if kwargs.get("query"):
+        return ""
+    return kwargs.get("cancelButton", "Cancel")
+
+def ls(*args, **kwargs):
+    if kwargs.get("sl") or kwargs.get("selection"):
+        nodes = list(selection)
+    elif args:
+        nodes = list(args[0]) if isinstance(args[0], (list, tuple)) else [args[0]]
+    else:
+        nodes = list(scene)
+    if kwargs.get("type") == "mesh":
+        return [shape for node in nodes for shape in _shapes(node)]
+    return [node for node in nodes if objExists(node)]
+
+def objExists(name):
+    return bool(_shapes(name))
+
+def scriptJob(*args, **kwargs):
+    if "kill" in kwargs or "exists" in kwargs:
+        return None
+    return next(script_jobs)
+
+def undoInfo(*args, **kwargs):
+    if kwargs.get("query") or kwargs.get("q"):
+        return True
+    return None
+
+def currentTime(*args, **kwargs):
+    return 1.0
+
+def _command(name):
+    def command(*args, **kwargs):
+        calls[name] += 1
+        return None
+    return command
+
+def _commandsGetattr(name):
+    if name.startswith("__") or name.startswith("prim"):
+        raise AttributeError(name)
+    return _command(name)
+
+# --- maya.utils ---
+
+def executeDeferred(function, *args, **kwargs):
+    deferred.append((function, args, kwargs))
+
+# Runs the calls queued so far, returns how many ran
+def processIdleEvents():
+    count = 0
+    while deferred:
+        function, args, kwargs = deferred.popleft()
+        function(*args, **kwargs)
+        count += 1
+    return count
+
+# --- maya.api.OpenMaya ---
+
+MFloatPoint = collections.namedtuple("MFloatPoint", "x y z")
+
+class MSpace():
+    kObject = 2
+    kWorld = 4
+
+class MSelectionList():
+    def __init__(self):
+        self.items = []
+
+    def add(self, name):
+        self.items.append(name)
+
+    def getDagPath(self, index):
+        return self.items[index]
+
+class MFnMesh():
+    def __init__(self, dag_path):
+        self.mesh = scene[dag_path]
+
+    def getFloatPoints(self, space=MSpace.kObject):
+        positions = list(self.mesh.positions)
+        return [MFloatPoint(*positions[i:i + 3]) for i in range(0, len(positions), 3)]
+
+    def getVertices(self):
+        return list(self.mesh.counts), list(self.mesh.connects)
+
+    def getUVs(self):
+        uvs = list(self.mesh.uvs) if self.mesh.uvs is not None else []
+        return uvs[0::2], uvs[1::2]
+
+    def getAssignedUVs(self):
+        if self.mesh.uvs is None:
+            return [], []
+        return list(self.mesh.counts), list(self.mesh.uv_ids)
+
+class MQtUtil():
+    # Null pointer: wrapInstance() gives a placeholder widget, enough for windows that are never shown
+    @staticmethod
+    def mainWindow():
+        return 0
+
+class MayaQWidgetDockableMixin():
+    pass
+
+def install():
+    cmds = _module("maya.cmds", optionVar=optionVar, confirmDialog=confirmDialog, promptDialog=promptDialog, ls=ls,
+                   objExists=objExists, scriptJob=scriptJob, undoInfo=undoInfo, currentTime=currentTime,
+                   __getattr__=_commandsGetattr)
+    open_maya = _module("maya.api.OpenMaya", MSpace=MSpace, MSelectionList=MSelectionList, MFnMesh=MFnMesh,
+                        MFloatPoint=MFloatPoint, MFloatPointArray=list, MIntArray=list, MFloatArray=list,
+                        MVectorArray=list, MVector=tuple)
+    modules = {
+        "maya": _module("maya"),
+        "maya.cmds": cmds,
+        "maya.mel": _module("maya.mel", eval=_command("mel.eval")),
+        "maya.utils": _module("maya.utils", executeDeferred=executeDeferred, processIdleEvents=processIdleEvents),
+        "maya.api": _module("maya.api"),
+        "maya.api.OpenMaya": open_maya,
+        "maya.OpenMayaUI": _module("maya.OpenMayaUI", MQtUtil=MQtUtil),
+        "maya.app": _module("maya.app"),
+        "maya.app.general": _module("maya.app.general"),
+        "maya.app.general.mayaMixin": _module("maya.app.general.mayaMixin", MayaQWidgetDockableMixin=MayaQWidgetDockableMixin),
+    }
+    for name, module in modules.items():
+        parent, _, child = name.rpartition(".")
+        if parent:
+            setattr(modules[parent], child, module)
+    sys.modules.update(modules)